@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+
+def numeric_block(df, cols):
+    """
+    将 DataFrame 中的若干列转换为 float64 矩阵（布尔虚拟变量按 0/1 处理）。
+    参数：
+        df : DataFrame
+        cols : list, 列名
+    返回：
+        values : ndarray, (n, k)，缺失值为 NaN；非数值列整列为 NaN
+        ok : ndarray, (k,) bool，该列是否为可用的数值列
+    """
+    values = np.full((len(df), len(cols)), np.nan)
+    ok = np.zeros(len(cols), dtype=bool)
+    for j, c in enumerate(cols):
+        s = df[c]
+        if pd.api.types.is_bool_dtype(s) or pd.api.types.is_numeric_dtype(s):
+            values[:, j] = s.to_numpy(dtype=float, na_value=np.nan)
+            ok[j] = True
+    return values, ok
+
+
+def batched_ols(terms, y, valid, add_const=True, chunk_size=256):
+    """
+    批量最小二乘：对 k 个候选模型同时求解 y ~ terms，每个候选模型按自身的可用行做列表删除。
+    参数：
+        terms : list, 每个元素为 (n,) 的共享列或 (n, k) 的候选列
+        y : ndarray, (n,) 共享因变量或 (n, k) 候选因变量
+        valid : ndarray, (n, k) bool，每个候选模型可用的行
+        add_const : bool, 是否添加截距（截距位于第 0 列）
+        chunk_size : int, 每批同时求解的候选数（控制内存）
+    返回：
+        dict，params / bse / tvalues / pvalues 为 (k, p)，nobs / df_resid / ssr 为 (k,)
+    """
+    valid = np.asarray(valid, dtype=bool)
+    n, k = valid.shape
+    p = len(terms) + (1 if add_const else 0)
+
+    out = {name: np.full((k, p), np.nan) for name in ("params", "bse", "tvalues", "pvalues")}
+    for name in ("nobs", "df_resid", "ssr"):
+        out[name] = np.full(k, np.nan)
+
+    for start in range(0, k, chunk_size):
+        sl = slice(start, min(start + chunk_size, k))
+        w = valid[:, sl]
+        kc = w.shape[1]
+
+        # ---------- 1. 组装 (n, kc, p) 设计张量，无效行置零 ----------
+        cols = [np.ones((n, kc))] if add_const else []
+        for t in terms:
+            t = np.asarray(t, dtype=float)
+            cols.append(np.broadcast_to(t[:, None], (n, kc)) if t.ndim == 1 else t[:, sl])
+        design = np.where(w[:, :, None], np.stack(cols, axis=2), 0.0)
+        y_arr = np.asarray(y, dtype=float)
+        y_arr = np.broadcast_to(y_arr[:, None], (n, kc)) if y_arr.ndim == 1 else y_arr[:, sl]
+        endog = np.where(w, y_arr, 0.0)
+
+        # ---------- 2. 交叉积与求解 ----------
+        gram = np.einsum("nki,nkj->kij", design, design)
+        xty = np.einsum("nki,nk->ki", design, endog)
+        gram_inv = np.linalg.pinv(gram, hermitian=True)
+        beta = np.einsum("kij,kj->ki", gram_inv, xty)
+
+        resid = (endog - np.einsum("nki,ki->nk", design, beta)) * w
+        ssr = np.einsum("nk,nk->k", resid, resid)
+        nobs = w.sum(axis=0).astype(float)
+        rank = np.linalg.matrix_rank(gram, hermitian=True)
+        df_resid = nobs - rank
+
+        # ---------- 3. 标准误与 t 检验 ----------
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scale = np.where(df_resid > 0, ssr / df_resid, np.nan)
+            bse = np.sqrt(np.diagonal(gram_inv, axis1=1, axis2=2) * scale[:, None])
+            tvalues = beta / bse
+        dfr = np.where(df_resid > 0, df_resid, np.nan)[:, None]
+        pvalues = 2 * stats.t.sf(np.abs(tvalues), dfr)
+
+        # 秩亏或样本不足的模型视为失败
+        bad = (rank < p) | (df_resid <= 0)
+        for name, arr in (("params", beta), ("bse", bse), ("tvalues", tvalues), ("pvalues", pvalues)):
+            arr[bad] = np.nan
+            out[name][sl] = arr
+        out["nobs"][sl] = nobs
+        out["df_resid"][sl] = df_resid
+        out["ssr"][sl] = ssr
+
+    return out
+
+
+def ols_ftest(terms, y, blocks=(), add_const=True):
+    """
+    单个模型的最小二乘，并对若干参数块做整体 F 检验（用于同一来源列的虚拟变量组）。
+    含缺失的行做列表删除。
+    参数：
+        terms : list, 每个元素为 (n,) 或 (n, q) 数组
+        y : ndarray, (n,)
+        blocks : list, 每个元素为需整体检验的参数下标列表（含截距时截距为第 0 列）
+        add_const : bool, 是否添加截距
+    返回：
+        dict，params / bse / pvalues 为 (p,)，f_pvalues 为 (len(blocks),)，nobs、df_resid 为标量；
+        秩亏或样本不足时各项为 NaN
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    cols = ([np.ones((n, 1))] if add_const else []) + [np.asarray(t, dtype=float).reshape(n, -1) for t in terms]
+    design = np.column_stack(cols)
+    valid = ~np.isnan(design).any(axis=1) & ~np.isnan(y)
+    design, y = design[valid], y[valid]
+    nobs, p = design.shape
+
+    out = {name: np.full(p, np.nan) for name in ("params", "bse", "pvalues")}
+    out["f_pvalues"] = np.full(len(blocks), np.nan)
+    out["nobs"] = nobs
+    out["df_resid"] = nobs - p
+    if nobs <= p or np.linalg.matrix_rank(design) < p:
+        return out
+
+    # ---------- 1. 求解与 t 检验 ----------
+    gram_inv = np.linalg.pinv(design.T @ design, hermitian=True)
+    beta = gram_inv @ (design.T @ y)
+    resid = y - design @ beta
+    df_resid = nobs - p
+    scale = resid @ resid / df_resid
+    bse = np.sqrt(np.diag(gram_inv) * scale)
+    out["params"], out["bse"] = beta, bse
+    out["pvalues"] = 2 * stats.t.sf(np.abs(beta / bse), df_resid)
+
+    # ---------- 2. 分块 F 检验（Wald 形式，与嵌套模型残差平方和比较等价） ----------
+    for i, idx in enumerate(blocks):
+        idx = list(idx)
+        b = beta[idx]
+        cov = scale * gram_inv[np.ix_(idx, idx)]
+        f_stat = b @ np.linalg.solve(cov, b) / len(idx)
+        out["f_pvalues"][i] = stats.f.sf(f_stat, len(idx), df_resid)
+    return out
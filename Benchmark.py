@@ -0,0 +1,330 @@
+import io
+import os
+import json
+import time
+import platform
+import tempfile
+import argparse
+import subprocess
+import tracemalloc
+from contextlib import redirect_stdout
+import numpy as np
+import pandas as pd
+import ModelSearch
+from ModelSearch import forward_step_for_dv, model_significance_search, new_fit_stats, FIT_CACHE
+from Mediation import mediation_search
+from Moderation import moderation_search
+from DataCache import clear_cache
+from Tracing import trace
+
+MODEL_TYPES = [
+    "OLS", "GLM", "LMM", "RLM", "WLS", "ANOVA",
+    "QUANTILE", "LOGISTIC", "POISSON", "NEGBIN", "ANCOVA",
+    "ORDLOG", "MULTINOM", "ROBUSTGLM", "MIXEDGLM", "GAM"
+]
+
+# 各模型类型使用的因变量（ORDLOG / MULTINOM / GAM 固定使用第 0 列，即有序结局）
+DV_BY_MODEL = {"LOGISTIC": "二分类结局", "POISSON": "计数结局", "NEGBIN": "计数结局"}
+DEFAULT_DV = "连续结局"
+GROUP_COL = "组别"
+
+
+# ---------------------------- 合成问卷数据 ----------------------------
+def make_survey_dataset(n_rows=300, n_covs=20, n_categorical=2, cardinality=3, missing_rate=0.05,
+                        effect_size=0.3, seed=0):
+    """
+    生成合成问卷数据集：二分组的组别变量、若干连续协变量与分类变量，以及四种结局。
+    参数：
+        n_rows : int, 行数
+        n_covs : int, 连续协变量个数（每 3 个中有 1 个受组别影响，可作为中介候选）
+        n_categorical : int, 分类变量个数（字符串取值，读取后会被虚拟变量化）
+        cardinality : int, 每个分类变量的水平数
+        missing_rate : float, 协变量与结局的随机缺失比例（组别不缺失）
+        effect_size : float, 组别 → 协变量、组别 / 协变量 → 结局的效应量
+        seed : int, 随机种子
+    返回：
+        DataFrame（第 0 列为有序结局）
+    """
+    rng = np.random.default_rng(seed)
+    group = rng.integers(0, 2, n_rows).astype(float)
+
+    covs = {}
+    for j in range(n_covs):
+        shift = effect_size * group if j % 3 == 0 else 0.0
+        covs[f"cov_{j + 1}"] = shift + rng.normal(size=n_rows)
+    cats = {
+        f"cat_{j + 1}": rng.choice([f"L{v}" for v in range(cardinality)], n_rows)
+        for j in range(n_categorical)
+    }
+
+    first = covs["cov_1"] if n_covs else 0.0
+    eta = effect_size * group + effect_size * first
+    latent = eta + rng.normal(size=n_rows)
+    outcomes = {
+        "有序结局": np.digitize(latent, np.quantile(latent, [1 / 3, 2 / 3])).astype(float),
+        "连续结局": latent,
+        "计数结局": rng.poisson(np.exp(0.5 + 0.5 * eta)).astype(float),
+        "二分类结局": (rng.random(n_rows) < 1 / (1 + np.exp(-eta))).astype(float),
+    }
+
+    df = pd.DataFrame({**outcomes, GROUP_COL: group, **covs, **cats})
+    for col in df.columns:
+        if col != GROUP_COL and missing_rate > 0:
+            df.loc[rng.random(n_rows) < missing_rate, col] = np.nan
+    return df
+
+
+# ---------------------------- 计时与内存 ----------------------------
+def measure(func, *args, quiet=True, **kwargs):
+    """
+    运行 func 并测量墙钟时间与 Python 堆内存峰值（tracemalloc，包含 numpy 数组分配）。
+    返回：
+        (返回值, 用时秒数, 峰值内存 MB)
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        if quiet:
+            with redirect_stdout(io.StringIO()):
+                result = func(*args, **kwargs)
+        else:
+            result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, elapsed, peak / 2 ** 20
+
+
+def _record(elapsed, peak_mb, fits, unit="次拟合", **extra):
+    return {
+        "seconds": elapsed,
+        "peak_mb": peak_mb,
+        "fits": fits,
+        "fits_per_sec": fits / elapsed if elapsed > 0 else float("nan"),
+        "unit": unit,
+        **extra
+    }
+
+
+def _solved_fits(tracer):
+    """逐次拟合记录中实际求解的候选模型数（未命中缓存的记录；线性增量引擎的一条记录覆盖一步的全部候选）"""
+    return int(sum(rec["n_candidates"] or 0 for rec in tracer.records if not rec["cached"]))
+
+
+def bench_model_types(df, model_types=None, group_col=GROUP_COL, repeat=1):
+    """
+    逐个模型类型计时 forward_step_for_dv（每次运行前清空拟合缓存）。
+    fits 为实际求解的候选模型数（见 _solved_fits）：逐个拟合的模型类型等于拟合缓存未命中次数，
+    线性模型计入增量引擎批量求解的全部候选。
+    返回：
+        dict，键为 "model:<模型类型>"，多次重复时取最快一次
+    """
+    df = pd.get_dummies(df, drop_first=True)
+    outcomes = ["有序结局", "连续结局", "计数结局", "二分类结局"]
+    candidate_covs = [c for c in df.columns if c not in outcomes + [group_col]]
+    results = {}
+    for model_type in model_types or MODEL_TYPES:
+        dv = DV_BY_MODEL.get(model_type, DEFAULT_DV)
+        best = None
+        for _ in range(repeat):
+            FIT_CACHE.clear()
+            fit_stats = new_fit_stats()
+            with trace() as tracer:
+                sig, elapsed, peak = measure(forward_step_for_dv, df, dv, group_col, candidate_covs, model_type,
+                                             fit_stats=fit_stats)
+            rec = _record(elapsed, peak, _solved_fits(tracer), iterations=fit_stats["iterations"],
+                          n_results=len(sig))
+            if best is None or rec["seconds"] < best["seconds"]:
+                best = rec
+        results[f"model:{model_type}"] = best
+    FIT_CACHE.clear()
+    return results
+
+
+def bench_searches(df, work_dir, group_col=GROUP_COL, repeat=1, include=None):
+    """
+    计时 model_significance_search、mediation_search、moderation_search 与 convert_sav_to_xlsx。
+    数据先写入 work_dir 下的 xlsx（及 sav）；每次运行前清空数据集与拟合缓存，保证测的是冷启动。
+    include : list, 只运行其中列出的函数名（None 表示全部）
+    """
+    os.makedirs(work_dir, exist_ok=True)
+    file_path = os.path.join(work_dir, "bench.xlsx")
+    df.to_excel(file_path, index=False)
+    n_candidates = pd.get_dummies(df, drop_first=True).shape[1] - 2
+
+    def cold(func, *args, **kwargs):
+        clear_cache()
+        FIT_CACHE.clear()
+        return func(*args, **kwargs)
+
+    def model_search():
+        with trace() as tracer:
+            model_significance_search(file_path, [DEFAULT_DV], group_col, save_folder=os.path.join(work_dir, "model"))
+        return _solved_fits(tracer)
+
+    jobs = {
+        "model_significance_search": (model_search, None, "次拟合"),
+        # 批量引擎：每个候选 a、b 两条路径，总效应 c 共用一次
+        "mediation_search": (lambda: mediation_search(file_path, group_col, DEFAULT_DV, output_dir=work_dir),
+                             2 * n_candidates + 1, "次拟合"),
+        "moderation_search": (lambda: moderation_search(file_path, group_col, DEFAULT_DV, output_dir=work_dir),
+                              n_candidates, "次拟合"),
+    }
+
+    sav_dir = os.path.join(work_dir, "sav")
+    try:
+        import pyreadstat
+        from misc import convert_sav_to_xlsx
+        os.makedirs(sav_dir, exist_ok=True)
+        pyreadstat.write_sav(df, os.path.join(sav_dir, "bench.sav"))
+        jobs["convert_sav_to_xlsx"] = (lambda: convert_sav_to_xlsx(sav_dir, os.path.join(work_dir, "converted")),
+                                       len(df), "行")
+    except ImportError:
+        print("⚠️ 未安装 pyreadstat，跳过 convert_sav_to_xlsx")
+
+    results = {}
+    for name, (func, fits, unit) in jobs.items():
+        if include and name not in include:
+            continue
+        best = None
+        for _ in range(repeat):
+            out, elapsed, peak = measure(cold, func)
+            rec = _record(elapsed, peak, out if fits is None else fits, unit)
+            if best is None or rec["seconds"] < best["seconds"]:
+                best = rec
+        results[f"search:{name}"] = best
+    return results
+
+
+# ---------------------------- 基线保存与比较 ----------------------------
+def _git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def save_baseline(results, path, config=None):
+    """将结果连同提交号、运行环境与数据配置保存为 JSON 基线"""
+    payload = {
+        "meta": {
+            "commit": _git_revision(),
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "statsmodels": ModelSearch.sm.__version__,
+            "config": config or {}
+        },
+        "results": results
+    }
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+    print(f"📁 基线已保存至：{path}")
+
+
+def load_baseline(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare_with_baseline(results, baseline, tolerance=0.2):
+    """
+    与基线逐项比较用时与峰值内存。
+    参数：
+        results : dict, 本次结果
+        baseline : dict or str, 基线（load_baseline 的返回值或 JSON 路径）
+        tolerance : float, 用时或内存增加超过该比例即判为退化
+    返回：
+        DataFrame（每项一行，含变化比例与状态）
+    """
+    if isinstance(baseline, str):
+        baseline = load_baseline(baseline)
+    base_results = baseline.get("results", baseline)
+
+    rows = []
+    for name, cur in results.items():
+        base = base_results.get(name)
+        if base is None:
+            rows.append({"项目": name, "基线(s)": np.nan, "当前(s)": cur["seconds"], "用时变化": np.nan,
+                         "内存变化": np.nan, "状态": "🆕 新增"})
+            continue
+        time_change = cur["seconds"] / base["seconds"] - 1 if base["seconds"] > 0 else np.nan
+        mem_change = cur["peak_mb"] / base["peak_mb"] - 1 if base["peak_mb"] > 0 else np.nan
+        if time_change > tolerance or mem_change > tolerance:
+            status = "⚠️ 退化"
+        elif time_change < -tolerance:
+            status = "🚀 加速"
+        else:
+            status = "✅ 持平"
+        rows.append({"项目": name, "基线(s)": base["seconds"], "当前(s)": cur["seconds"],
+                     "用时变化": time_change, "内存变化": mem_change, "状态": status})
+    return pd.DataFrame(rows)
+
+
+def print_report(results):
+    df = pd.DataFrame(results).T[["seconds", "fits", "fits_per_sec", "unit", "peak_mb"]]
+    df.columns = ["用时(s)", "数量", "吞吐量(/s)", "单位", "峰值内存(MB)"]
+    print(df.to_string(float_format=lambda v: f"{v:.3f}"))
+
+
+# ---------------------------- 入口 ----------------------------
+def run_benchmarks(n_rows=300, n_covs=20, n_categorical=2, cardinality=3, missing_rate=0.05, effect_size=0.3,
+                   seed=0, model_types=None, searches=True, repeat=1, work_dir=None,
+                   save_path=None, baseline_path=None, tolerance=0.2):
+    """
+    生成合成数据并运行全部基准测试，可保存为基线或与已有基线比较。
+    返回：
+        dict，键为 "model:<模型类型>" / "search:<函数名>"，值含 seconds、peak_mb、fits、fits_per_sec
+    """
+    config = dict(n_rows=n_rows, n_covs=n_covs, n_categorical=n_categorical, cardinality=cardinality,
+                  missing_rate=missing_rate, effect_size=effect_size, seed=seed, repeat=repeat)
+    df = make_survey_dataset(n_rows, n_covs, n_categorical, cardinality, missing_rate, effect_size, seed)
+    print(f"📊 合成数据：{df.shape[0]} 行，{df.shape[1]} 列")
+
+    results = bench_model_types(df, model_types, repeat=repeat)
+    if searches:
+        with tempfile.TemporaryDirectory() as tmp:
+            results.update(bench_searches(df, work_dir or tmp, repeat=repeat))
+
+    print_report(results)
+
+    if baseline_path and os.path.exists(baseline_path):
+        diff = compare_with_baseline(results, baseline_path, tolerance)
+        print(f"\n📈 与基线 {baseline_path} 比较（容差 {tolerance:.0%}）：")
+        seconds = lambda v: f"{v:.3f}"
+        change = lambda v: f"{v:+.1%}"
+        print(diff.to_string(index=False, formatters={"基线(s)": seconds, "当前(s)": seconds,
+                                                      "用时变化": change, "内存变化": change}))
+    if save_path:
+        save_baseline(results, save_path, config)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="搜索函数基准测试")
+    parser.add_argument("--rows", type=int, default=300)
+    parser.add_argument("--covs", type=int, default=20)
+    parser.add_argument("--categorical", type=int, default=2)
+    parser.add_argument("--cardinality", type=int, default=3)
+    parser.add_argument("--missing", type=float, default=0.05)
+    parser.add_argument("--effect", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--models", nargs="*", default=None, help="只测试这些模型类型")
+    parser.add_argument("--no-searches", action="store_true", help="不测试整体搜索函数")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--save", default=None, help="保存基线的 JSON 路径")
+    parser.add_argument("--baseline", default=None, help="用于比较的基线 JSON 路径")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    run_benchmarks(args.rows, args.covs, args.categorical, args.cardinality, args.missing, args.effect,
+                   args.seed, args.models, not args.no_searches, args.repeat,
+                   save_path=args.save, baseline_path=args.baseline, tolerance=args.tolerance)
@@ -0,0 +1,187 @@
+import os
+import hashlib
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+# 内存缓存：键为 (文件指纹, 排除列)，值为虚拟变量化后的 DataFrame
+_MEMORY_CACHE = OrderedDict()
+_MEMORY_CACHE_SIZE = 8
+
+# 文件内容哈希的记忆：{绝对路径: ((文件大小, 修改时间), 哈希)}
+_HASH_MEMO = {}
+
+
+def file_fingerprint(file_path):
+    """
+    计算文件指纹：绝对路径 + 修改时间 + 文件大小 + 内容哈希。
+    内容哈希按 (路径, 文件大小, 修改时间) 记忆：文件未改动时不再重新读取整个文件。
+    """
+    path = os.path.abspath(file_path)
+    st = os.stat(path)
+    stat_key = (st.st_size, st.st_mtime_ns)
+    memo = _HASH_MEMO.get(path)
+    if memo is not None and memo[0] == stat_key:
+        digest = memo[1]
+    else:
+        h = hashlib.sha1()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        digest = h.hexdigest()
+        _HASH_MEMO[path] = (stat_key, digest)
+    return f"{path}|{st.st_mtime_ns}|{st.st_size}|{digest}"
+
+
+def encode_dummies(df, max_levels=50, high_cardinality="skip", id_ratio=0.9):
+    """
+    虚拟变量化（drop_first），指示变量为 uint8，并控制高基数文本列。
+    水平数超过 max_levels，或非缺失值几乎各不相同（唯一值占比 >= id_ratio，如姓名、编号、开放回答）的文本列：
+        high_cardinality="skip" 时整列跳过；
+        high_cardinality="cap" 时保留出现最多的 max_levels - 1 个水平，其余合并为 "其他"（ID 类列仍跳过）。
+    参数：
+        df : DataFrame
+        max_levels : int, 允许的最大水平数（None 表示不限制）
+        high_cardinality : str, "skip" 或 "cap"
+        id_ratio : float, 判定为 ID 类列的唯一值占比
+    返回：
+        DataFrame；df.attrs["dummy_groups"] 记录 {来源列: [虚拟变量列, ...]}，供按来源列整体检验
+    """
+    if high_cardinality not in ("skip", "cap"):
+        raise ValueError(f"未知的高基数处理方式: {high_cardinality}")
+
+    df = df.copy(deep=False)
+    categorical = [c for c in df.columns
+                   if df[c].dtype == object or isinstance(df[c].dtype, pd.CategoricalDtype)
+                   or pd.api.types.is_string_dtype(df[c].dtype)]
+
+    skipped = []
+    for c in categorical:
+        values = df[c].dropna()
+        n_levels = values.nunique()
+        id_like = len(values) > 10 and n_levels >= id_ratio * len(values)
+        if id_like or (max_levels and n_levels > max_levels and high_cardinality == "skip"):
+            skipped.append(c)
+        elif max_levels and n_levels > max_levels:
+            keep = values.value_counts().index[:max_levels - 1]
+            df[c] = df[c].where(df[c].isin(keep) | df[c].isna(), "其他")
+            print(f"⚠️ 列 {c} 有 {n_levels} 个水平，保留最常见的 {max_levels - 1} 个，其余合并为「其他」")
+    if skipped:
+        df = df.drop(columns=skipped)
+        print(f"⚠️ 跳过高基数文本列：{', '.join(map(str, skipped))}")
+
+    # 与 pd.get_dummies(df, drop_first=True) 的列顺序一致：其余列在前，各来源列的虚拟变量依次在后
+    categorical = [c for c in categorical if c not in skipped]
+    blocks = [df.drop(columns=categorical)]
+    groups = {}
+    for c in categorical:
+        dummies = pd.get_dummies(df[c], prefix=c, drop_first=True, dtype=np.uint8)
+        if dummies.shape[1]:
+            blocks.append(dummies)
+            groups[c] = list(dummies.columns)
+    encoded = pd.concat(blocks, axis=1)
+    encoded.attrs["dummy_groups"] = groups
+    return encoded
+
+
+def dummy_candidates(df, exclude=(), group_dummies=True):
+    """
+    候选变量列表：普通列按原名；同一来源列的多个虚拟变量（group_dummies=True 时）合并为以来源列命名的一个候选，
+    位置为其第一个虚拟变量所在处。包含 exclude 中列的分组不合并。
+    返回：
+        candidates : list, 候选名
+        groups : dict, {来源列: [虚拟变量列, ...]}（仅含被合并的分组）
+    """
+    groups = {}
+    if group_dummies:
+        groups = {src: cols for src, cols in df.attrs.get("dummy_groups", {}).items()
+                  if len(cols) > 1 and all(c in df.columns for c in cols) and not set(cols) & set(exclude)}
+    first = {cols[0]: src for src, cols in groups.items()}
+    members = {c for cols in groups.values() for c in cols}
+
+    candidates = []
+    for c in df.columns:
+        if c in exclude:
+            continue
+        if c in first:
+            candidates.append(first[c])
+        elif c not in members:
+            candidates.append(c)
+    return candidates, groups
+
+
+def load_dataset(file_path, exclude_cols=None, cache_dir=None, max_levels=50, high_cardinality="skip"):
+    """
+    读取 Excel、排除指定列并虚拟变量化（encode_dummies），结果按文件指纹缓存。
+    同一文件在一次运行中只解析一次；指定 cache_dir 时另存一份 parquet 列存副本，
+    之后对未改动文件的运行直接读取副本，跳过 Excel 解析。
+    参数：
+        file_path : str, 输入xlsx文件路径
+        exclude_cols : list, 要排除的列名
+        cache_dir : str, 磁盘缓存目录（None 表示只使用内存缓存）
+        max_levels : int, 文本列允许的最大水平数（见 encode_dummies）
+        high_cardinality : str, 高基数文本列的处理方式，"skip" 或 "cap"
+    返回：
+        DataFrame（浅拷贝，可安全增删列；attrs["dummy_groups"] 为虚拟变量分组）
+    """
+    excl = tuple(sorted(map(str, exclude_cols))) if exclude_cols else ()
+    key = (file_fingerprint(file_path), excl, max_levels, high_cardinality)
+
+    # ---------- 1. 内存缓存 ----------
+    if key in _MEMORY_CACHE:
+        _MEMORY_CACHE.move_to_end(key)
+        df = _MEMORY_CACHE[key]
+        print(f"使用缓存数据，共 {df.shape[0]} 行，{df.shape[1]} 列。")
+        return df.copy(deep=False)
+
+    # ---------- 2. 磁盘缓存 ----------
+    cache_path = None
+    if cache_dir:
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        cache_path = os.path.join(cache_dir, f"{digest}.parquet")
+        if os.path.exists(cache_path):
+            try:
+                df = pd.read_parquet(cache_path)
+                print(f"读取缓存副本，共 {df.shape[0]} 行，{df.shape[1]} 列。")
+                _remember(key, df)
+                return df.copy(deep=False)
+            except Exception as e:
+                print(f"⚠️ 缓存副本 {cache_path} 读取失败，重新解析：{e}")
+
+    # ---------- 3. 解析 Excel ----------
+    df = pd.read_excel(file_path)
+    print(f"读取数据，共 {df.shape[0]} 行，{df.shape[1]} 列。")
+
+    if exclude_cols:
+        df = df.drop(columns=exclude_cols, errors='ignore')
+    print(f"排除后剩余 {df.shape[1]} 列。")
+
+    df = encode_dummies(df, max_levels, high_cardinality)
+    print("已自动虚拟变量化。")
+
+    if cache_path:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            # 先写临时文件再替换，多个进程同时缓存同一文件时不会读到写了一半的副本
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, cache_path)
+        except Exception as e:
+            # 缺少 pyarrow 或列类型无法列存时，仅使用内存缓存
+            print(f"⚠️ 无法写入缓存副本：{e}")
+
+    _remember(key, df)
+    return df.copy(deep=False)
+
+
+def _remember(key, df):
+    _MEMORY_CACHE[key] = df
+    _MEMORY_CACHE.move_to_end(key)
+    while len(_MEMORY_CACHE) > _MEMORY_CACHE_SIZE:
+        _MEMORY_CACHE.popitem(last=False)
+
+
+def clear_cache():
+    """清空内存缓存（含文件内容哈希的记忆）"""
+    _MEMORY_CACHE.clear()
+    _HASH_MEMO.clear()
@@ -0,0 +1,40 @@
+import numpy as np
+from BatchOLS import numeric_block
+
+
+class DesignMatrix:
+    """
+    预编译设计矩阵：数据集一次性编码为连续的 float64 数组，并建立列名索引。
+    拟合时按列下标取子集，不再经过公式解析，列名含空格或符号也不受影响。
+    布尔虚拟变量按 0/1 编码，缺失值为 NaN，非数值列整列为 NaN。
+    """
+
+    def __init__(self, df):
+        self.columns = list(df.columns)
+        self.index = {c: j for j, c in enumerate(self.columns)}
+        values, ok = numeric_block(df, self.columns)
+        self.values = np.ascontiguousarray(values)
+        self.numeric = dict(zip(self.columns, ok))
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    def idx(self, names):
+        """列名 → 列下标"""
+        return [self.index[c] for c in names]
+
+    def column(self, name):
+        """取单列（视图）"""
+        return self.values[:, self.index[name]]
+
+    def block(self, names):
+        """取若干列，返回 (n, k) 数组"""
+        return self.values[:, self.idx(names)]
+
+    def is_numeric(self, names):
+        return all(self.numeric.get(c, False) for c in names)
+
+    def complete_rows(self, names):
+        """给定列均非缺失的行（与公式拟合的列表删除一致）"""
+        return ~np.isnan(self.block(names)).any(axis=1)
@@ -0,0 +1,480 @@
+import os
+import json
+import hashlib
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from scipy import stats
+from DataCache import file_fingerprint
+
+# 内存缓存：键为 (文件指纹, 排除列, 乘积列, 缺失模式上限)，值为 GramMatrix
+_MEMORY_CACHE = OrderedDict()
+_MEMORY_CACHE_SIZE = 8
+
+# 未指定 max_patterns 时，按缺失模式累积的交叉积总内存上限
+PATTERN_MEMORY_MB = 256
+
+
+# ---------------------------- 分块读取 ----------------------------
+def iter_row_chunks(file_path, chunksize=50000, columns=None):
+    """
+    逐块读取数据文件，每块为一个 DataFrame，整表不需要同时载入内存。
+    支持 .xlsx / .xlsm（openpyxl 只读模式，仅第一个工作表）、.csv、.sav / .zsav（pyreadstat）、.parquet（pyarrow）。
+    参数：
+        file_path : str, 数据文件路径
+        chunksize : int, 每块行数
+        columns : list, 只读取这些列（None 表示全部列）
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == ".csv":
+        yield from pd.read_csv(file_path, chunksize=chunksize, usecols=columns)
+    elif ext == ".parquet":
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(file_path).iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    elif ext in (".sav", ".zsav"):
+        import pyreadstat
+        for chunk, _ in pyreadstat.read_file_in_chunks(pyreadstat.read_sav, file_path, chunksize=chunksize,
+                                                       usecols=columns):
+            yield chunk
+    elif ext in (".xlsx", ".xlsm"):
+        from openpyxl import load_workbook
+        wb = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            rows = wb.worksheets[0].iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            header = [h if h is not None else f"Unnamed: {j}" for j, h in enumerate(header)]
+            buffer = []
+            for row in rows:
+                if all(v is None for v in row):
+                    continue
+                buffer.append(row[:len(header)] + (None,) * (len(header) - len(row)))
+                if len(buffer) >= chunksize:
+                    yield _records_frame(buffer, header, columns)
+                    buffer = []
+            if buffer:
+                yield _records_frame(buffer, header, columns)
+        finally:
+            wb.close()
+    else:
+        raise ValueError(f"不支持的文件格式: {ext}")
+
+
+def _records_frame(rows, header, columns=None):
+    df = pd.DataFrame.from_records(rows, columns=header)
+    return df[columns] if columns is not None else df
+
+
+def _is_numeric_column(s):
+    """数值 / 布尔列，或非缺失值均可转换为数值的对象列（如含缺失的布尔列）"""
+    if pd.api.types.is_bool_dtype(s) or pd.api.types.is_numeric_dtype(s):
+        return True
+    if s.dtype != object:
+        return False
+    values = s.dropna()
+    return bool(pd.to_numeric(values, errors="coerce").notna().all())
+
+
+def _first_mean(values):
+    """各列非缺失值的均值（全缺失列为 0），作为累积时的位移"""
+    cnt = (~np.isnan(values)).sum(axis=0)
+    return np.where(cnt > 0, np.nansum(values, axis=0) / np.maximum(cnt, 1), 0.0)
+
+
+def _to_float(s):
+    if pd.api.types.is_bool_dtype(s) or pd.api.types.is_numeric_dtype(s):
+        return s.to_numpy(dtype=float, na_value=np.nan)
+    return pd.to_numeric(s, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+
+
+# ---------------------------- 交叉积充分统计量 ----------------------------
+class GramMatrix:
+    """
+    流式交叉积引擎：逐块读入数据行，一次遍历累积全部数值列（含截距列）的交叉积矩阵，
+    之后任意列子集的线性回归系数、标准误与 p 值都由交叉积求得，不再访问原始数据行。
+
+    缺失值的处理：
+        成对删除统计量：每对列在两列均非缺失的行上的计数、求和与交叉积（pairwise_counts 可查看计数）；
+        列表删除统计量：按缺失模式（哪些列缺失）分别累积交叉积，某个列子集的列表删除交叉积即为
+        该子集全部非缺失的缺失模式之和，与逐行删除后拟合完全一致。缺失模式超过 max_patterns 时
+        停止按模式累积，之后只能使用成对删除（近似解，无缺失时与列表删除相同）。
+        缺失模式数不超过行数，也不超过 2^列数；各列缺失率低、缺失集中在少数列时通常远小于上限。
+    数值稳定：各列先减去首块均值再累积；乘积列由中心化后的两列相乘得到，避免与原列高度共线。
+    求解后系数经线性变换换算回原始列（含原始乘积列 X·Z）的参数化。
+    """
+
+    def __init__(self, columns=None, exclude=(), product_with=None, max_patterns=None):
+        """
+        参数：
+            columns : list, 参与累积的数值列（None 表示按首块自动识别数值 / 布尔列，文本列不参与；
+                      之后的数据块中这些列出现非数值内容时报错，不会静默记为缺失）
+            exclude : list, 不参与累积的列
+            product_with : str, 指定时额外累积该列与其余每个数值列的乘积列（命名为 "X×Z"，用于交互项）
+            max_patterns : int, 按缺失模式累积的模式数上限（None 表示按 PATTERN_MEMORY_MB 内存上限折算；
+                           0 表示只保留成对删除统计量）
+        """
+        self.columns = list(columns) if columns is not None else None
+        self.exclude = set(exclude or ())
+        self.product_with = product_with
+        self.max_patterns = max_patterns
+        self.n_rows = 0
+        self.names = None
+        # 自动识别数值列时未参与累积的非数值列（批量引擎会将其编码为虚拟变量）
+        self.dropped = []
+
+    # ---------- 累积 ----------
+    def _setup(self, chunk):
+        if self.columns is None:
+            self.columns = [c for c in chunk.columns if c not in self.exclude and _is_numeric_column(chunk[c])]
+            self.dropped = [c for c in chunk.columns if c not in self.exclude and c not in self.columns]
+        missing = [c for c in self.columns if c not in chunk.columns]
+        if missing:
+            raise ValueError(f"数据中缺少列: {missing}")
+        products = []
+        if self.product_with is not None:
+            if self.product_with not in self.columns:
+                raise ValueError(f"乘积列的基准列 {self.product_with} 不是数值列")
+            products = [(self.product_with, c) for c in self.columns if c != self.product_with]
+        base = {c: j for j, c in enumerate(self.columns)}
+        self.products = [(base[a], base[b]) for a, b in products]
+        self.names = self.columns + [f"{a}×{b}" for a, b in products]
+        # 截距位于第 0 列
+        self.index = {c: j + 1 for j, c in enumerate(self.names)}
+        # 每列依赖的原始列（决定其缺失模式）
+        self.deps = {c: [j] for c, j in base.items()}
+        self.deps.update({f"{a}×{b}": [base[a], base[b]] for a, b in products})
+        self.parents = {f"{a}×{b}": (a, b) for a, b in products}
+        q = len(self.names) + 1
+        if self.max_patterns is None:
+            self.max_patterns = max(1, int(PATTERN_MEMORY_MB * 2 ** 20 / (8 * q * q)))
+        self.shift = None
+        self.count = np.zeros((q, q))
+        self.sums = np.zeros((q, q))
+        self.cross = np.zeros((q, q))
+        self._pattern_keys = {} if self.max_patterns else None
+        self._pattern_obs, self._pattern_gram = [], []
+        self._stacked = None
+
+    def update(self, chunk):
+        """累积一块数据行（DataFrame）"""
+        if self.names is None:
+            self._setup(chunk)
+        n = len(chunk)
+        if n == 0:
+            return self
+        mixed = [c for c in self.columns if not _is_numeric_column(chunk[c])]
+        if mixed:
+            raise ValueError(f"列 {mixed} 在第 {self.n_rows + 1}–{self.n_rows + n} 行含非数值内容，"
+                             f"交叉积引擎无法累积；请清洗数据或将其加入 exclude")
+        base = np.column_stack([_to_float(chunk[c]) for c in self.columns]) if self.columns else np.zeros((n, 0))
+        if self.shift is None:
+            self.shift = np.concatenate([[0.0], _first_mean(base)])
+        cols = [np.ones((n, 1)), base]
+        if self.products:
+            a, b = np.array(self.products).T
+            centered = base - self.shift[1:1 + len(self.columns)]
+            prods = centered[:, a] * centered[:, b]
+            if len(self.shift) == 1 + len(self.columns):
+                self.shift = np.concatenate([self.shift, _first_mean(prods)])
+            cols.append(prods)
+        values = np.column_stack(cols)
+        obs = ~np.isnan(values)
+        z = np.where(obs, values - self.shift, 0.0)
+        o = obs.astype(float)
+
+        # ---------- 1. 成对删除统计量 ----------
+        self.count += o.T @ o
+        self.sums += z.T @ o
+        self.cross += z.T @ z
+        self.n_rows += n
+
+        # ---------- 2. 按缺失模式累积（列表删除） ----------
+        if self._pattern_keys is not None:
+            self._stacked = None
+            keys = np.packbits(obs[:, 1:1 + len(self.columns)], axis=1)
+            uniq, inverse = np.unique(keys, axis=0, return_inverse=True)
+            inverse = inverse.ravel()
+            order = np.argsort(inverse, kind="stable")
+            bounds = np.cumsum(np.bincount(inverse, minlength=len(uniq)))[:-1]
+            for u, rows in enumerate(np.split(order, bounds)):
+                key = uniq[u].tobytes()
+                j = self._pattern_keys.get(key)
+                if j is None:
+                    if len(self._pattern_keys) >= self.max_patterns:
+                        print(f"⚠️ 缺失模式超过 {self.max_patterns} 种，停止按模式累积，列表删除精确解不可用")
+                        self._pattern_keys = None
+                        self._pattern_obs = self._pattern_gram = None
+                        break
+                    j = self._pattern_keys[key] = len(self._pattern_keys)
+                    self._pattern_obs.append(obs[rows[0], 1:1 + len(self.columns)])
+                    self._pattern_gram.append(np.zeros(self.count.shape))
+                zu = z[rows]
+                self._pattern_gram[j] += zu.T @ zu
+        return self
+
+    @classmethod
+    def from_frame(cls, df, chunksize=50000, **kwargs):
+        """由内存中的 DataFrame 分块累积（参数同构造函数）"""
+        gram = cls(**kwargs)
+        for start in range(0, max(len(df), 1), chunksize):
+            gram.update(df.iloc[start:start + chunksize])
+        return gram
+
+    @classmethod
+    def from_file(cls, file_path, chunksize=50000, **kwargs):
+        """由数据文件流式累积（格式见 iter_row_chunks；参数同构造函数）"""
+        gram = cls(**kwargs)
+        for chunk in iter_row_chunks(file_path, chunksize):
+            gram.update(chunk)
+        if gram.names is None:
+            raise ValueError(f"文件 {file_path} 没有数据")
+        print(f"流式累积交叉积，共 {gram.n_rows} 行，{len(gram.columns)} 个数值列。")
+        gram.report_dropped()
+        return gram
+
+    def report_dropped(self):
+        """打印未参与累积的非数值列：交叉积引擎不做虚拟变量编码，候选集合与批量引擎不同"""
+        if self.dropped:
+            print(f"⚠️ {len(self.dropped)} 个非数值列未参与累积（交叉积引擎不做虚拟变量编码）："
+                  f"{', '.join(map(str, self.dropped))}")
+
+    # ---------- 查询 ----------
+    @property
+    def exact(self):
+        """是否可给出列表删除的精确解"""
+        return self._pattern_keys is not None
+
+    def pairwise_counts(self):
+        """每对列均非缺失的行数（DataFrame）"""
+        return pd.DataFrame(self.count[1:, 1:], index=self.names, columns=self.names)
+
+    def _patterns(self):
+        """按缺失模式累积的 (模式数, 列数) 非缺失标记与 (模式数, q, q) 交叉积（堆叠结果缓存到下次累积）"""
+        if self._stacked is None:
+            q = self.count.shape[0]
+            self._stacked = (np.array(self._pattern_obs, dtype=bool).reshape(-1, len(self.columns)),
+                             np.array(self._pattern_gram).reshape(-1, q, q))
+        return self._stacked
+
+    def _listwise_gram(self, idx, names):
+        base = sorted({d for c in names for d in self.deps[c]})
+        obs, grams = self._patterns()
+        mask = obs[:, base].all(axis=1)
+        return grams[np.ix_(mask, idx, idx)].sum(axis=0)
+
+    def _pairwise_gram(self, idx):
+        """
+        由成对删除统计量构造等效交叉积：各列均值取自身非缺失行，协方差取成对非缺失行，
+        样本量取各对计数的最小值。
+        """
+        v = idx[1:]
+        cnt = self.count[np.ix_(v, v)]
+        s = self.sums[np.ix_(v, v)]
+        nobs = cnt.min() if len(v) else self.count[0, 0]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cov = (self.cross[np.ix_(v, v)] - s * s.T / cnt) / (cnt - 1)
+            mean = np.diag(s) / np.diag(cnt)
+        gram = np.empty((len(idx), len(idx)))
+        gram[0, 0] = nobs
+        gram[0, 1:] = gram[1:, 0] = nobs * mean
+        gram[1:, 1:] = (nobs - 1) * cov + nobs * np.outer(mean, mean)
+        return gram
+
+    def _design_map(self, xs):
+        """
+        原始列与累积列的线性关系：原始设计矩阵 = 累积列设计矩阵 @ design_map。
+        累积列为 x' = x - 位移(x)，乘积列 w = x'z' - 位移(w)，因此
+            x = x' + 位移(x)，X·Z = w + 位移(w) + 位移(z)·x' + 位移(x)·z' + 位移(x)·位移(z)。
+        乘积列的原列不在 xs 中时补入累积列。
+        返回：
+            stored : list, 求解所用的累积列（xs 及补入的原列）
+            design_map : ndarray, (len(stored) + 1, len(xs) + 1)，第 0 行 / 列为截距
+        """
+        stored = list(dict.fromkeys(xs))
+        for c in xs:
+            stored += [parent for parent in self.parents.get(c, ()) if parent not in stored]
+        pos = {c: i + 1 for i, c in enumerate(stored)}
+        design_map = np.zeros((len(stored) + 1, len(xs) + 1))
+        design_map[0, 0] = 1.0
+        for i, c in enumerate(xs, start=1):
+            design_map[pos[c], i] = 1.0
+            design_map[0, i] = self.shift[self.index[c]]
+            if c in self.parents:
+                a, b = self.parents[c]
+                sa, sb = self.shift[self.index[a]], self.shift[self.index[b]]
+                design_map[0, i] += sa * sb
+                design_map[pos[a], i] += sb
+                design_map[pos[b], i] += sa
+        return stored, design_map
+
+    def ols(self, y, xs, blocks=(), missing="auto"):
+        """
+        由交叉积求解 y ~ 截距 + xs 的最小二乘，并对若干参数块做整体 F 检验（与 BatchOLS.ols_ftest 相同）。
+        参数：
+            y : str, 因变量列名
+            xs : list, 自变量列名（可含乘积列 "X×Z"）
+            blocks : list, 每个元素为需整体检验的参数下标列表（截距为第 0 列）
+            missing : str, "listwise" 列表删除（精确，需按缺失模式累积）、"pairwise" 成对删除、
+                      "auto" 可用时列表删除，否则成对删除
+        返回：
+            dict，params / bse / tvalues / pvalues 为 (p,)，f_pvalues 为 (len(blocks),)，nobs、df_resid、ssr 为标量；
+            秩亏或样本不足时各项为 NaN
+        """
+        xs = list(xs)
+        stored, design_map = self._design_map(xs)
+        names = stored + [y]
+        idx = [0] + [self.index[c] for c in names]
+        if missing == "auto":
+            missing = "listwise" if self.exact else "pairwise"
+        if missing == "listwise":
+            if not self.exact:
+                raise ValueError("缺失模式过多，列表删除的精确解不可用，请使用 missing='pairwise'")
+            gram = self._listwise_gram(idx, names)
+        elif missing == "pairwise":
+            gram = self._pairwise_gram(idx)
+        else:
+            raise ValueError(f"未知的缺失值处理方式: {missing}")
+
+        p, k = len(xs) + 1, len(stored) + 1
+        xtx, xty, yty = gram[:k, :k], gram[:k, k], gram[k, k]
+        nobs = gram[0, 0]
+        out = {name: np.full(p, np.nan) for name in ("params", "bse", "tvalues", "pvalues")}
+        out["f_pvalues"] = np.full(len(blocks), np.nan)
+        out["nobs"] = nobs
+        out["df_resid"] = nobs - p
+        out["ssr"] = np.nan
+        if not np.all(np.isfinite(gram)) or nobs <= p:
+            return out
+
+        # ---------- 1. 选择求解基：累积列与原始列张成同一空间时在累积列上求解，再换算系数；
+        #               乘积列缺少其原列时，在「原始列去掉位移」的列上求解（截距已在模型中，位移只影响截距） ----------
+        if k == p:
+            if np.linalg.matrix_rank(design_map) < p:
+                return out
+            transform = np.linalg.inv(design_map)
+        else:
+            work = design_map.copy()
+            work[0, 1:] = 0.0
+            xtx, xty = work.T @ xtx @ work, work.T @ xty
+            transform = np.eye(p)
+            transform[0, 1:] = -design_map[0, 1:]
+        if np.linalg.matrix_rank(xtx, hermitian=True) < p:
+            return out
+
+        # ---------- 2. 求解 ----------
+        gram_inv = np.linalg.pinv(xtx, hermitian=True)
+        beta = gram_inv @ xty
+        df_resid = nobs - p
+        ssr = max(yty - beta @ xty, 0.0)
+        scale = ssr / df_resid
+
+        # ---------- 3. 换算回原始列的参数化（因变量的位移计入截距） ----------
+        params = transform @ beta
+        params[0] += self.shift[self.index[y]]
+        cov = scale * transform @ gram_inv @ transform.T
+        bse = np.sqrt(np.diag(cov))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            tvalues = params / bse
+        out.update(params=params, bse=bse, tvalues=tvalues, pvalues=2 * stats.t.sf(np.abs(tvalues), df_resid),
+                   ssr=ssr)
+
+        # ---------- 4. 分块 F 检验（Wald 形式） ----------
+        for i, block in enumerate(blocks):
+            block = list(block)
+            b = params[block]
+            f_stat = b @ np.linalg.solve(cov[np.ix_(block, block)], b) / len(block)
+            out["f_pvalues"][i] = stats.f.sf(f_stat, len(block), df_resid)
+        return out
+
+    def coef_table(self, y, xs, missing="auto"):
+        """系数表（coef、std err、t、P>|t|），用于输出模型摘要"""
+        res = self.ols(y, xs, missing=missing)
+        return pd.DataFrame({"coef": res["params"], "std err": res["bse"], "t": res["tvalues"],
+                             "P>|t|": res["pvalues"]}, index=["Intercept"] + list(xs))
+
+    # ---------- 存取 ----------
+    def save(self, path):
+        """保存为 .npz（不含原始数据行）"""
+        meta = {"columns": self.columns, "product_with": self.product_with, "max_patterns": self.max_patterns,
+                "n_rows": self.n_rows, "exact": self.exact, "dropped": self.dropped}
+        arrays = {"shift": self.shift, "count": self.count, "sums": self.sums, "cross": self.cross}
+        if self.exact:
+            arrays["pattern_obs"], arrays["pattern_gram"] = self._patterns()
+        np.savez_compressed(path, meta=json.dumps(meta, ensure_ascii=False, default=str), **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            gram = cls(meta["columns"], product_with=meta["product_with"], max_patterns=meta["max_patterns"])
+            gram._setup(pd.DataFrame(columns=meta["columns"]))
+            gram.n_rows = meta["n_rows"]
+            gram.dropped = meta.get("dropped", [])
+            gram.shift, gram.count, gram.sums, gram.cross = data["shift"], data["count"], data["sums"], data["cross"]
+            if meta["exact"]:
+                gram._pattern_obs, gram._pattern_gram = list(data["pattern_obs"]), list(data["pattern_gram"])
+                gram._pattern_keys = {np.packbits(o).tobytes(): j for j, o in enumerate(gram._pattern_obs)}
+            else:
+                gram._pattern_keys = gram._pattern_obs = gram._pattern_gram = None
+        return gram
+
+
+def gram_for_file(file_path, exclude_cols=None, cache_dir=None, product_with=None, chunksize=50000,
+                  max_patterns=None):
+    """
+    文件的交叉积矩阵（流式累积），按文件指纹缓存：同一文件在一次运行中只遍历一次；
+    指定 cache_dir 时另存 .npz 副本，之后对未改动文件的运行直接读取。
+    参数：
+        file_path : str, 数据文件路径（格式见 iter_row_chunks）
+        exclude_cols : list, 不参与累积的列
+        cache_dir : str, 磁盘缓存目录（None 表示只使用内存缓存）
+        product_with : str, 额外累积该列与其余数值列的乘积列（见 GramMatrix）
+        chunksize : int, 每块行数
+        max_patterns : int, 按缺失模式累积的模式数上限
+    返回：
+        GramMatrix
+    """
+    excl = tuple(sorted(map(str, exclude_cols))) if exclude_cols else ()
+    key = (file_fingerprint(file_path), excl, product_with, max_patterns)
+
+    if key in _MEMORY_CACHE:
+        _MEMORY_CACHE.move_to_end(key)
+        return _MEMORY_CACHE[key]
+
+    cache_path = None
+    if cache_dir:
+        digest = hashlib.sha1(repr(("gram",) + key).encode("utf-8")).hexdigest()
+        cache_path = os.path.join(cache_dir, f"{digest}.npz")
+        if os.path.exists(cache_path):
+            try:
+                gram = GramMatrix.load(cache_path)
+                print(f"读取交叉积缓存，共 {gram.n_rows} 行，{len(gram.columns)} 个数值列。")
+                gram.report_dropped()
+                _remember(key, gram)
+                return gram
+            except Exception as e:
+                print(f"⚠️ 交叉积缓存 {cache_path} 读取失败，重新累积：{e}")
+
+    gram = GramMatrix.from_file(file_path, chunksize, exclude=exclude_cols or (), product_with=product_with,
+                                max_patterns=max_patterns)
+
+    if cache_path:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp.npz"
+            gram.save(tmp_path)
+            os.replace(tmp_path, cache_path)
+        except Exception as e:
+            print(f"⚠️ 无法写入交叉积缓存：{e}")
+
+    _remember(key, gram)
+    return gram
+
+
+def _remember(key, gram):
+    _MEMORY_CACHE[key] = gram
+    _MEMORY_CACHE.move_to_end(key)
+    while len(_MEMORY_CACHE) > _MEMORY_CACHE_SIZE:
+        _MEMORY_CACHE.popitem(last=False)
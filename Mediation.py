@@ -1,9 +1,19 @@
 import os
 import pandas as pd
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from scipy import stats
 import statsmodels.formula.api as smf
+from BatchOLS import batched_ols, ols_ftest
+from DesignMatrix import DesignMatrix
+from DataCache import load_dataset, dummy_candidates
+from GramMatrix import gram_for_file
+from ResultStore import append_results, query_results
 
-def mediation_search(file_path, x_var, y_var, exclude_cols=None, output_dir=None):
+def mediation_search(file_path, x_var, y_var, exclude_cols=None, output_dir=None, engine="batch", cache_dir=None,
+                     n_boot=0, ci_level=0.95, seed=None, n_jobs=1,
+                     store_path=None, write_excel=True,
+                     group_dummies=True, max_levels=50, high_cardinality="skip"):
     """
     自动测试Excel中每个变量作为中介变量（M）的显著性，输出a、b、c'路径及p值结果。
     参数：
@@ -12,29 +22,244 @@ def mediation_search(file_path, x_var, y_var, exclude_cols=None, output_dir=None
         y_var : str, 因变量列名
         exclude_cols : list, 要排除的列名
         output_dir : str, 输出目录（默认为输入文件所在目录）
+        engine : str, "batch" 为批量矩阵引擎（默认）；"statsmodels" 为逐候选公式拟合的参考实现；
+                 "gram" 为流式交叉积引擎（不整表载入，只使用数值列，见 _mediation_gram）
+        cache_dir : str, 数据集磁盘缓存目录（默认只使用内存缓存）
+        n_boot : int, 间接效应 a×b 的 bootstrap 重抽样次数（0 表示不计算置信区间；gram 引擎不支持）
+        ci_level : float, 置信水平，默认 0.95
+        seed : int, 随机种子（保证结果可复现）
+        n_jobs : int, bootstrap 并行进程数
+        store_path : str, SQLite 结果库路径（写入结果并标注 file_name、y_var）
+        write_excel : bool, 是否输出 Excel 结果文件
+        group_dummies : bool, 同一文本列的多个虚拟变量是否作为一个候选整体检验（F 检验，见 _mediation_grouped）
+        max_levels : int, 文本列允许的最大水平数（见 DataCache.encode_dummies）
+        high_cardinality : str, 高基数文本列的处理方式，"skip" 或 "cap"
     """
 
-    # ---------- 1. 读取数据 ----------
-    df = pd.read_excel(file_path)
-    print(f"读取数据，共 {df.shape[0]} 行，{df.shape[1]} 列。")
+    if engine == "gram":
+        return _mediation_search_gram(file_path, x_var, y_var, exclude_cols, output_dir, cache_dir, n_boot,
+                                      store_path, write_excel)
 
-    # ---------- 2. 排除指定列 ----------
-    if exclude_cols:
-        df = df.drop(columns=exclude_cols, errors='ignore')
-    print(f"排除后剩余 {df.shape[1]} 列。")
-
-    # ---------- 3. 虚拟变量化 ----------
-    df = pd.get_dummies(df, drop_first=True)
-    print("已自动虚拟变量化。")
+    # ---------- 1~3. 读取数据、排除指定列、虚拟变量化（按文件指纹缓存） ----------
+    df = load_dataset(file_path, exclude_cols, cache_dir, max_levels, high_cardinality)
 
     if x_var not in df.columns or y_var not in df.columns:
         raise ValueError(f"未找到自变量 {x_var} 或因变量 {y_var}")
 
     # ---------- 4. 确定候选变量 ----------
-    candidates = [c for c in df.columns if c not in [x_var, y_var]]
+    candidates, groups = dummy_candidates(df, [x_var, y_var], group_dummies)
+    singles = [c for c in candidates if c not in groups]
+
+    # ---------- 5. 中介分析 ----------
+    design = DesignMatrix(df)
+    if engine == "batch":
+        results = _mediation_batch(design, x_var, y_var, singles)
+    elif engine == "statsmodels":
+        results = _mediation_reference(df, x_var, y_var, singles)
+    else:
+        raise ValueError(f"未知的计算引擎: {engine}")
+    if groups:
+        rows = dict(zip(singles, results))
+        rows.update(zip(groups, _mediation_grouped(design, x_var, y_var, groups)))
+        results = [rows[c] for c in candidates]
+
+    # ---------- 6. 输出结果 ----------
+    return _finish_mediation(pd.DataFrame(results), design, x_var, y_var, singles, file_path, output_dir,
+                             n_boot, ci_level, seed, n_jobs, store_path, write_excel)
+
+
+def mediation_search_multi(file_path, x_var, y_vars, exclude_cols=None, output_dir=None, cache_dir=None,
+                           n_boot=0, ci_level=0.95, seed=None, n_jobs=1,
+                           store_path=None, write_excel=True,
+                           group_dummies=True, max_levels=50, high_cardinality="skip"):
+    """
+    多响应模式：一次读取文件，同时完成全部因变量的中介分析（批量矩阵引擎）。
+    a 路径（M ~ X）与因变量无关，只求解一次；各因变量的 b、c' 路径与 c 路径作为多列因变量一次求解。
+    每个因变量的结果与 mediation_search 逐个调用完全一致，输出到 output_dir/<因变量>/ 下的同名文件。
+    参数：
+        y_vars : list, 因变量列名；缺失或非数值的因变量跳过并打印错误
+        output_dir : str, 输出根目录（默认为输入文件所在目录），每个因变量一个子文件夹
+        其余参数同 mediation_search
+    返回：
+        dict，{因变量: 结果 DataFrame}
+    """
+    df = load_dataset(file_path, exclude_cols, cache_dir, max_levels, high_cardinality)
+    design = DesignMatrix(df)
+    if x_var not in df.columns or not design.is_numeric([x_var]):
+        raise ValueError(f"未找到自变量 {x_var} 或其不是数值列")
+    if output_dir is None:
+        output_dir = os.path.dirname(file_path)
+
+    # ---------- 1. 各因变量的候选变量；共享求解使用其并集 ----------
+    plans = {}
+    for y_var in y_vars:
+        if y_var not in df.columns or not design.is_numeric([y_var]):
+            print(f"❌ 因变量 {y_var} 未找到或不是数值列，已跳过")
+            continue
+        plans[y_var] = dummy_candidates(df, [x_var, y_var], group_dummies)
+    if not plans:
+        return {}
+    all_singles, all_groups = set(), {}
+    for candidates, groups in plans.values():
+        all_singles.update(c for c in candidates if c not in groups)
+        all_groups.update(groups)
+    all_singles = [c for c in df.columns if c in all_singles]
+
+    # ---------- 2. 共享 a 路径，多列求解 b、c'、c 路径 ----------
+    single_rows = _mediation_batch_multi(design, x_var, list(plans), all_singles)
+    group_rows = _mediation_grouped_multi(design, x_var, list(plans), all_groups) if all_groups else {}
+
+    # ---------- 3. 按因变量整理并输出（与逐个调用相同） ----------
+    out = {}
+    for y_var, (candidates, groups) in plans.items():
+        rows = dict(zip(all_singles, single_rows[y_var]))
+        if groups:
+            rows.update(zip(all_groups, group_rows[y_var]))
+        singles = [c for c in candidates if c not in groups]
+        out[y_var] = _finish_mediation(pd.DataFrame([rows[c] for c in candidates]), design, x_var, y_var, singles,
+                                       file_path, os.path.join(output_dir, y_var), n_boot, ci_level, seed, n_jobs,
+                                       store_path, write_excel)
+    return out
+
+
+def _mediation_search_gram(file_path, x_var, y_var, exclude_cols, output_dir, cache_dir, n_boot,
+                           store_path, write_excel):
+    """
+    流式交叉积引擎的 mediation_search：按块读取文件并累积交叉积（按文件指纹缓存，多个因变量共用），
+    全部路径由交叉积求解，适用于无法整表载入内存的大文件。文本列不参与（不做虚拟变量化）。
+    """
+    gram = gram_for_file(file_path, exclude_cols, cache_dir)
+    if x_var not in gram.columns or y_var not in gram.columns:
+        raise ValueError(f"未找到自变量 {x_var} 或因变量 {y_var}（或不是数值列）")
+    if n_boot:
+        print("⚠️ 交叉积引擎不访问原始数据行，不计算 bootstrap 置信区间")
+    candidates = [c for c in gram.columns if c not in (x_var, y_var)]
+    return _finish_mediation(pd.DataFrame(_mediation_gram(gram, x_var, y_var, candidates)), None, x_var, y_var,
+                             candidates, file_path, output_dir, 0, None, None, 1, store_path, write_excel)
+
+
+def _finish_mediation(df_result, design, x_var, y_var, singles, file_path, output_dir,
+                      n_boot, ci_level, seed, n_jobs, store_path, write_excel):
+    """
+    补充 bootstrap 置信区间，并写出 Excel 结果文件 / 结果库（mediation_search 与多响应模式共用）。
+    """
+    if n_boot:
+        # 虚拟变量组没有单一的 a×b，置信区间为 NaN
+        boot = bootstrap_indirect(design.column(x_var), design.column(y_var), design.block(singles),
+                                  n_boot, ci_level, seed, n_jobs)
+        is_single = df_result["中介变量"].isin(singles).to_numpy()
+        for col, key in (("间接效应(a×b)", "indirect"), ("间接效应CI下限(百分位)", "pct_low"),
+                         ("间接效应CI上限(百分位)", "pct_high"), ("间接效应CI下限(BC)", "bc_low"),
+                         ("间接效应CI上限(BC)", "bc_high")):
+            df_result[col] = np.nan
+            df_result.loc[is_single, col] = boot[key]
+        print(f"已完成 {n_boot} 次 bootstrap（置信水平 {ci_level:.0%}）。")
+    if output_dir is None:
+        output_dir = os.path.dirname(file_path)
+    os.makedirs(output_dir, exist_ok=True)
+
+    base_name = os.path.splitext(os.path.basename(file_path))[0]
+    save_path = os.path.join(output_dir, f"{base_name}_mediation.xlsx")
+
+    if write_excel:
+        df_result.to_excel(save_path, index=False)
+        print(f"中介分析结果已保存至：{save_path}")
+
+    if store_path:
+        append_results(store_path, df_result, "mediation", os.path.basename(save_path), y_var)
+        print(f"中介分析结果已写入结果库：{store_path}")
+
+    return df_result
+
+
+def _mediation_batch(design, x_var, y_var, candidates):
+    """
+    批量矩阵引擎：所有候选变量的 a 路径作为多响应回归一次求解，
+    c 路径只拟合一次，b、c' 路径由共享交叉积批量求解。
+    每个候选按自身缺失情况做列表删除，结果与逐候选拟合一致；布尔虚拟变量按 0/1 处理。
+    design 为预编译设计矩阵（DesignMatrix）。
+    """
+    if not design.is_numeric([x_var, y_var]):
+        raise ValueError(f"自变量 {x_var} 或因变量 {y_var} 不是数值列")
+    return _mediation_batch_multi(design, x_var, [y_var], candidates)[y_var]
+
+
+def _mediation_batch_multi(design, x_var, y_vars, candidates):
+    """
+    多响应批量引擎：a 路径（M ~ X）与因变量无关，只求解一次；
+    全部 (因变量, 候选) 组合的 b、c' 路径堆叠为一次批量求解，各因变量的 c 路径同样一次求解。
+    返回：
+        dict，{因变量: 与 candidates 对应的结果行列表}
+    """
+    x = design.column(x_var)
+    ys = design.block(y_vars)
+    m_values = design.block(candidates)
+    m_ok = np.array([design.numeric[c] for c in candidates], dtype=bool)
+    n_y, k = len(y_vars), len(candidates)
+
+    x_valid = ~np.isnan(x)
+    xm_valid = x_valid[:, None] & ~np.isnan(m_values)
+    y_valid = ~np.isnan(ys)
+
+    # a 路径：M ~ X（多响应）
+    res_a = batched_ols([x], m_values, xm_valid)
+    # b、c' 路径：Y ~ X + M，列顺序为 (因变量, 候选)
+    res_b = batched_ols([x, np.tile(m_values, (1, n_y))], np.repeat(ys, k, axis=1),
+                        np.tile(xm_valid, (1, n_y)) & np.repeat(y_valid, k, axis=1))
+    # c 路径（总效应：Y ~ X），与候选无关，每个因变量只拟合一次
+    res_c = batched_ols([x], ys, x_valid[:, None] & y_valid)
+
+    for j, m in enumerate(candidates):
+        if not m_ok[j]:
+            print(f"变量 {m} 出错：非数值列")
+
+    out = {}
+    for i, y_var in enumerate(y_vars):
+        beta_c, p_c = res_c["params"][i, 1], res_c["pvalues"][i, 1]
+        results = []
+        for j, m in enumerate(candidates):
+            b = i * k + j
+            row = {
+                "中介变量": m,
+                "β(X→M)": res_a["params"][j, 1], "p(X→M)": res_a["pvalues"][j, 1],
+                "β(M→Y)": res_b["params"][b, 2], "p(M→Y)": res_b["pvalues"][b, 2],
+                "β(X→Y)总效应(c)": beta_c, "p(X→Y)总效应(c)": p_c,
+                "β(X→Y)直接效应(c')": res_b["params"][b, 1], "p(X→Y)直接效应(c')": res_b["pvalues"][b, 1]
+            }
+            if not m_ok[j]:
+                row.update({key: np.nan for key in row if key != "中介变量"})
+            results.append(row)
+        out[y_var] = results
+
+    return out
+
+
+def _mediation_gram(gram, x_var, y_var, candidates, missing="auto"):
+    """
+    交叉积引擎：a、b、c、c' 路径均由 GramMatrix 的交叉积求解，不再访问原始数据行。
+    可按缺失模式给出列表删除精确解时结果与批量矩阵引擎一致，否则为成对删除近似（见 GramMatrix）。
+    """
+    res_c = gram.ols(y_var, [x_var], missing=missing)
+    results = []
+    for m in candidates:
+        res_a = gram.ols(m, [x_var], missing=missing)
+        res_b = gram.ols(y_var, [x_var, m], missing=missing)
+        results.append({
+            "中介变量": m,
+            "β(X→M)": res_a["params"][1], "p(X→M)": res_a["pvalues"][1],
+            "β(M→Y)": res_b["params"][2], "p(M→Y)": res_b["pvalues"][2],
+            "β(X→Y)总效应(c)": res_c["params"][1], "p(X→Y)总效应(c)": res_c["pvalues"][1],
+            "β(X→Y)直接效应(c')": res_b["params"][1], "p(X→Y)直接效应(c')": res_b["pvalues"][1]
+        })
+    return results
+
+
+def _mediation_reference(df, x_var, y_var, candidates):
+    """
+    参考实现：对每个候选变量分别用 statsmodels 公式拟合 a、b、c、c' 路径。
+    """
     results = []
 
-    # ---------- 5. 循环进行中介分析 ----------
     for m in candidates:
         try:
             # a 路径：M ~ X
@@ -69,22 +294,516 @@ def mediation_search(file_path, x_var, y_var, exclude_cols=None, output_dir=None
             "β(X→Y)直接效应(c')": beta_c_prime, "p(X→Y)直接效应(c')": p_c_prime
         })
 
-    # ---------- 6. 输出结果 ----------
-    df_result = pd.DataFrame(results)
+    return results
+
+
+def _mediation_grouped(design, x_var, y_var, groups):
+    """
+    虚拟变量组（同一文本列的多个虚拟变量 D）作为一个中介候选整体检验：
+        a 路径：X ~ D 的整体 F 检验（与单列时 M ~ X 的 t 检验同为 X 与 M 的关联检验）；
+        b 路径：Y ~ X + D 中 D 的整体 F 检验，c' 为该模型中 X 的系数；
+        c 路径与单列候选相同（Y ~ X）。
+    多个系数没有单一的 β，β(X→M)、β(M→Y) 记为 NaN。
+    """
+    return _mediation_grouped_multi(design, x_var, [y_var], groups)[y_var]
+
+
+def _mediation_grouped_multi(design, x_var, y_vars, groups):
+    """
+    _mediation_grouped 的多响应版本：各分组的 a 路径 F 检验只计算一次，b、c 路径按因变量分别计算。
+    返回：
+        dict，{因变量: 与 groups 顺序对应的结果行列表}
+    """
+    x = design.column(x_var)
+    p_a = {name: ols_ftest([design.block(cols)], x, [range(1, len(cols) + 1)])["f_pvalues"][0]
+           for name, cols in groups.items()}
+    out = {}
+    for y_var in y_vars:
+        y = design.column(y_var)
+        res_c = ols_ftest([x], y)
+        results = []
+        for name, cols in groups.items():
+            d = design.block(cols)
+            q = d.shape[1]
+            res_b = ols_ftest([x, d], y, [range(2, q + 2)])
+            results.append({
+                "中介变量": name,
+                "β(X→M)": np.nan, "p(X→M)": p_a[name],
+                "β(M→Y)": np.nan, "p(M→Y)": res_b["f_pvalues"][0],
+                "β(X→Y)总效应(c)": res_c["params"][1], "p(X→Y)总效应(c)": res_c["pvalues"][1],
+                "β(X→Y)直接效应(c')": res_b["params"][1], "p(X→Y)直接效应(c')": res_b["pvalues"][1]
+            })
+        out[y_var] = results
+    return out
+
+
+# ---------------------------- 双中介（并行 / 链式）搜索 ----------------------------
+def mediation2_search(file_path, x_var, y_var, exclude_cols=None, output_dir=None, cache_dir=None, alpha=0.05,
+                      mode="both", single_results=None, b_screen=None, n_jobs=1, chunk_size=4096,
+                      store_path=None, write_excel=True, group_dummies=True, max_levels=50,
+                      high_cardinality="skip"):
+    """
+    双中介变量搜索，输出到 {文件名}_mediation2.xlsx（parallel、serial 两个 sheet，只写出联合显著的组合）：
+        并行中介 X→M1→Y、X→M2→Y：a1（M1 ~ X）、a2（M2 ~ X）、b1、b2、c'（Y ~ X + M1 + M2），
+            两条特定间接效应 a1×b1、a2×b2 的各路径均显著时写出；
+        链式中介 X→M1→M2→Y：a1（M1 ~ X）、d21（M2 ~ X + M1）、b2、b1、c'（Y ~ X + M1 + M2），
+            a1、d21、b2 均显著时写出（间接效应 a1×d21×b2）。
+    a 路径与单中介分析相同（按 X、M 均非缺失的行），其余模型按所用变量均非缺失的行做列表删除。
+    剪枝：a 路径不显著的组合不可能显著，直接跳过——并行中介要求 a1、a2 均显著，链式中介要求 a1 显著；
+    b_screen 为 p 值阈值时，另外跳过单中介 b 路径（M→Y）p 值不低于 b_screen 的 M2（启发式，可能漏掉抑制效应）。
+    其余组合按 chunk_size 分块批量求解，n_jobs 不为 1 时各块分发到多个进程。
+    参数：
+        alpha : float, 显著性阈值
+        mode : str, "parallel"、"serial" 或 "both"
+        single_results : DataFrame, mediation_search 的结果（未提供时重新计算单中介路径）
+        其余参数同 mediation_search
+    返回：
+        dict，{"parallel": DataFrame, "serial": DataFrame}
+    """
+    if mode not in ("parallel", "serial", "both"):
+        raise ValueError(f"未知的双中介模式: {mode}")
+    df = load_dataset(file_path, exclude_cols, cache_dir, max_levels, high_cardinality)
+    design = DesignMatrix(df)
+    if x_var not in df.columns or y_var not in df.columns or not design.is_numeric([x_var, y_var]):
+        raise ValueError(f"未找到自变量 {x_var} 或因变量 {y_var}（或不是数值列）")
+
+    # ---------- 1. 单中介路径（虚拟变量组没有单一的 a、b 路径，不参与） ----------
+    candidates, groups = dummy_candidates(df, [x_var, y_var], group_dummies)
+    singles = [c for c in candidates if c not in groups and design.numeric[c]]
+    if single_results is None:
+        single_results = pd.DataFrame(_mediation_batch(design, x_var, y_var, singles))
+    single = single_results.set_index("中介变量").reindex(singles)
+    p_a = single["p(X→M)"].to_numpy(dtype=float)
+    a_ok = p_a < alpha
+    m2_ok = np.ones(len(singles), dtype=bool) if b_screen is None else single["p(M→Y)"].to_numpy(dtype=float) < b_screen
+
+    # ---------- 2. 剪枝后的组合 ----------
+    k = len(singles)
+    first, second = np.meshgrid(np.arange(k), np.arange(k), indexing="ij")
+    first, second = first.ravel(), second.ravel()
+    serial = np.column_stack([first, second])[(first != second) & a_ok[first] & m2_ok[second]] \
+        if mode != "parallel" else np.empty((0, 2), dtype=int)
+    parallel = np.column_stack([first, second])[(first < second) & a_ok[first] & a_ok[second]] \
+        if mode != "serial" else np.empty((0, 2), dtype=int)
+    # b 路径模型 Y ~ X + M1 + M2 与顺序无关，并行与链式共用
+    b_pairs = np.unique(np.sort(np.vstack([parallel, serial]), axis=1), axis=0)
+    n_total = k * (k - 1) // 2 * (mode != "serial") + k * (k - 1) * (mode != "parallel")
+    print(f"🔗 双中介候选 {k} 个：并行 {len(parallel)} 对、链式 {len(serial)} 对"
+          f"（剪去 {n_total - len(parallel) - len(serial)} 个组合），共 {len(b_pairs) + len(serial)} 次回归")
+
+    # ---------- 3. 分块批量求解 ----------
+    data = (design.column(x_var), design.column(y_var), design.block(singles))
+    tasks = [("b", b_pairs[i:i + chunk_size]) for i in range(0, len(b_pairs), chunk_size)] + \
+            [("d", serial[i:i + chunk_size]) for i in range(0, len(serial), chunk_size)]
+    if n_jobs != 1 and len(tasks) > 1:
+        if n_jobs is None or n_jobs < 0:
+            n_jobs = os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_pair_worker, initargs=(data,)) as pool:
+            fits = list(pool.map(_pair_chunk, *zip(*tasks)))
+    else:
+        _init_pair_worker(data)
+        fits = [_pair_chunk(kind, pairs) for kind, pairs in tasks]
+    n_b = -(-len(b_pairs) // chunk_size)
+    b_fit = _stack_fits(fits[:n_b], 4)
+    d_fit = _stack_fits(fits[n_b:], 3)
+
+    x, y = data[0], data[1]
+    res_c = batched_ols([x], y, (~np.isnan(x) & ~np.isnan(y))[:, None])
+    beta_a = single["β(X→M)"].to_numpy(dtype=float)
+    names = np.array(singles, dtype=object)
+    common = {"β(X→Y)总效应(c)": res_c["params"][0, 1], "p(X→Y)总效应(c)": res_c["pvalues"][0, 1]}
+
+    # ---------- 4. 整理结果：b 路径模型按 (较小下标, 较大下标) 查找，列 1 为 X ----------
+    def b_lookup(pairs):
+        lo, hi = np.minimum(pairs[:, 0], pairs[:, 1]), np.maximum(pairs[:, 0], pairs[:, 1])
+        row = np.searchsorted(b_pairs[:, 0] * k + b_pairs[:, 1], lo * k + hi)
+        # 第一个中介变量的列：下标较小者在第 2 列
+        col1 = np.where(pairs[:, 0] == lo, 2, 3)
+        return row, col1, 5 - col1
+
+    def take(arr, col):
+        return arr[np.arange(len(col)), col]
+
+    out = {}
+    if mode != "serial":
+        i, j = parallel[:, 0], parallel[:, 1]
+        row, c1, c2 = b_lookup(parallel)
+        params, pvals = b_fit["params"][row], b_fit["pvalues"][row]
+        res = pd.DataFrame({
+            "中介变量1": names[i], "中介变量2": names[j],
+            "β(X→M1)": beta_a[i], "p(X→M1)": p_a[i], "β(X→M2)": beta_a[j], "p(X→M2)": p_a[j],
+            "β(M1→Y)": take(params, c1), "p(M1→Y)": take(pvals, c1),
+            "β(M2→Y)": take(params, c2), "p(M2→Y)": take(pvals, c2),
+            **common,
+            "β(X→Y)直接效应(c')": params[:, 1], "p(X→Y)直接效应(c')": pvals[:, 1],
+        })
+        res["间接效应1(a1×b1)"] = res["β(X→M1)"] * res["β(M1→Y)"]
+        res["间接效应2(a2×b2)"] = res["β(X→M2)"] * res["β(M2→Y)"]
+        res["总间接效应"] = res["间接效应1(a1×b1)"] + res["间接效应2(a2×b2)"]
+        res["联合显著p(max)"] = res[["p(X→M1)", "p(M1→Y)", "p(X→M2)", "p(M2→Y)"]].max(axis=1, skipna=False)
+        out["parallel"] = res
+    if mode != "parallel":
+        i, j = serial[:, 0], serial[:, 1]
+        row, c1, c2 = b_lookup(serial)
+        params, pvals = b_fit["params"][row], b_fit["pvalues"][row]
+        res = pd.DataFrame({
+            "中介变量1": names[i], "中介变量2": names[j],
+            "β(X→M1)": beta_a[i], "p(X→M1)": p_a[i],
+            "β(M1→M2)": d_fit["params"][:, 2], "p(M1→M2)": d_fit["pvalues"][:, 2],
+            "β(X→M2)": d_fit["params"][:, 1], "p(X→M2)": d_fit["pvalues"][:, 1],
+            "β(M2→Y)": take(params, c2), "p(M2→Y)": take(pvals, c2),
+            "β(M1→Y)": take(params, c1), "p(M1→Y)": take(pvals, c1),
+            **common,
+            "β(X→Y)直接效应(c')": params[:, 1], "p(X→Y)直接效应(c')": pvals[:, 1],
+        })
+        res["间接效应(a1×d21×b2)"] = res["β(X→M1)"] * res["β(M1→M2)"] * res["β(M2→Y)"]
+        res["联合显著p(max)"] = res[["p(X→M1)", "p(M1→M2)", "p(M2→Y)"]].max(axis=1, skipna=False)
+        out["serial"] = res
+
+    # ---------- 5. 只保留联合显著的组合并输出 ----------
+    for name in out:
+        res = out[name]
+        out[name] = res[res["联合显著p(max)"] < alpha].sort_values("联合显著p(max)", kind="stable") \
+            .reset_index(drop=True)
+        print(f"{'并行' if name == 'parallel' else '链式'}双中介：{len(out[name])}/{len(res)} 个组合联合显著")
+
     if output_dir is None:
         output_dir = os.path.dirname(file_path)
     os.makedirs(output_dir, exist_ok=True)
+    base_name = os.path.splitext(os.path.basename(file_path))[0]
+    save_path = os.path.join(output_dir, f"{base_name}_mediation2.xlsx")
+    if write_excel:
+        with pd.ExcelWriter(save_path, engine="openpyxl") as writer:
+            for name, res in out.items():
+                res.to_excel(writer, sheet_name=name, index=False)
+        print(f"双中介分析结果已保存至：{save_path}")
+    if store_path:
+        for name, res in out.items():
+            append_results(store_path, res, f"mediation2_{name}", os.path.basename(save_path), y_var)
+        print(f"双中介分析结果已写入结果库：{store_path}")
+
+    return out
+
+
+_PAIR_DATA = None
+
+
+def _init_pair_worker(data):
+    """进程池初始化：每个工作进程只接收一次 X、Y 与候选中介变量矩阵"""
+    global _PAIR_DATA
+    _PAIR_DATA = data
+
+
+def _pair_chunk(kind, pairs):
+    """
+    批量求解一块中介变量组合：kind="b" 为 Y ~ X + M1 + M2，kind="d" 为 M2 ~ X + M1（pairs 为 (M1, M2) 下标）。
+    返回 params、pvalues。
+    """
+    x, y, m_values = _PAIR_DATA
+    m1, m2 = m_values[:, pairs[:, 0]], m_values[:, pairs[:, 1]]
+    valid = ~np.isnan(x)[:, None] & ~np.isnan(m1) & ~np.isnan(m2)
+    if kind == "b":
+        res = batched_ols([x, m1, m2], y, valid & ~np.isnan(y)[:, None])
+    else:
+        res = batched_ols([x, m1], m2, valid)
+    return {"params": res["params"], "pvalues": res["pvalues"]}
+
+
+def _stack_fits(fits, p):
+    """合并各块的批量求解结果"""
+    return {name: np.vstack([f[name] for f in fits]) if fits else np.empty((0, p))
+            for name in ("params", "pvalues")}
+
 
+# ---------------------------- 有调节的中介（M × Z 网格） ----------------------------
+def moderated_mediation_search(file_path, x_var, y_var, exclude_cols=None, output_dir=None, cache_dir=None,
+                               alpha=0.05, stage="both", n_jobs=1, block_size=None, store_path=None, write_excel=True,
+                               group_dummies=True, max_levels=50, high_cardinality="skip"):
+    """
+    有调节的中介搜索：对每个 (中介变量 M, 调节变量 Z) 组合计算有调节的中介指数，
+    只写出指数显著（p < alpha）的组合，输出到 {文件名}_modmed.xlsx（first_stage、second_stage 两个 sheet）：
+        第一阶段调节（Hayes 模型 7）：M ~ X + Z + X×Z（a1、a3），Y ~ X + M（b），指数 = a3×b；
+        第二阶段调节（Hayes 模型 14）：M ~ X（a），Y ~ X + M + Z + M×Z（b1、b3），指数 = a×b3。
+    指数的标准误用一阶 delta 法（两个方程的系数视为独立），并给出 Z 取均值 -1SD、均值、+1SD 时的条件间接效应。
+    与 Z 无关的部分（a 路径 M ~ X、第一阶段的 b 路径 Y ~ X + M）对每个 M 只求解一次，
+    X×Z 对每个 Z 只构造一次；每个 Z 对全部 M 批量求解，n_jobs 不为 1 时各块 Z 分发到多个进程。
+    各模型按所用变量均非缺失的行做列表删除。
+    参数：
+        alpha : float, 指数的显著性阈值
+        stage : str, "first"、"second" 或 "both"
+        n_jobs : int, 并行进程数（1 为串行；None 或负数使用全部 CPU 核；只有一块时不启动进程池）
+        block_size : int, 每个任务处理的 Z 个数（None 表示按进程数均分：ceil(候选数 / 进程数)）
+        其余参数同 mediation_search
+    返回：
+        dict，{"first_stage": DataFrame, "second_stage": DataFrame}
+    """
+    if stage not in ("first", "second", "both"):
+        raise ValueError(f"未知的调节阶段: {stage}")
+    df = load_dataset(file_path, exclude_cols, cache_dir, max_levels, high_cardinality)
+    design = DesignMatrix(df)
+    if x_var not in df.columns or y_var not in df.columns or not design.is_numeric([x_var, y_var]):
+        raise ValueError(f"未找到自变量 {x_var} 或因变量 {y_var}（或不是数值列）")
+
+    # ---------- 1. 候选变量（M 与 Z 取同一组数值列）与每个 M 共用的路径 ----------
+    candidates, groups = dummy_candidates(df, [x_var, y_var], group_dummies)
+    singles = [c for c in candidates if c not in groups and design.numeric[c]]
+    x, y, values = design.column(x_var), design.column(y_var), design.block(singles)
+    k = len(singles)
+    xm_valid = ~np.isnan(x)[:, None] & ~np.isnan(values)
+    res_a = batched_ols([x], values, xm_valid)
+    res_b = batched_ols([x, values], y, xm_valid & ~np.isnan(y)[:, None])
+    with np.errstate(invalid="ignore"):
+        z_mean, z_sd = np.nanmean(values, axis=0), np.nanstd(values, axis=0, ddof=1)
+    print(f"🧮 有调节的中介：{k} 个候选，{k * (k - 1)} 个 (M, Z) 组合")
+
+    # ---------- 2. 逐个 Z 对全部 M 批量求解 ----------
+    data = (x, y, values, stage)
+    if n_jobs is None or n_jobs < 0:
+        n_jobs = os.cpu_count() or 1
+    if block_size is None:
+        block_size = -(-k // n_jobs)
+    block_size = max(1, block_size)
+    blocks = [list(range(i, min(i + block_size, k))) for i in range(0, k, block_size)]
+    if n_jobs != 1 and len(blocks) > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_modmed_worker, initargs=(data,)) as pool:
+            fits = list(pool.map(_modmed_block, blocks))
+    else:
+        _init_modmed_worker(data)
+        fits = [_modmed_block(block) for block in blocks]
+
+    # ---------- 3. 指数、delta 法标准误与条件间接效应 ----------
+    names = np.array(singles, dtype=object)
+    m_idx, z_idx = np.meshgrid(np.arange(k), np.arange(k), indexing="ij")
+    pair = m_idx != z_idx
+    m_idx, z_idx = m_idx[pair], z_idx[pair]
+    levels = {"-1SD": z_mean[z_idx] - z_sd[z_idx], "均值": z_mean[z_idx], "+1SD": z_mean[z_idx] + z_sd[z_idx]}
+
+    def index_test(index, var):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            se = np.sqrt(var)
+            z = index / se
+        return se, z, 2 * stats.norm.sf(np.abs(z))
+
+    out = {}
+    if stage != "second":
+        # (Z, M, 系数) → 按 (M, Z) 排列
+        params = np.concatenate([f["first_params"] for f in fits]).transpose(1, 0, 2)[pair]
+        bse = np.concatenate([f["first_bse"] for f in fits]).transpose(1, 0, 2)[pair]
+        pvals = np.concatenate([f["first_pvalues"] for f in fits]).transpose(1, 0, 2)[pair]
+        a1, a3 = params[:, 1], params[:, 3]
+        b, b_se = res_b["params"][m_idx, 2], res_b["bse"][m_idx, 2]
+        index = a3 * b
+        se, z, p = index_test(index, b ** 2 * bse[:, 3] ** 2 + a3 ** 2 * b_se ** 2)
+        res = pd.DataFrame({
+            "中介变量": names[m_idx], "调节变量": names[z_idx],
+            "β(X→M)": a1, "p(X→M)": pvals[:, 1], "β(Z→M)": params[:, 2], "p(Z→M)": pvals[:, 2],
+            "β(X×Z→M)": a3, "p(X×Z→M)": pvals[:, 3],
+            "β(M→Y)": b, "p(M→Y)": res_b["pvalues"][m_idx, 2],
+            "有调节的中介指数(a3×b)": index, "指数SE": se, "指数z": z, "p(指数)": p,
+            **{f"条件间接效应(Z={name})": (a1 + a3 * level) * b for name, level in levels.items()}
+        })
+        out["first_stage"] = res
+    if stage != "first":
+        params = np.concatenate([f["second_params"] for f in fits]).transpose(1, 0, 2)[pair]
+        pvals = np.concatenate([f["second_pvalues"] for f in fits]).transpose(1, 0, 2)[pair]
+        bse = np.concatenate([f["second_bse"] for f in fits]).transpose(1, 0, 2)[pair]
+        a, a_se = res_a["params"][m_idx, 1], res_a["bse"][m_idx, 1]
+        b1, b3 = params[:, 2], params[:, 4]
+        index = a * b3
+        se, z, p = index_test(index, b3 ** 2 * a_se ** 2 + a ** 2 * bse[:, 4] ** 2)
+        res = pd.DataFrame({
+            "中介变量": names[m_idx], "调节变量": names[z_idx],
+            "β(X→M)": a, "p(X→M)": res_a["pvalues"][m_idx, 1],
+            "β(M→Y)": b1, "p(M→Y)": pvals[:, 2], "β(Z→Y)": params[:, 3], "p(Z→Y)": pvals[:, 3],
+            "β(M×Z→Y)": b3, "p(M×Z→Y)": pvals[:, 4],
+            "β(X→Y)直接效应(c')": params[:, 1], "p(X→Y)直接效应(c')": pvals[:, 1],
+            "有调节的中介指数(a×b3)": index, "指数SE": se, "指数z": z, "p(指数)": p,
+            **{f"条件间接效应(Z={name})": a * (b1 + b3 * level) for name, level in levels.items()}
+        })
+        out["second_stage"] = res
+
+    # ---------- 4. 只保留指数显著的组合并输出 ----------
+    for name in out:
+        res = out[name]
+        out[name] = res[res["p(指数)"] < alpha].sort_values("p(指数)", kind="stable").reset_index(drop=True)
+        print(f"{'第一' if name == 'first_stage' else '第二'}阶段调节：{len(out[name])}/{len(res)} 个组合指数显著")
+
+    if output_dir is None:
+        output_dir = os.path.dirname(file_path)
+    os.makedirs(output_dir, exist_ok=True)
     base_name = os.path.splitext(os.path.basename(file_path))[0]
-    save_path = os.path.join(output_dir, f"{base_name}_mediation.xlsx")
+    save_path = os.path.join(output_dir, f"{base_name}_modmed.xlsx")
+    if write_excel:
+        with pd.ExcelWriter(save_path, engine="openpyxl") as writer:
+            for name, res in out.items():
+                res.to_excel(writer, sheet_name=name, index=False)
+        print(f"有调节的中介分析结果已保存至：{save_path}")
+    if store_path:
+        for name, res in out.items():
+            append_results(store_path, res, f"modmed_{name}", os.path.basename(save_path), y_var)
+        print(f"有调节的中介分析结果已写入结果库：{store_path}")
 
-    df_result.to_excel(save_path, index=False)
-    print(f"中介分析结果已保存至：{save_path}")
+    return out
+
+
+_MODMED_DATA = None
 
-    return df_result
 
+def _init_modmed_worker(data):
+    """进程池初始化：每个工作进程只接收一次 X、Y 与候选变量矩阵"""
+    global _MODMED_DATA
+    _MODMED_DATA = data
 
-def extract_mediation(output_dir, p_threshold=0.05, summary_name="summary_significant_mediation.xlsx"):
+
+def _modmed_block(z_block):
+    """
+    一组调节变量 Z 的批量求解：每个 Z 构造一次 X×Z，对全部候选 M 同时求解
+    第一阶段 M ~ X + Z + X×Z 与第二阶段 Y ~ X + M + Z + M×Z。
+    返回 first_* / second_* 为 (len(z_block), k, p) 的 params、bse、pvalues。
+    """
+    x, y, values, stage = _MODMED_DATA
+    n, k = values.shape
+    out = {f"{part}_{name}": [] for part in ("first", "second") for name in ("params", "bse", "pvalues")}
+    for j in z_block:
+        z = values[:, j]
+        xz = x * z
+        valid = ~np.isnan(x)[:, None] & ~np.isnan(z)[:, None] & ~np.isnan(values)
+        fits = {}
+        if stage != "second":
+            fits["first"] = batched_ols([x, z, xz], values, valid)
+        if stage != "first":
+            fits["second"] = batched_ols([x, values, z, values * z[:, None]], y, valid & ~np.isnan(y)[:, None])
+        for part, res in fits.items():
+            for name in ("params", "bse", "pvalues"):
+                out[f"{part}_{name}"].append(res[name])
+    return {name: np.stack(arrs) for name, arrs in out.items() if arrs}
+
+
+# ---------------------------- 间接效应 bootstrap ----------------------------
+_BOOT_DATA = None
+
+
+def _init_boot_worker(data):
+    """进程池初始化：每个工作进程只接收一次数据"""
+    global _BOOT_DATA
+    _BOOT_DATA = data
+
+
+def _indirect_from_counts(counts, data=None):
+    """
+    给定重抽样计数矩阵 counts (B, n)，批量计算所有候选的 a×b。
+    a 路径按 X、M 均非缺失的行，b 路径按 X、Y、M 均非缺失的行，与点估计的列表删除一致。
+    返回 (B, k) 数组。
+    """
+    x, y, m, va, vb = data if data is not None else _BOOT_DATA
+
+    # a 路径：M ~ X
+    s1 = counts @ va
+    sx = counts @ (va * x[:, None])
+    sxx = counts @ (va * (x * x)[:, None])
+    sm = counts @ (va * m)
+    sxm = counts @ (va * m * x[:, None])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        a = (s1 * sxm - sx * sm) / (s1 * sxx - sx * sx)
+
+    # b 路径：Y ~ X + M 中 M 的系数（中心化交叉积）
+    t1 = counts @ vb
+    tx = counts @ (vb * x[:, None])
+    ty = counts @ (vb * y[:, None])
+    tm = counts @ (vb * m)
+    txx = counts @ (vb * (x * x)[:, None])
+    txm = counts @ (vb * m * x[:, None])
+    tmm = counts @ (vb * m * m)
+    txy = counts @ (vb * (x * y)[:, None])
+    tmy = counts @ (vb * m * y[:, None])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cxx = txx - tx * tx / t1
+        cxm = txm - tx * tm / t1
+        cmm = tmm - tm * tm / t1
+        cxy = txy - tx * ty / t1
+        cmy = tmy - tm * ty / t1
+        b = (cxx * cmy - cxm * cxy) / (cxx * cmm - cxm * cxm)
+
+    return a * b
+
+
+def _boot_chunk(task):
+    """工作进程中计算一块重抽样：task 为 (该块的 SeedSequence, 重抽样次数 b)，在块内生成 (b, n) 行下标矩阵"""
+    seed_seq, b = task
+    n = _BOOT_DATA[0].shape[0]
+    idx = np.random.default_rng(seed_seq).integers(0, n, size=(b, n))
+    counts = np.bincount((idx + n * np.arange(b)[:, None]).ravel(), minlength=b * n).reshape(b, n)
+    return _indirect_from_counts(counts.astype(float))
+
+
+def bootstrap_indirect(x, y, m_values, n_boot=5000, ci_level=0.95, seed=None, n_jobs=1, chunk_size=250):
+    """
+    间接效应 a×b 的向量化 bootstrap 置信区间。
+    重抽样按块进行：每块由 SeedSequence 派生的子种子在块内生成下标（内存只占一块），
+    对全部候选中介变量批量计算 a×b，各块可分发到多个进程，结果与 n_jobs 无关。
+    参数：
+        x, y : ndarray, (n,) 自变量与因变量
+        m_values : ndarray, (n, k) 候选中介变量
+        n_boot : int, 重抽样次数
+        ci_level : float, 置信水平
+        seed : int, 随机种子
+        n_jobs : int, 并行进程数（None 或负数使用全部 CPU 核；只有一块时不启动进程池）
+        chunk_size : int, 每块重抽样次数
+    返回：
+        dict，indirect（点估计）、pct_low / pct_high（百分位区间）、bc_low / bc_high（偏差校正区间），均为 (k,)
+    """
+    n, k = m_values.shape
+    x_ok, y_ok, m_ok = ~np.isnan(x), ~np.isnan(y), ~np.isnan(m_values)
+    va = (x_ok[:, None] & m_ok).astype(float)
+    vb = va * y_ok[:, None]
+    # 中心化不改变斜率，可减少交叉积的数值抵消
+    xc = np.nan_to_num(x - np.nanmean(x))
+    yc = np.nan_to_num(y - np.nanmean(y))
+    with np.errstate(invalid="ignore"):
+        mc = np.nan_to_num(m_values - np.nanmean(m_values, axis=0))
+    data = (xc, yc, mc, va, vb)
+
+    indirect = _indirect_from_counts(np.ones((1, n)), data)[0]
+
+    # ---------- 1. 每块一个子种子 ----------
+    sizes = [min(chunk_size, n_boot - i) for i in range(0, n_boot, chunk_size)]
+    chunks = list(zip(np.random.SeedSequence(seed).spawn(len(sizes)), sizes))
+
+    # ---------- 2. 分块批量计算 ----------
+    if n_jobs != 1 and len(chunks) > 1:
+        if n_jobs is None or n_jobs < 0:
+            n_jobs = os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(chunks)), initializer=_init_boot_worker, initargs=(data,)) as pool:
+            boot = np.vstack(list(pool.map(_boot_chunk, chunks)))
+    else:
+        _init_boot_worker(data)
+        boot = np.vstack([_boot_chunk(c) for c in chunks])
+
+    # ---------- 3. 百分位与偏差校正（BC）区间 ----------
+    alpha = 1 - ci_level
+    with np.errstate(invalid="ignore"):
+        pct_low, pct_high = np.nanpercentile(boot, [100 * alpha / 2, 100 * (1 - alpha / 2)], axis=0)
+        valid = (~np.isnan(boot)).sum(axis=0)
+        prop = np.clip((boot < indirect).sum(axis=0) / valid, 1 / (n_boot + 1), n_boot / (n_boot + 1))
+        z0 = stats.norm.ppf(prop)
+        q_low = stats.norm.cdf(2 * z0 + stats.norm.ppf(alpha / 2))
+        q_high = stats.norm.cdf(2 * z0 + stats.norm.ppf(1 - alpha / 2))
+
+    bc_low, bc_high = np.full(k, np.nan), np.full(k, np.nan)
+    for j in range(k):
+        col = boot[:, j][~np.isnan(boot[:, j])]
+        if len(col) and not np.isnan(indirect[j]):
+            bc_low[j], bc_high[j] = np.quantile(col, [q_low[j], q_high[j]])
+
+    return {
+        "indirect": indirect,
+        "pct_low": pct_low, "pct_high": pct_high,
+        "bc_low": bc_low, "bc_high": bc_high
+    }
+
+
+def extract_mediation(output_dir, p_threshold=0.05, summary_name="summary_significant_mediation.xlsx",
+                      store_path=None):
     """
     汇总 output_dir 下各因变量子文件夹中的中介分析结果文件。
     文件名包含 '_mediation' 的 Excel 文件。
@@ -98,47 +817,60 @@ def extract_mediation(output_dir, p_threshold=0.05, summary_name="summary_signif
             显著性阈值，默认 0.05
         summary_name : str
             汇总文件名，默认 summary_significant_mediation.xlsx
+        store_path : str
+            SQLite 结果库路径；指定时直接查询结果库，不再重新读取各 Excel 结果文件
     """
     summary_records = []
 
-    # 遍历每个因变量子文件夹
-    for y_var in os.listdir(output_dir):
-        subdir = os.path.join(output_dir, y_var)
-        if not os.path.isdir(subdir):
-            continue
+    if store_path:
+        try:
+            sig_rows = query_results(store_path, "mediation", ['p(X→M)', 'p(M→Y)', 'p(X→Y)总效应(c)'], p_threshold)
+            if not sig_rows.empty:
+                summary_records.append(sig_rows)
+        except Exception as e:
+            print(f"❌ 结果库 {store_path} 查询失败，错误：{e}")
+
+    else:
+        # 遍历每个因变量子文件夹
+        for y_var in os.listdir(output_dir):
+            subdir = os.path.join(output_dir, y_var)
+            # 跳过非目录与 .cache 等隐藏目录
+            if not os.path.isdir(subdir) or y_var.startswith("."):
+                continue
+
+            # 筛选文件名包含 "_mediation"
+            xlsx_files = [f for f in os.listdir(subdir) if f.endswith('.xlsx') and '_mediation' in f.lower()
+                          and '_mediation2' not in f.lower()]
+            print(f"\n📂 正在处理因变量 {y_var} 下的中介文件，共 {len(xlsx_files)} 个")
+
+            for fname in xlsx_files:
+                fpath = os.path.join(subdir, fname)
+                try:
+                    df = pd.read_excel(fpath)
+                    if df.empty:
+                        continue
+
+                    # 检查是否包含必要列
+                    required_p_cols = ['p(X→M)', 'p(M→Y)', 'p(X→Y)总效应(c)']
+                    missing_cols = [c for c in required_p_cols if c not in df.columns]
+                    if missing_cols:
+                        print(f"⚠️ 文件 {fname} 缺少列 {missing_cols}，跳过")
+                        continue
+
+                    # 判断是否显著
+                    sig_mask = (df['p(X→M)'] <= p_threshold) & \
+                               (df['p(M→Y)'] <= p_threshold) & \
+                               (df['p(X→Y)总效应(c)'] <= p_threshold)
+
+                    sig_rows = df[sig_mask]
+                    if not sig_rows.empty:
+                        sig_rows = sig_rows.copy()
+                        sig_rows.insert(0, "file_name", fname)
+                        sig_rows.insert(0, "y_var", y_var)
+                        summary_records.append(sig_rows)
 
-        # 筛选文件名包含 "_mediation"
-        xlsx_files = [f for f in os.listdir(subdir) if f.endswith('.xlsx') and '_mediation' in f.lower()]
-        print(f"\n📂 正在处理因变量 {y_var} 下的中介文件，共 {len(xlsx_files)} 个")
-
-        for fname in xlsx_files:
-            fpath = os.path.join(subdir, fname)
-            try:
-                df = pd.read_excel(fpath)
-                if df.empty:
-                    continue
-
-                # 检查是否包含必要列
-                required_p_cols = ['p(X→M)', 'p(M→Y)', 'p(X→Y)总效应(c)']
-                missing_cols = [c for c in required_p_cols if c not in df.columns]
-                if missing_cols:
-                    print(f"⚠️ 文件 {fname} 缺少列 {missing_cols}，跳过")
-                    continue
-
-                # 判断是否显著
-                sig_mask = (df['p(X→M)'] <= p_threshold) & \
-                           (df['p(M→Y)'] <= p_threshold) & \
-                           (df['p(X→Y)总效应(c)'] <= p_threshold)
-
-                sig_rows = df[sig_mask]
-                if not sig_rows.empty:
-                    sig_rows = sig_rows.copy()
-                    sig_rows.insert(0, "file_name", fname)
-                    sig_rows.insert(0, "y_var", y_var)
-                    summary_records.append(sig_rows)
-
-            except Exception as e:
-                print(f"❌ 文件 {fname} 读取失败，错误：{e}")
+                except Exception as e:
+                    print(f"❌ 文件 {fname} 读取失败，错误：{e}")
 
     # 保存汇总
     if summary_records:
@@ -1,13 +1,28 @@
 import os
 import time
+import pickle
+import hashlib
+import heapq
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
 import statsmodels.api as sm
 import statsmodels.formula.api as smf
 from statsmodels.stats.anova import anova_lm
 from statsmodels.tools.sm_exceptions import ConvergenceWarning
 from statsmodels.miscmodels.ordinal_model import OrderedModel
+from statsmodels.regression.mixed_linear_model import MixedLMParams
 from tqdm import tqdm
 from pygam import LinearGAM, s
+from scipy import stats
+from BatchOLS import batched_ols
+from DesignMatrix import DesignMatrix
+from DataCache import file_fingerprint
+from GramMatrix import gram_for_file
+from Tracing import get_tracer, start_trace, stop_trace
+from Scheduler import (CostModel, plan_units, print_plan, estimate_makespan, run_units, unit_time_limit,
+                       fit_time_limit, fit_timeouts, FitTimeout, UnitTimeout)
 import warnings
 
 warnings.simplefilter("ignore")                # 忽略所有警告
@@ -15,132 +30,605 @@ warnings.filterwarnings("ignore", category=ConvergenceWarning)
 warnings.filterwarnings("ignore", category=UserWarning)
 warnings.filterwarnings("ignore", category=RuntimeWarning)
 
+# 可使用增量求解的线性模型类型（组别 p 值均等价于 OLS 的 t 检验）
+LINEAR_MODEL_TYPES = ("OLS", "WLS", "ANOVA", "ANCOVA")
 
-def fit_model_get_pval(df, formula, group_col, model_type, glm_family="gaussian"):
+
+class SummaryHandle:
     """
-    拟合指定模型并返回固定因子 p 值和模型 summary
+    模型 summary 的延迟渲染句柄：只持有渲染函数，调用 render() / str() 时才生成文本并缓存。
     """
+    __slots__ = ("_render", "_text")
+
+    def __init__(self, render):
+        self._render = render
+        self._text = None
+
+    def render(self):
+        if self._text is None:
+            try:
+                self._text = self._render()
+            except Exception:
+                self._text = ""
+            self._render = None
+        return self._text
+
+    def __str__(self):
+        return self.render()
+
+
+def _get_family(glm_family):
     family_dict = {
         "gaussian": sm.families.Gaussian(),
         "binomial": sm.families.Binomial(),
         "poisson": sm.families.Poisson(),
         "negativebinomial": sm.families.NegativeBinomial()
     }
-    family = family_dict.get(glm_family.lower(), sm.families.Gaussian())
+    return family_dict.get(glm_family.lower(), sm.families.Gaussian())
+
+
+# ---------------------------- 迭代型拟合的热启动 ----------------------------
+def _converged(res):
+    if hasattr(res, "converged"):
+        return bool(res.converged)
+    retvals = getattr(res, "mle_retvals", None)
+    if retvals is not None:
+        return bool(retvals.get("converged", True))
+    # RLM：迭代次数未达到上限（默认 maxiter=50）即视为收敛
+    return res.fit_history["iteration"] < 50
+
+
+def _iterations(res):
+    """迭代次数（IRLS / Newton 迭代数；BFGS 等按梯度计算次数）"""
+    retvals = getattr(res, "mle_retvals", None)
+    if retvals:
+        return int(retvals.get("iterations", retvals.get("gcalls", 0)))
+    if isinstance(getattr(res, "hist", None), list):
+        return int(sum(h.get("gcalls", 0) for h in res.hist if isinstance(h, dict)))
+    history = getattr(res, "fit_history", None)
+    if history and "iteration" in history:
+        return int(history["iteration"])
+    return 0
+
+
+def _start_from(res):
+    """从拟合结果提取可供下一步热启动的参数（按参数名）"""
+    model = res.model
+    if isinstance(model, sm.MixedLM):
+        return {"params": pd.Series(np.asarray(res.fe_params), index=model.exog_names),
+                "cov_re": np.asarray(res.cov_re) / res.scale}
+    if isinstance(res.params, pd.DataFrame):
+        return {"params": res.params}
+    return {"params": pd.Series(np.asarray(res.params), index=model.exog_names)}
+
+
+def _align_start(model, start):
+    """上一步参数按名称对齐到当前模型，新增项补 0"""
+    params = start["params"].reindex(model.exog_names, fill_value=0.0)
+    if isinstance(model, sm.MixedLM):
+        return MixedLMParams.from_components(fe_params=params.values, cov_re=start["cov_re"])
+    if isinstance(params, pd.DataFrame):
+        # MNLogit：(k, J-1) 参数按列展开
+        if params.shape[1] != model.J - 1:
+            return None
+        return params.values.ravel(order="F")
+    return params.values
+
+
+def _fit_iterative(model, start_params=None, fit_info=None, **fit_kwargs):
+    """
+    拟合迭代型模型（GLM IRLS、MixedLM、RLM、Logit、OrderedModel、MNLogit），RLM 仅记录迭代次数。
+    提供 start_params（上一步的参数，见 _start_from）时以其热启动，未收敛或出错时回退冷启动。
+    fit_info 为 dict 时写入：iterations、converged、warm（是否热启动成功）、
+    fallback（是否回退冷启动）、start（本次结果，供下一步热启动）。
+    """
+    res = None
+    fallback = False
+    if start_params is not None:
+        try:
+            sp = _align_start(model, start_params)
+            if sp is not None:
+                res = model.fit(start_params=sp, **fit_kwargs)
+                if not _converged(res):
+                    res = None
+        except FitTimeout:
+            raise
+        except Exception:
+            res = None
+        fallback = res is None
+    warm = res is not None
+    if res is None:
+        res = model.fit(**fit_kwargs)
+
+    if fit_info is not None:
+        fit_info.update(iterations=_iterations(res), converged=_converged(res), warm=warm,
+                        fallback=fallback, start=_start_from(res))
+    return res
+
+
+def _note_fit(fit_info, model=None, error=None):
+    """在 fit_info 中记录样本量或异常类型（供逐次拟合记录使用）"""
+    if fit_info is None:
+        return
+    if error is not None:
+        fit_info["exception"] = type(error).__name__
+        return
+    if hasattr(model, "nobs"):
+        nobs = model.nobs
+    elif hasattr(model, "endog"):
+        nobs = len(model.endog)
+    else:
+        nobs = getattr(model, "statistics_", {}).get("n_samples")
+    fit_info["nobs"] = None if nobs is None else int(nobs)
+
+
+def fit_model_get_pval(df, formula, group_col, model_type, glm_family="gaussian", lazy=False,
+                       start_params=None, fit_info=None, fit_timeout=None):
+    """
+    拟合指定模型并返回固定因子 p 值和模型 summary
+    lazy=True 时不立即生成 summary，而是返回 SummaryHandle，仅在需要写出时再渲染
+    迭代型模型可用 start_params 热启动，拟合信息写入 fit_info（见 _fit_iterative）
+    fit_timeout 为拟合时间限制（秒，只作用于模型拟合本身）：超时时抛出 FitTimeout，由调用方处理
+    """
+    family = _get_family(glm_family)
 
     try:
         model_type = model_type.upper()
 
-        if model_type == "OLS":
-            model = smf.ols(formula, data=df).fit()
-            pval = model.pvalues.get(group_col, 1.0)
-            summary = model.summary().as_text()
-
-        elif model_type == "GLM":
-            model = smf.glm(formula, data=df, family=family).fit()
-            pval = model.pvalues.get(group_col, 1.0)
-            summary = model.summary().as_text()
-
-        elif model_type == "LMM":
-            model = smf.mixedlm(formula, data=df, groups=df[group_col]).fit()
-            pval = model.pvalues.get(group_col, 1.0)
-            summary = model.summary().as_text()
-
-        elif model_type == "RLM":
-            model = smf.rlm(formula, data=df, M=sm.robust.norms.HuberT()).fit()
-            pval = model.pvalues.get(group_col, 1.0)
-            summary = model.summary().as_text()
-
-        elif model_type == "WLS":
-            model = smf.wls(formula, data=df, weights=[1]*len(df)).fit()
-            pval = model.pvalues.get(group_col, 1.0)
-            summary = model.summary().as_text()
-
-        elif model_type == "ANOVA":
-            model = smf.ols(formula, data=df).fit()
-            anova_res = anova_lm(model, typ=2)
-            pval = anova_res.loc[group_col, "PR(>F)"] if group_col in anova_res.index else 1.0
-            summary = str(anova_res)
-
-        elif model_type == "QUANTILE":
-            model = smf.quantreg(formula, data=df).fit(q=0.5)
-            pval = model.pvalues.get(group_col, 1.0)
-            summary = model.summary().as_text()
-
-        elif model_type == "LOGISTIC":
-            model = smf.logit(formula, data=df).fit(disp=0)
-            pval = model.pvalues.get(group_col, 1.0)
-            summary = model.summary2().as_text()
-
-        elif model_type == "POISSON":
-            model = smf.glm(formula, data=df, family=sm.families.Poisson()).fit()
-            pval = model.pvalues.get(group_col, 1.0)
-            summary = model.summary().as_text()
-
-        elif model_type == "NEGBIN":
-            model = smf.glm(formula, data=df, family=sm.families.NegativeBinomial()).fit()
-            pval = model.pvalues.get(group_col, 1.0)
-            summary = model.summary().as_text()
-
-        elif model_type == "ANCOVA":
-            model = smf.ols(formula, data=df).fit()
-            anova_res = anova_lm(model, typ=2)
-            pval = anova_res.loc[group_col, "PR(>F)"] if group_col in anova_res.index else 1.0
-            summary = str(anova_res)
-
-        elif model_type == "ORDLOG":
-            candidate_covs = [c for c in df.columns if c != df.columns[0]]
-            model = OrderedModel(df[df.columns[0]], sm.add_constant(df[candidate_covs + [group_col]]), distr='logit')
-            res = model.fit(method='bfgs', disp=False)
-            anova_res = pd.DataFrame({'coef': res.params, 'z': res.tvalues, 'p': res.pvalues})
-            pval = anova_res.loc[group_col, 'p'] if group_col in anova_res.index else 1.0
-            summary = str(anova_res)
-
-        elif model_type == "MULTINOM":
-            candidate_covs = [c for c in df.columns if c != df.columns[0]]
-            model = sm.MNLogit(df[df.columns[0]], sm.add_constant(df[candidate_covs + [group_col]]))
-            res = model.fit(disp=False)
-            anova_res = res.summary2().tables[1]
-            pval = anova_res.loc[group_col, "P>|z|"] if group_col in anova_res.index else 1.0
-            summary = str(anova_res)
-
-        elif model_type == "ROBUSTGLM":
-            model = smf.glm(formula, data=df, family=family).fit(cov_type='HC3')
-            anova_res = pd.DataFrame({'coef': model.params, 'z': model.tvalues, 'p': model.pvalues})
-            pval = anova_res.loc[group_col, 'p'] if group_col in anova_res.index else 1.0
-            summary = str(anova_res)
-
-        elif model_type == "MIXEDGLM":
-            model = smf.mixedlm(formula, data=df, groups=df[group_col]).fit()
-            anova_res = pd.DataFrame({'coef': model.params, 'z': model.tvalues, 'p': model.pvalues})
-            pval = anova_res.loc[group_col, 'p'] if group_col in anova_res.index else 1.0
-            summary = str(anova_res)
-
-        elif model_type == "GAM":
-            candidate_covs = [c for c in df.columns if c != df.columns[0]]
-            X = df[candidate_covs + [group_col]]
-            y = df[df.columns[0]]
-            gam = LinearGAM(s(0) + s(1)).fit(X.values, y.values)
-            anova_res = pd.DataFrame({'term': ["s(%d)" % i for i in range(X.shape[1])],
-                                      'coef': gam.coef_,
-                                      'p': [0.05] * X.shape[1]}).set_index('term')
-            pval = anova_res.loc[f"s({X.columns.get_loc(group_col)})", "p"] if group_col in X.columns else 1.0
-            summary = str(anova_res)
+        with fit_time_limit(fit_timeout):
+            if model_type == "OLS":
+                model = smf.ols(formula, data=df).fit()
+                pval = model.pvalues.get(group_col, 1.0)
+                render = lambda: model.summary().as_text()
 
-        else:
-            raise ValueError(f"未知的模型类型: {model_type}")
+            elif model_type == "GLM":
+                model = _fit_iterative(smf.glm(formula, data=df, family=family), start_params, fit_info)
+                pval = model.pvalues.get(group_col, 1.0)
+                render = lambda: model.summary().as_text()
 
-        return pval, summary
+            elif model_type == "LMM":
+                model = _fit_iterative(smf.mixedlm(formula, data=df, groups=df[group_col]), start_params, fit_info,
+                                       full_output=True)
+                pval = model.pvalues.get(group_col, 1.0)
+                render = lambda: model.summary().as_text()
 
-    except Exception:
+            elif model_type == "RLM":
+                # RLM 默认以 OLS 解起步，已是当前设计下的最佳初值，不使用热启动
+                model = _fit_iterative(smf.rlm(formula, data=df, M=sm.robust.norms.HuberT()), None, fit_info)
+                pval = model.pvalues.get(group_col, 1.0)
+                render = lambda: model.summary().as_text()
+
+            elif model_type == "WLS":
+                model = smf.wls(formula, data=df, weights=[1]*len(df)).fit()
+                pval = model.pvalues.get(group_col, 1.0)
+                render = lambda: model.summary().as_text()
+
+            elif model_type == "ANOVA":
+                model = smf.ols(formula, data=df).fit()
+                anova_res = anova_lm(model, typ=2)
+                pval = anova_res.loc[group_col, "PR(>F)"] if group_col in anova_res.index else 1.0
+                render = lambda: str(anova_res)
+
+            elif model_type == "QUANTILE":
+                model = smf.quantreg(formula, data=df).fit(q=0.5)
+                pval = model.pvalues.get(group_col, 1.0)
+                render = lambda: model.summary().as_text()
+
+            elif model_type == "LOGISTIC":
+                model = _fit_iterative(smf.logit(formula, data=df), start_params, fit_info, disp=0)
+                pval = model.pvalues.get(group_col, 1.0)
+                render = lambda: model.summary2().as_text()
+
+            elif model_type == "POISSON":
+                model = _fit_iterative(smf.glm(formula, data=df, family=sm.families.Poisson()), start_params, fit_info)
+                pval = model.pvalues.get(group_col, 1.0)
+                render = lambda: model.summary().as_text()
+
+            elif model_type == "NEGBIN":
+                model = _fit_iterative(smf.glm(formula, data=df, family=sm.families.NegativeBinomial()), start_params,
+                                       fit_info)
+                pval = model.pvalues.get(group_col, 1.0)
+                render = lambda: model.summary().as_text()
+
+            elif model_type == "ANCOVA":
+                model = smf.ols(formula, data=df).fit()
+                anova_res = anova_lm(model, typ=2)
+                pval = anova_res.loc[group_col, "PR(>F)"] if group_col in anova_res.index else 1.0
+                render = lambda: str(anova_res)
+
+            elif model_type == "ORDLOG":
+                candidate_covs = [c for c in df.columns if c != df.columns[0]]
+                model = OrderedModel(df[df.columns[0]], sm.add_constant(df[candidate_covs + [group_col]]), distr='logit')
+                res = _fit_iterative(model, start_params, fit_info, method='bfgs', disp=False)
+                anova_res = pd.DataFrame({'coef': res.params, 'z': res.tvalues, 'p': res.pvalues})
+                pval = anova_res.loc[group_col, 'p'] if group_col in anova_res.index else 1.0
+                render = lambda: str(anova_res)
+
+            elif model_type == "MULTINOM":
+                candidate_covs = [c for c in df.columns if c != df.columns[0]]
+                model = sm.MNLogit(df[df.columns[0]], sm.add_constant(df[candidate_covs + [group_col]]))
+                res = _fit_iterative(model, start_params, fit_info, disp=False)
+                anova_res = res.summary2().tables[1]
+                pval = anova_res.loc[group_col, "P>|z|"] if group_col in anova_res.index else 1.0
+                render = lambda: str(anova_res)
+
+            elif model_type == "ROBUSTGLM":
+                model = _fit_iterative(smf.glm(formula, data=df, family=family), start_params, fit_info, cov_type='HC3')
+                anova_res = pd.DataFrame({'coef': model.params, 'z': model.tvalues, 'p': model.pvalues})
+                pval = anova_res.loc[group_col, 'p'] if group_col in anova_res.index else 1.0
+                render = lambda: str(anova_res)
+
+            elif model_type == "MIXEDGLM":
+                model = _fit_iterative(smf.mixedlm(formula, data=df, groups=df[group_col]), start_params, fit_info,
+                                       full_output=True)
+                anova_res = pd.DataFrame({'coef': model.params, 'z': model.tvalues, 'p': model.pvalues})
+                pval = anova_res.loc[group_col, 'p'] if group_col in anova_res.index else 1.0
+                render = lambda: str(anova_res)
+
+            elif model_type == "GAM":
+                candidate_covs = [c for c in df.columns if c != df.columns[0]]
+                X = df[candidate_covs + [group_col]]
+                y = df[df.columns[0]]
+                gam = model = LinearGAM(s(0) + s(1)).fit(X.values, y.values)
+                anova_res = pd.DataFrame({'term': ["s(%d)" % i for i in range(X.shape[1])],
+                                          'coef': gam.coef_,
+                                          'p': [0.05] * X.shape[1]}).set_index('term')
+                pval = anova_res.loc[f"s({X.columns.get_loc(group_col)})", "p"] if group_col in X.columns else 1.0
+                render = lambda: str(anova_res)
+
+            else:
+                raise ValueError(f"未知的模型类型: {model_type}")
+
+        _note_fit(fit_info, model)
+        handle = SummaryHandle(render)
+        return pval, (handle if lazy else handle.render())
+
+    except FitTimeout as e:
+        _note_fit(fit_info, error=e)
+        raise
+    except Exception as e:
+        _note_fit(fit_info, error=e)
         return 1.0, ""
 
 
+# ---------------------------- 预编译设计矩阵拟合 ----------------------------
+def _anova_typ2(model):
+    """
+    无交互项、每项单列的可加模型中，Type II 平方和等于该项 t 统计量平方乘以残差方差，
+    结果与 anova_lm(typ=2) 一致。
+    """
+    names = [c for c in model.params.index if c != "Intercept"]
+    f_values = model.tvalues[names] ** 2
+    table = pd.DataFrame({
+        "sum_sq": f_values * model.scale,
+        "df": 1.0,
+        "F": f_values,
+        "PR(>F)": model.pvalues[names]
+    })
+    table.loc["Residual"] = [model.ssr, model.df_resid, np.nan, np.nan]
+    return table
+
+
+def fit_design_get_pval(design, dv, group_col, covs, model_type, glm_family="gaussian", lazy=False,
+                        start_params=None, fit_info=None, fit_timeout=None):
+    """
+    使用预编译设计矩阵拟合指定模型，返回组别 p 值和模型 summary（与 fit_model_get_pval 相同，含热启动参数与时间限制）。
+    设计矩阵按列下标取 [因变量, 组别, 协变量]，删除含缺失的行后直接调用 statsmodels 的数组接口。
+    ORDLOG / MULTINOM / GAM 使用全部列，不在此处理。
+    """
+    family = _get_family(glm_family)
+
+    try:
+        model_type = model_type.upper()
+        names = [group_col] + list(covs)
+        data = design.block([dv] + names)
+        data = data[~np.isnan(data).any(axis=1)]
+        endog = pd.Series(data[:, 0], name=dv)
+        exog = pd.DataFrame(np.column_stack([np.ones(len(data)), data[:, 1:]]), columns=["Intercept"] + names)
+
+        with fit_time_limit(fit_timeout):
+            if model_type == "OLS":
+                model = sm.OLS(endog, exog).fit()
+                render = lambda: model.summary().as_text()
+
+            elif model_type == "GLM":
+                model = _fit_iterative(sm.GLM(endog, exog, family=family), start_params, fit_info)
+                render = lambda: model.summary().as_text()
+
+            elif model_type in ("LMM", "MIXEDGLM"):
+                model = _fit_iterative(sm.MixedLM(endog, exog, groups=data[:, 1]), start_params, fit_info,
+                                       full_output=True)
+                if model_type == "LMM":
+                    render = lambda: model.summary().as_text()
+                else:
+                    render = lambda: str(pd.DataFrame({'coef': model.params, 'z': model.tvalues, 'p': model.pvalues}))
+
+            elif model_type == "RLM":
+                # RLM 默认以 OLS 解起步，已是当前设计下的最佳初值，不使用热启动
+                model = _fit_iterative(sm.RLM(endog, exog, M=sm.robust.norms.HuberT()), None, fit_info)
+                render = lambda: model.summary().as_text()
+
+            elif model_type == "WLS":
+                model = sm.WLS(endog, exog, weights=np.ones(len(data))).fit()
+                render = lambda: model.summary().as_text()
+
+            elif model_type in ("ANOVA", "ANCOVA"):
+                model = sm.OLS(endog, exog).fit()
+                anova_res = _anova_typ2(model)
+                pval = anova_res.loc[group_col, "PR(>F)"] if group_col in anova_res.index else 1.0
+                _note_fit(fit_info, model)
+                handle = SummaryHandle(lambda: str(anova_res))
+                return pval, (handle if lazy else handle.render())
+
+            elif model_type == "QUANTILE":
+                model = sm.QuantReg(endog, exog).fit(q=0.5)
+                render = lambda: model.summary().as_text()
+
+            elif model_type == "LOGISTIC":
+                model = _fit_iterative(sm.Logit(endog, exog), start_params, fit_info, disp=0)
+                render = lambda: model.summary2().as_text()
+
+            elif model_type == "POISSON":
+                model = _fit_iterative(sm.GLM(endog, exog, family=sm.families.Poisson()), start_params, fit_info)
+                render = lambda: model.summary().as_text()
+
+            elif model_type == "NEGBIN":
+                model = _fit_iterative(sm.GLM(endog, exog, family=sm.families.NegativeBinomial()), start_params, fit_info)
+                render = lambda: model.summary().as_text()
+
+            elif model_type == "ROBUSTGLM":
+                model = _fit_iterative(sm.GLM(endog, exog, family=family), start_params, fit_info, cov_type='HC3')
+                render = lambda: str(pd.DataFrame({'coef': model.params, 'z': model.tvalues, 'p': model.pvalues}))
+
+            else:
+                raise ValueError(f"设计矩阵不支持的模型类型: {model_type}")
+
+        pval = model.pvalues.get(group_col, 1.0)
+        _note_fit(fit_info, model)
+        handle = SummaryHandle(render)
+        return pval, (handle if lazy else handle.render())
+
+    except FitTimeout as e:
+        _note_fit(fit_info, error=e)
+        raise
+    except Exception as e:
+        _note_fit(fit_info, error=e)
+        return 1.0, ""
+
+
+# ---------------------------- 拟合缓存 ----------------------------
+# 这些模型直接使用 df 的全部列，与公式中的协变量无关
+FORMULA_FREE_TYPES = ("ORDLOG", "MULTINOM", "GAM")
+
+
+class FitCache:
+    """
+    fit_model_get_pval 的 LRU 记忆化缓存，记录命中 / 未命中次数。
+    键为 (model_type, 因变量, 组别, 协变量集合, glm_family, 数据集指纹)。
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def get(self, key):
+        if key in self._data:
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._data[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._data)}
+
+    def clear(self):
+        self._data.clear()
+        self.hits = self.misses = 0
+
+
+FIT_CACHE = FitCache()
+
+
+def dataset_fingerprint(df):
+    """数据集指纹：列名 + 逐行哈希"""
+    h = hashlib.sha1(repr(list(df.columns)).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    return h.hexdigest()
+
+
+def _fit_key(dv, group_col, covs, model_type, glm_family, fingerprint):
+    model_type = model_type.upper()
+    covs = () if model_type in FORMULA_FREE_TYPES else tuple(sorted(covs))
+    return model_type, dv, group_col, covs, glm_family.lower(), fingerprint
+
+
+def cached_fit(key, fit_func, lazy=False, cache=None, refit=None):
+    """
+    记忆化调用 fit_func(lazy) -> (pval, summary)。
+    缓存中只保存 p 值与已渲染的 summary 文本，不保存拟合结果、数据、热启动参数或拟合信息，以控制内存；
+    延迟渲染的 summary 在渲染时写回缓存。命中缓存但 summary 尚未渲染时，由 refit() -> summary
+    重新拟合生成（未提供时使用 fit_func(False)）。
+    """
+    cache = FIT_CACHE if cache is None else cache
+    hit = cache.get(key)
+    if hit is None:
+        pval, summary = fit_func(lazy)
+        if isinstance(summary, SummaryHandle):
+            cache.put(key, (pval, None))
+            return pval, SummaryHandle(lambda: _store_summary(cache, key, pval, summary.render()))
+        cache.put(key, (pval, summary))
+        return pval, summary
+
+    pval, summary = hit
+    if summary is None:
+        render = refit if refit is not None else (lambda: fit_func(False)[1])
+        handle = SummaryHandle(lambda: _store_summary(cache, key, pval, render()))
+        summary = handle if lazy else handle.render()
+    return pval, summary
+
+
+def _store_summary(cache, key, pval, text):
+    cache.put(key, (pval, text))
+    return text
+
+
+def cached_fit_model_get_pval(df, formula, group_col, model_type, glm_family="gaussian", lazy=False,
+                              fingerprint=None, cache=None):
+    """
+    带记忆化的 fit_model_get_pval：同一数据集上协变量集合相同的拟合直接从缓存返回。
+    """
+    if fingerprint is None:
+        fingerprint = dataset_fingerprint(df)
+    lhs, rhs = formula.split("~", 1)
+    terms = [t.strip() for t in rhs.split("+") if t.strip() != group_col]
+    key = _fit_key(lhs.strip(), group_col, terms, model_type, glm_family, fingerprint)
+    return cached_fit(key, lambda lz: fit_model_get_pval(df, formula, group_col, model_type, glm_family, lazy=lz),
+                      lazy, cache)
+
+
+def make_fitter(df, dv, group_col, model_type, glm_family="gaussian", use_cache=True, fingerprint=None,
+                design=None, fit_timeout=None):
+    """
+    构造单个 (dv, model_type) 的拟合函数 fit(covs, lazy=False, start_params=None, fit_info=None) -> (pval, summary)。
+    提供 design 时按列下标拟合（fit_design_get_pval），否则按公式拟合（fit_model_get_pval）；
+    use_cache=True 时经 FIT_CACHE 记忆化（命中缓存时不拟合，fit_info 保持为空；
+    命中但需要渲染 summary 时冷启动重新拟合，不使用本次调用的 start_params / fit_info）。
+    fit_timeout 为单次拟合时间限制（秒，只作用于 statsmodels 的拟合调用）：超时的拟合 p 值记为 1.0，
+    不写入缓存（偶发的超时不影响之后同一拟合的结果）。
+    启用逐次拟合记录（Tracing.start_trace）时，每次调用（含缓存命中）写入一条记录。
+    """
+    use_design = design is not None and model_type.upper() not in FORMULA_FREE_TYPES
+    if use_cache and fingerprint is None:
+        fingerprint = dataset_fingerprint(df)
+
+    def fit(covs, lazy=False, start_params=None, fit_info=None):
+        covs = list(covs)
+        if use_design:
+            fit_func = lambda lz, sp=None, info=None: fit_design_get_pval(
+                design, dv, group_col, covs, model_type, glm_family, lazy=lz, start_params=sp, fit_info=info,
+                fit_timeout=fit_timeout)
+        else:
+            formula = _build_formula(dv, group_col, covs)
+            fit_func = lambda lz, sp=None, info=None: fit_model_get_pval(
+                df, formula, group_col, model_type, glm_family, lazy=lz, start_params=sp, fit_info=info,
+                fit_timeout=fit_timeout)
+        call = (lambda: fit_func(lazy, start_params, fit_info)) if not use_cache else \
+            (lambda: cached_fit(_fit_key(dv, group_col, covs, model_type, glm_family, fingerprint),
+                                lambda lz: fit_func(lz, start_params, fit_info), lazy,
+                                refit=lambda: fit_func(False)[1]))
+
+        def run():
+            try:
+                return call()
+            except FitTimeout:
+                return 1.0, ""
+
+        tracer = get_tracer()
+        if tracer is None:
+            return run()
+        if fit_info is None:
+            fit_info = {}
+        hits = FIT_CACHE.hits
+        start = time.perf_counter()
+        result = run()
+        cached = FIT_CACHE.hits > hits
+        tracer.record(dv=dv, model_type=model_type, covs=covs, n_covs=len(covs), wall=time.perf_counter() - start,
+                      iterations=fit_info.get("iterations"),
+                      converged=None if cached else fit_info.get("converged", "exception" not in fit_info),
+                      exception=fit_info.get("exception"), nobs=fit_info.get("nobs"), cached=cached,
+                      n_candidates=1)
+        return result
+
+    return fit
+
+
+def new_fit_stats():
+    """迭代拟合统计：拟合次数、总迭代次数、热启动成功次数、回退冷启动次数、单次拟合超时次数"""
+    return {"fits": 0, "iterations": 0, "warm": 0, "fallback": 0, "timeouts": 0}
+
+
+def _record_fit(fit_stats, fit_info):
+    if fit_stats is None or "iterations" not in fit_info:
+        return
+    fit_stats["fits"] += 1
+    fit_stats["iterations"] += fit_info["iterations"]
+    fit_stats["warm"] += int(fit_info["warm"])
+    fit_stats["fallback"] += int(fit_info["fallback"])
+
+
+def _warm_fitter(fit, warm_start=True, fit_stats=None):
+    """
+    包装 fit(covs, lazy)：拟合 selected + [cov] 时以上一步选中模型（selected）已有的拟合参数热启动，新项补 0；
+    该模型未拟合过、未收敛或来自缓存（无参数）时冷启动，不为取得初值额外拟合。拟合信息累计到 fit_stats。
+    """
+    starts = {}
+
+    def run(covs, lazy, start):
+        info = {}
+        result = fit(covs, lazy=lazy, start_params=start, fit_info=info)
+        _record_fit(fit_stats, info)
+        if info.get("converged"):
+            starts[tuple(covs)] = info["start"]
+        return result
+
+    def warm_fit(covs, lazy=False):
+        if not warm_start:
+            return run(covs, lazy, None)
+        return run(covs, lazy, starts.get(tuple(covs[:-1])))
+
+    return warm_fit
+
+
 # ---------------------------- 单个因变量前向逐步选择（保存每一步显著结果） ----------------------------
-def forward_step_for_dv(df, dv, group_col, candidate_covs, model_type, glm_family="gaussian", alpha=0.05):
+def forward_step_for_dv(df, dv, group_col, candidate_covs, model_type, glm_family="gaussian", alpha=0.05,
+                        engine="auto", lazy_summary=True, use_cache=True, fingerprint=None, design=None,
+                        screen_top_k=None, warm_start=True, fit_stats=None, fit_timeout=None, search="forward",
+                        subset_options=None):
     """
     对单个因变量进行前向逐步选择，每一显著结果都保留
+    engine="auto" 时，线性模型（OLS/WLS/ANOVA/ANCOVA）且各列均为数值时使用增量求解引擎，
+    其余模型在各列均为数值时按预编译设计矩阵（design，未提供时自动编码）的列下标拟合；
+    engine="formula" 时始终逐公式拟合。
+    lazy_summary=True 时只为通过 alpha 的结果渲染 summary。
+    use_cache=True 时重复的拟合（如最终模型、与协变量无关的模型类型）从 FIT_CACHE 返回；
+    fingerprint 为数据集指纹，未提供时自动计算。
+    screen_top_k 为正整数时，GLM/POISSON/NEGBIN/LOGISTIC 在各列均为数值时启用一步 Wald 近似筛选，
+    每一步只完整拟合排名前 screen_top_k 的候选（见 forward_step_screened）。
+    warm_start=True 时迭代型模型以上一步选中模型的拟合参数（新项补 0）作为 start_params，未收敛时回退冷启动；
+    fit_stats（见 new_fit_stats）累计拟合与迭代次数。
+    fit_timeout 为单次拟合时间限制（秒，见 make_fitter）。
+    search="best_subset" 时线性模型在各列均为数值时改为分支定界最优子集搜索（见 best_subset_linear，
+    subset_options 为其 top_n / max_size / n_jobs），其余模型仍为前向逐步选择。
     """
+    if search not in ("forward", "best_subset"):
+        raise ValueError(f"未知的搜索方式: {search}")
+    numeric = engine == "auto" and _numeric_design_applicable(df, dv, group_col, candidate_covs)
+    if numeric and design is None:
+        design = DesignMatrix(df)
+    fit = make_fitter(df, dv, group_col, model_type, glm_family, use_cache, fingerprint,
+                      design if numeric else None, fit_timeout)
+
+    if numeric and search == "best_subset" and model_type.upper() in LINEAR_MODEL_TYPES:
+        return best_subset_linear(df, dv, group_col, candidate_covs, model_type, glm_family, alpha,
+                                  fit=fit, design=design, **(subset_options or {}))
+    if numeric and model_type.upper() in LINEAR_MODEL_TYPES:
+        return forward_step_linear(df, dv, group_col, candidate_covs, model_type, glm_family, alpha,
+                                   fit=fit, design=design)
+    if numeric and screen_top_k and model_type.upper() in SCREEN_MODEL_TYPES:
+        return forward_step_screened(df, dv, group_col, candidate_covs, model_type, glm_family, alpha,
+                                     top_k=screen_top_k, fit=fit, design=design, lazy_summary=lazy_summary,
+                                     warm_start=warm_start, fit_stats=fit_stats)
+    fit = _warm_fitter(fit, warm_start, fit_stats)
+
     selected_covs = []
     remaining_covs = candidate_covs.copy()
     best_p = 1.0
@@ -151,21 +639,20 @@ def forward_step_for_dv(df, dv, group_col, candidate_covs, model_type, glm_famil
         improved = False
         best_cov = None
         best_p_candidate = None
-        best_summary_candidate = None
 
         for cov in remaining_covs:
             covs_try = selected_covs + [cov]
-            formula = f"{dv} ~ {group_col}" + (" + " + " + ".join(covs_try) if covs_try else "")
-            pval, summary = fit_model_get_pval(df, formula, group_col, model_type, glm_family)
+            formula = _build_formula(dv, group_col, covs_try)
+            pval, summary = fit(covs_try, lazy=lazy_summary)
 
-            if pval < alpha:  # 仅保留显著的
+            if pval < alpha:  # 仅保留显著的（summary 只在此时渲染）
                 sig_results.append({
                     "dv": dv,
                     "model": model_type,
                     "selected_covs": covs_try.copy(),
                     "formula": formula,
                     "pval": pval,
-                    "summary": summary
+                    "summary": str(summary)
                 })
 
             # 判断是否是改进
@@ -173,7 +660,6 @@ def forward_step_for_dv(df, dv, group_col, candidate_covs, model_type, glm_famil
                 improved = True
                 best_cov = cov
                 best_p_candidate = pval
-                best_summary_candidate = summary
 
         if improved:
             selected_covs.append(best_cov)
@@ -183,8 +669,8 @@ def forward_step_for_dv(df, dv, group_col, candidate_covs, model_type, glm_famil
             break
 
     # 最终模型（已选协变量）
-    final_formula = f"{dv} ~ {group_col}" + (" + " + " + ".join(selected_covs) if selected_covs else "")
-    final_pval, final_summary = fit_model_get_pval(df, final_formula, group_col, model_type, glm_family)
+    final_formula = _build_formula(dv, group_col, selected_covs)
+    final_pval, final_summary = fit(selected_covs, lazy=lazy_summary)
     if final_pval < alpha:
         sig_results.append({
             "dv": dv,
@@ -192,7 +678,584 @@ def forward_step_for_dv(df, dv, group_col, candidate_covs, model_type, glm_famil
             "selected_covs": selected_covs.copy(),
             "formula": final_formula,
             "pval": final_pval,
-            "summary": final_summary
+            "summary": str(final_summary)
+        })
+
+    # 按 p 值升序排序
+    sig_results.sort(key=lambda x: x["pval"])
+
+    return sig_results
+
+
+def _trace_batch(dv, model_type, covs, n_candidates, start, nobs):
+    """逐次拟合记录：一次批量求解（线性增量引擎 / 近似筛选）覆盖的全部候选记为一条"""
+    tracer = get_tracer()
+    if tracer is not None:
+        tracer.record(dv=dv, model_type=model_type, covs=list(covs), n_covs=len(covs), n_candidates=n_candidates,
+                      wall=time.perf_counter() - start, converged=True, nobs=int(nobs), cached=False)
+
+
+def _build_formula(dv, group_col, covs):
+    return f"{dv} ~ {group_col}" + (" + " + " + ".join(covs) if covs else "")
+
+
+def _numeric_design_applicable(df, dv, group_col, candidate_covs):
+    """
+    因变量与分组变量为非布尔数值列、协变量均为数值/布尔列时，逐公式拟合中每个协变量只对应设计矩阵的一列，
+    可以使用预编译设计矩阵与增量求解引擎。
+    """
+    for c in (dv, group_col):
+        if c not in df.columns or pd.api.types.is_bool_dtype(df[c]) or not pd.api.types.is_numeric_dtype(df[c]):
+            return False
+    return all(pd.api.types.is_bool_dtype(df[c]) or pd.api.types.is_numeric_dtype(df[c]) for c in candidate_covs)
+
+
+def _step_pvalues(design, y, cand, group_idx=1):
+    """
+    在当前模型（design 列：截距、组别、已选协变量）基础上，批量计算加入每个候选列后组别系数的 p 值。
+    无缺失的候选通过 Gram 逆的加边（Schur 补）更新求解，无需重新拟合；
+    在当前可用行上有缺失的候选按自身可用行做批量列表删除求解。
+    参数：
+        design : ndarray, (n, p) 当前模型设计矩阵（已限定在当前可用行）
+        y : ndarray, (n,)
+        cand : ndarray, (n, k) 候选列（可含 NaN）
+    返回：
+        ndarray, (k,) 组别 p 值（无法估计时为 1.0）
+    """
+    n, p = design.shape
+    k = cand.shape[1]
+    pvals = np.ones(k)
+    if k == 0:
+        return pvals
+
+    complete = ~np.isnan(cand).any(axis=0)
+
+    # ---------- 1. 当前模型 ----------
+    gram_inv = np.linalg.pinv(design.T @ design, hermitian=True)
+    beta = gram_inv @ (design.T @ y)
+    resid = y - design @ beta
+    rss = resid @ resid
+
+    # ---------- 2. 完整候选：加边更新 ----------
+    if complete.any():
+        c = cand[:, complete]
+        atc = design.T @ c
+        h = gram_inv @ atc
+        schur = np.einsum("nk,nk->k", c, c) - np.einsum("pk,pk->k", atc, h)
+        ctr = c.T @ resid
+        df_resid = n - p - 1
+        with np.errstate(divide="ignore", invalid="ignore"):
+            beta_c = ctr / schur
+            rss_new = rss - ctr * beta_c
+            beta_g = beta[group_idx] - h[group_idx] * beta_c
+            var_g = rss_new / df_resid * (gram_inv[group_idx, group_idx] + h[group_idx] ** 2 / schur)
+            t = beta_g / np.sqrt(var_g)
+        pv = 2 * stats.t.sf(np.abs(t), df_resid) if df_resid > 0 else np.full(len(t), np.nan)
+        # 与当前设计共线的候选无法估计
+        pv[schur <= 1e-10 * np.einsum("nk,nk->k", c, c)] = np.nan
+        pvals[complete] = pv
+
+    # ---------- 3. 有缺失的候选：按自身可用行批量求解 ----------
+    if (~complete).any():
+        c = cand[:, ~complete]
+        terms = [design[:, j] for j in range(1, p)] + [c]
+        res = batched_ols(terms, y, ~np.isnan(c))
+        pvals[~complete] = res["pvalues"][:, group_idx]
+
+    return np.where(np.isnan(pvals), 1.0, pvals)
+
+
+def forward_step_linear(df, dv, group_col, candidate_covs, model_type, glm_family="gaussian", alpha=0.05,
+                        fit=None, design=None):
+    """
+    线性模型（OLS/WLS/ANOVA/ANCOVA）的增量前向逐步选择。
+    每一步只拟合一次当前模型，所有剩余候选的组别 p 值由加边更新批量得到；
+    选择规则、p 值与逐公式拟合一致，summary 仅对显著结果通过 fit(covs)（默认见 make_fitter）生成。
+    """
+    if design is None:
+        design = DesignMatrix(df)
+    if fit is None:
+        fit = make_fitter(df, dv, group_col, model_type, glm_family, design=design)
+    values = design.block([dv, group_col] + candidate_covs)
+    y_all, g_all = values[:, 0], values[:, 1]
+    cov_idx = {c: j + 2 for j, c in enumerate(candidate_covs)}
+
+    selected_covs = []
+    remaining_covs = candidate_covs.copy()
+    best_p = 1.0
+
+    sig_results = []
+
+    def add_result(covs, pval):
+        formula = _build_formula(dv, group_col, covs)
+        _, summary = fit(covs)
+        sig_results.append({
+            "dv": dv,
+            "model": model_type,
+            "selected_covs": covs.copy(),
+            "formula": formula,
+            "pval": pval,
+            "summary": summary
+        })
+
+    def current_design(covs):
+        cols = [g_all] + [values[:, cov_idx[c]] for c in covs]
+        rows = ~np.isnan(y_all) & ~np.isnan(np.column_stack(cols)).any(axis=1)
+        design = np.column_stack([np.ones(rows.sum())] + [col[rows] for col in cols])
+        return rows, design, y_all[rows]
+
+    while remaining_covs:
+        rows, design, y = current_design(selected_covs)
+        cand = values[rows][:, [cov_idx[c] for c in remaining_covs]]
+        start = time.perf_counter()
+        pvals = _step_pvalues(design, y, cand)
+        _trace_batch(dv, model_type, selected_covs, len(remaining_covs), start, len(y))
+
+        for cov, pval in zip(remaining_covs, pvals):
+            if pval < alpha:  # 仅保留显著的
+                add_result(selected_covs + [cov], float(pval))
+
+        # 与逐公式实现一致：取本轮最后一个优于上一轮最优 p 值的候选
+        improving = np.flatnonzero(pvals < best_p)
+        if len(improving) == 0:
+            break
+        best_idx = improving[-1]
+        best_p = float(pvals[best_idx])
+        selected_covs.append(remaining_covs.pop(best_idx))
+
+    # 最终模型（已选协变量）
+    if selected_covs:
+        final_pval = best_p
+    else:
+        rows, design, y = current_design([])
+        res = batched_ols([design[:, 1]], y, np.ones((len(y), 1), dtype=bool))
+        final_pval = np.nan_to_num(res["pvalues"][0, 1], nan=1.0)
+    if final_pval < alpha:
+        add_result(selected_covs, float(final_pval))
+
+    # 按 p 值升序排序
+    sig_results.sort(key=lambda x: x["pval"])
+
+    return sig_results
+
+
+def _gram_summary(res, names, model_type):
+    """
+    交叉积引擎的模型摘要：系数表；ANOVA/ANCOVA 为 Type II 方差分析表（与 _anova_typ2 相同）。
+    """
+    if model_type in ("ANOVA", "ANCOVA"):
+        f_values = res["tvalues"][1:] ** 2
+        scale = res["ssr"] / res["df_resid"]
+        table = pd.DataFrame({"sum_sq": f_values * scale, "df": 1.0, "F": f_values, "PR(>F)": res["pvalues"][1:]},
+                             index=names)
+        table.loc["Residual"] = [res["ssr"], res["df_resid"], np.nan, np.nan]
+        return str(table)
+    return str(pd.DataFrame({"coef": res["params"], "std err": res["bse"], "t": res["tvalues"],
+                             "P>|t|": res["pvalues"]}, index=["Intercept"] + names))
+
+
+def forward_step_gram(gram, dv, group_col, candidate_covs, model_type, alpha=0.05, missing="auto"):
+    """
+    线性模型（OLS/WLS/ANOVA/ANCOVA）的前向逐步选择，全部拟合由交叉积矩阵（GramMatrix）求解，不访问原始数据行，
+    适用于无法整表载入内存的数据（见 GramMatrix.gram_for_file）。
+    选择规则与 forward_step_linear 相同；WLS 的权重均为 1，与 OLS 相同；summary 见 _gram_summary。
+    missing 见 GramMatrix.ols。
+    """
+    model_type = model_type.upper()
+    if model_type not in LINEAR_MODEL_TYPES:
+        raise ValueError(f"交叉积引擎只支持线性模型: {LINEAR_MODEL_TYPES}")
+
+    def fit(covs):
+        res = gram.ols(dv, [group_col] + covs, missing=missing)
+        return float(np.nan_to_num(res["pvalues"][1], nan=1.0)), res
+
+    selected_covs = []
+    remaining_covs = list(candidate_covs)
+    best_p = 1.0
+
+    sig_results = []
+
+    def add_result(covs, pval, res):
+        sig_results.append({
+            "dv": dv,
+            "model": model_type,
+            "selected_covs": covs.copy(),
+            "formula": _build_formula(dv, group_col, covs),
+            "pval": pval,
+            "summary": _gram_summary(res, [group_col] + covs, model_type)
+        })
+
+    while remaining_covs:
+        start = time.perf_counter()
+        fits = [fit(selected_covs + [cov]) for cov in remaining_covs]
+        _trace_batch(dv, model_type, selected_covs, len(remaining_covs), start, fits[0][1]["nobs"])
+
+        for cov, (pval, res) in zip(remaining_covs, fits):
+            if pval < alpha:  # 仅保留显著的
+                add_result(selected_covs + [cov], pval, res)
+
+        # 与逐公式实现一致：取本轮最后一个优于上一轮最优 p 值的候选
+        pvals = np.array([pval for pval, _ in fits])
+        improving = np.flatnonzero(pvals < best_p)
+        if len(improving) == 0:
+            break
+        best_idx = improving[-1]
+        best_p = float(pvals[best_idx])
+        selected_covs.append(remaining_covs.pop(best_idx))
+
+    # 最终模型（已选协变量）
+    final_pval, final_res = fit(selected_covs)
+    if final_pval < alpha:
+        add_result(selected_covs, final_pval, final_res)
+
+    # 按 p 值升序排序
+    sig_results.sort(key=lambda x: x["pval"])
+
+    return sig_results
+
+
+# ---------------------------- 线性模型最优子集（分支定界） ----------------------------
+# 最优子集搜索结果按 (数据, 候选, 选项) 记忆化：OLS/WLS/ANOVA/ANCOVA 的组别检验相同，只搜索一次
+SUBSET_CACHE = FitCache(maxsize=64)
+
+
+def _nested_rss(gram, yy, xy, tol=1e-10):
+    """
+    依次加入 gram 的各列（与 y 的交叉积为 xy），返回每加入一列后的残差平方和；与已加入列共线的列跳过。
+    """
+    gram, xy = gram.copy(), xy.copy()
+    diag = np.diag(gram).copy()
+    rss = np.empty(len(xy))
+    for j in range(len(xy)):
+        pivot = gram[j, j]
+        if pivot > tol * diag[j]:
+            col = gram[:, j] / pivot
+            yy -= xy[j] ** 2 / pivot
+            xy = xy - col * xy[j]
+            gram = gram - np.outer(col, gram[j])
+        rss[j] = yy
+    return rss
+
+
+def _subset_offer(tops, size, top_n, t2, subset):
+    """把子集加入该大小的前 top_n（按组别 t² 保留最大的 top_n 个）"""
+    heap = tops.setdefault(size, [])
+    if len(heap) < top_n:
+        heapq.heappush(heap, (t2, subset))
+    elif (t2, subset) > heap[0]:
+        heapq.heapreplace(heap, (t2, subset))
+
+
+def _subset_prunable(tops, top_n, n, ratio, k_lo, k_hi):
+    """子树内各大小的 t² 上界 (n - 2 - k) × ratio 均不超过该大小当前第 top_n 名时，整棵子树可剪去"""
+    for k in range(k_lo, k_hi + 1):
+        heap = tops.get(k, ())
+        if len(heap) < top_n or (n - 2 - k) * ratio * (1 + 1e-9) > heap[0][0]:
+            return False
+    return True
+
+
+def _subset_node(n, selected, remaining, partial, max_size, top_n, tops, tol=1e-10):
+    """
+    展开一个节点：由 partial（因变量、组别与 remaining 各列对 selected 残差化后的交叉积，各列已单位化）
+    计算 selected 加入每一个候选后的组别 t²，记入 tops；返回需继续展开的子节点
+    [(selected + [c], 其后的候选, 上界比值, (partial, c 的位置, 子节点保留的位置))]。
+    子节点按 t² 降序排列，第 i 个子节点的子树只使用排在其后的候选。
+    """
+    k = len(selected) + 1
+    yy, gg, gy = partial[0, 0], partial[1, 1], partial[0, 1]
+    pcc, pyc, pgc = np.diag(partial)[2:], partial[0, 2:], partial[1, 2:]
+
+    # ---------- 1. 子节点：加入单个候选 ----------
+    valid = pcc > tol
+    with np.errstate(divide="ignore", invalid="ignore"):
+        yy_c = yy - pyc ** 2 / pcc
+        gg_c = gg - pgc ** 2 / pcc
+        gy_c = gy - pgc * pyc / pcc
+        t2 = (n - 2 - k) * gy_c ** 2 / (gg_c * yy_c - gy_c ** 2)
+    valid &= (gg_c > tol) & np.isfinite(t2)
+    heap = tops.get(k, ())
+    floor = heap[0][0] if len(heap) >= top_n else -np.inf
+    for j in np.flatnonzero(valid & (t2 >= floor)):
+        _subset_offer(tops, k, top_n, float(t2[j]), tuple(selected + [remaining[j]]))
+    if k >= max_size:
+        return []
+
+    # ---------- 2. 子树上界 ----------
+    # 子树内任一模型 T：t² = df × (RSS(y|T) / RSS(y|T, 组别) - 1)，
+    # 其中 RSS(y|T) ≤ RSS(y|子节点)，RSS(y|T, 组别) ≥ RSS(y|子节点及其后全部候选, 组别)
+    order = np.flatnonzero(valid)[np.argsort(-t2[valid], kind="stable")]
+    m = len(order)
+    sweep = np.concatenate([[1], 2 + order[::-1]])
+    rss_full = _nested_rss(partial[np.ix_(sweep, sweep)], yy, partial[0, sweep])
+    children = []
+    for i, j in enumerate(order[:-1]):
+        ratio = yy_c[j] / rss_full[m - i] - 1 if rss_full[m - i] > tol * yy else np.inf
+        keep = np.concatenate([[0, 1], 2 + order[i + 1:]])
+        children.append((selected + [remaining[j]], [remaining[o] for o in order[i + 1:]], ratio,
+                         (partial, 2 + j, keep)))
+    return children
+
+
+def _subset_partial(parent):
+    """子节点的残差化交叉积：在父节点的 partial 上对新加入的列做一次扫描（sweep），只保留需要的位置"""
+    partial, pivot, keep = parent
+    col = partial[keep, pivot]
+    return partial[np.ix_(keep, keep)] - np.outer(col, col) / partial[pivot, pivot]
+
+
+def _subset_search(n, stack, max_size, top_n, tops=None):
+    """从 stack 中的节点开始深度优先的分支定界，返回 (tops, 展开节点数)"""
+    tops = {} if tops is None else tops
+    nodes = 0
+    while stack:
+        selected, remaining, ratio, parent = stack.pop()
+        if _subset_prunable(tops, top_n, n, ratio, len(selected) + 1,
+                            min(max_size, len(selected) + len(remaining))):
+            continue
+        nodes += 1
+        partial = parent if isinstance(parent, np.ndarray) else _subset_partial(parent)
+        stack.extend(reversed(_subset_node(n, selected, remaining, partial, max_size, top_n, tops)))
+    return tops, nodes
+
+
+def _subset_branch(n, node, max_size, top_n, tops):
+    """并行执行时的单个顶层分支"""
+    return _subset_search(n, [node], max_size, top_n, tops)
+
+
+def best_subset_linear(df, dv, group_col, candidate_covs, model_type, glm_family="gaussian", alpha=0.05,
+                       top_n=5, max_size=5, n_jobs=1, fit=None, design=None):
+    """
+    线性模型（OLS/WLS/ANOVA/ANCOVA）的最优子集搜索：对每个子集大小（1 ~ max_size），
+    找出使组别 p 值最小的前 top_n 个协变量子集，返回其中显著的结果（与前向逐步选择相同的结果字典，按大小、p 值排序）。
+    同一大小的模型残差自由度相同，组别 p 值最小即组别 t² 最大；在交叉积矩阵上做 leaps-and-bounds 式的分支定界，
+    子树的 t² 上界由残差平方和给出（见 _subset_node），不可能进入前 top_n 的子树整体剪去。
+    使用因变量、组别与全部候选协变量均无缺失的行（各子集的样本相同，上界才成立），summary 也在这些行上拟合。
+    n_jobs 不为 1 时各顶层分支在进程池中并行搜索（各分支独立剪枝，结果合并）。
+    """
+    if design is None:
+        design = DesignMatrix(df)
+    if max_size is None:
+        max_size = len(candidate_covs)
+    values = design.block([dv, group_col] + candidate_covs)
+    rows = ~np.isnan(values).any(axis=1)
+    n = int(rows.sum())
+    max_size = min(max_size, len(candidate_covs), n - 3)
+
+    h = hashlib.sha1(values[rows].tobytes())
+    h.update(repr((dv, group_col, list(candidate_covs), top_n, max_size)).encode("utf-8"))
+    key = h.hexdigest()
+    tops = SUBSET_CACHE.get(key)
+    if tops is None:
+        start = time.perf_counter()
+        x = values[rows] - values[rows].mean(axis=0)
+        norms = np.sqrt(np.einsum("nk,nk->k", x, x))
+        x = x / np.where(norms > 0, norms, 1.0)
+        gram = x.T @ x
+
+        if n_jobs is None or n_jobs < 0:
+            n_jobs = os.cpu_count() or 1
+        root = ([], list(range(2, gram.shape[0])), np.inf, gram)
+        if max_size < 1:
+            tops, nodes = {}, 0
+        elif n_jobs == 1:
+            tops, nodes = _subset_search(n, [root], max_size, top_n)
+        else:
+            tops = {}
+            branches = _subset_node(n, root[0], root[1], gram, max_size, top_n, tops)
+            branches = [(selected, remaining, ratio, _subset_partial(parent))
+                        for selected, remaining, ratio, parent in branches]
+            nodes = 1
+            # 各分支独立剪枝：先沿 t² 最大的子节点下潜一次，为各大小提供初始的前 top_n
+            children = branches[:1]
+            while children:
+                selected, remaining, _, parent = children[0]
+                partial = parent if isinstance(parent, np.ndarray) else _subset_partial(parent)
+                children = _subset_node(n, selected, remaining, partial, max_size, top_n, tops)
+                nodes += 1
+            with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+                for branch_tops, branch_nodes in pool.map(_subset_branch, *zip(*[
+                        (n, node, max_size, top_n, tops) for node in branches])):
+                    nodes += branch_nodes
+                    for size, heap in branch_tops.items():
+                        for t2, subset in heap:
+                            if (t2, subset) not in tops.get(size, ()):
+                                _subset_offer(tops, size, top_n, t2, subset)
+        _trace_batch(dv, model_type, [], nodes, start, n)
+        SUBSET_CACHE.put(key, tops)
+
+    if fit is None or not rows.all():
+        df_cc = df[rows]
+        fit = make_fitter(df_cc, dv, group_col, model_type, glm_family, design=DesignMatrix(df_cc))
+
+    sig_results = []
+    for size in sorted(tops):
+        df_resid = n - 2 - size
+        for t2, subset in sorted(tops[size], reverse=True):
+            pval = float(2 * stats.t.sf(np.sqrt(t2), df_resid))
+            if pval >= alpha:  # 仅保留显著的
+                continue
+            covs = [candidate_covs[j - 2] for j in subset]
+            _, summary = fit(covs)
+            sig_results.append({
+                "dv": dv,
+                "model": model_type,
+                "selected_covs": covs,
+                "formula": _build_formula(dv, group_col, covs),
+                "pval": pval,
+                "summary": summary
+            })
+
+    return sig_results
+
+
+# ---------------------------- GLM 一步 Wald 近似筛选 ----------------------------
+# ROBUSTGLM 的最终拟合使用 HC3 协方差，模型型方差的一步近似与之不符，故不参与筛选
+SCREEN_MODEL_TYPES = ("GLM", "POISSON", "NEGBIN", "LOGISTIC")
+
+
+def _screen_family(model_type, glm_family="gaussian"):
+    """筛选时使用的 GLM 分布族（LOGISTIC 即二项分布 logit 连接）"""
+    return {
+        "POISSON": sm.families.Poisson(),
+        "NEGBIN": sm.families.NegativeBinomial(),
+        "LOGISTIC": sm.families.Binomial(),
+    }.get(model_type.upper(), _get_family(glm_family))
+
+
+def _one_step_screen(design, y, cand, family, group_idx=1):
+    """
+    在当前 GLM（design 列：截距、组别、已选协变量）处，对所有候选列向量化地计算组别系数的一步 Wald 近似 p 值。
+    只拟合一次当前模型，以其 IRLS 工作权重 W 与工作残差 r 计算加入候选后 IRLS 迭代一步的系数与方差
+    （s 为候选列对当前设计的加权 Schur 补，候选系数为 c'Wr / s），高斯恒等连接时与完整拟合一致。
+    参数：
+        design : ndarray, (n, p) 当前模型设计矩阵（已限定在当前可用行）
+        y : ndarray, (n,)
+        cand : ndarray, (n, k) 候选列（不含 NaN）
+        family : statsmodels 分布族
+    返回：
+        pvals : ndarray, (k,) 组别近似 p 值（无法估计时为 1.0）
+    """
+    res = sm.GLM(y, design, family=family).fit()
+    mu = res.mu
+    w = family.weights(mu)
+    resid = (y - mu) * family.link.deriv(mu)
+    scale = res.scale
+
+    # ---------- 1. 加权设计与 Gram 逆 ----------
+    sw = np.sqrt(w)
+    a = design * sw[:, None]
+    c = cand * sw[:, None]
+    r = resid * sw
+    gram_inv = np.linalg.pinv(a.T @ a, hermitian=True)
+
+    # ---------- 2. 一步更新 ----------
+    atc = a.T @ c
+    h = gram_inv @ atc
+    ctc = np.einsum("nk,nk->k", c, c)
+    schur = ctc - np.einsum("pk,pk->k", atc, h)
+    u = c.T @ r
+    with np.errstate(divide="ignore", invalid="ignore"):
+        beta_c = u / schur
+        beta_g = res.params[group_idx] - h[group_idx] * beta_c
+        # 离散参数需估计的分布族（如高斯）按加入候选后的 Pearson χ² 更新尺度
+        if not isinstance(family, (sm.families.Binomial, sm.families.Poisson, sm.families.NegativeBinomial)):
+            scale = (res.pearson_chi2 - u * beta_c) / (res.df_resid - 1)
+        var_g = scale * (gram_inv[group_idx, group_idx] + h[group_idx] ** 2 / schur)
+        pvals = 2 * stats.norm.sf(np.abs(beta_g / np.sqrt(var_g)))
+
+    # 与当前设计共线的候选无法估计
+    bad = schur <= 1e-10 * ctc
+    pvals[bad] = np.nan
+    return np.where(np.isnan(pvals), 1.0, pvals)
+
+
+def forward_step_screened(df, dv, group_col, candidate_covs, model_type, glm_family="gaussian", alpha=0.05,
+                          top_k=10, fit=None, design=None, lazy_summary=True, warm_start=True, fit_stats=None):
+    """
+    GLM 类模型（GLM/POISSON/NEGBIN/LOGISTIC）的一步 Wald 近似筛选前向逐步选择。
+    每一步拟合一次当前模型，用 _one_step_screen 按组别近似 p 值为全部剩余候选排序，
+    只对近似 p 值最小的 top_k 个候选（及在当前可用行上有缺失、无法筛选的候选）做完整拟合确认。
+    选择规则与逐公式实现一致（在完整拟合的候选中取最后一个优于上一轮最优 p 值者）；
+    被筛掉的候选不做完整拟合，其显著结果不会出现在输出中。
+    """
+    if design is None:
+        design = DesignMatrix(df)
+    if fit is None:
+        fit = make_fitter(df, dv, group_col, model_type, glm_family, design=design)
+    fit = _warm_fitter(fit, warm_start, fit_stats)
+    family = _screen_family(model_type, glm_family)
+    values = design.block([dv, group_col] + candidate_covs)
+    y_all, g_all = values[:, 0], values[:, 1]
+    cov_idx = {c: j + 2 for j, c in enumerate(candidate_covs)}
+
+    selected_covs = []
+    remaining_covs = candidate_covs.copy()
+    best_p = 1.0
+
+    sig_results = []
+
+    def shortlist(covs):
+        # 当前模型 + 近似 p 值排序，返回需完整拟合的候选（保持 remaining_covs 中的原顺序）
+        cols = [g_all] + [values[:, cov_idx[c]] for c in covs]
+        rows = ~np.isnan(y_all) & ~np.isnan(np.column_stack(cols)).any(axis=1)
+        cur = np.column_stack([np.ones(rows.sum())] + [col[rows] for col in cols])
+        cand = values[rows][:, [cov_idx[c] for c in remaining_covs]]
+        complete = ~np.isnan(cand).any(axis=0)
+        keep = ~complete
+        try:
+            start = time.perf_counter()
+            pvals = _one_step_screen(cur, y_all[rows], cand[:, complete], family)
+            _trace_batch(dv, model_type, covs, int(complete.sum()), start, rows.sum())
+        except Exception:
+            # 当前模型无法拟合时不筛选
+            return list(remaining_covs)
+        order = np.argsort(pvals, kind="stable")[:top_k]
+        keep[np.flatnonzero(complete)[order]] = True
+        return [c for c, k in zip(remaining_covs, keep) if k]
+
+    while remaining_covs:
+        improved = False
+        best_cov = None
+        best_p_candidate = None
+
+        for cov in shortlist(selected_covs):
+            covs_try = selected_covs + [cov]
+            pval, summary = fit(covs_try, lazy=lazy_summary)
+
+            if pval < alpha:  # 仅保留显著的（summary 只在此时渲染）
+                sig_results.append({
+                    "dv": dv,
+                    "model": model_type,
+                    "selected_covs": covs_try.copy(),
+                    "formula": _build_formula(dv, group_col, covs_try),
+                    "pval": pval,
+                    "summary": str(summary)
+                })
+
+            if pval < best_p:
+                improved = True
+                best_cov = cov
+                best_p_candidate = pval
+
+        if improved:
+            selected_covs.append(best_cov)
+            remaining_covs.remove(best_cov)
+            best_p = best_p_candidate
+        else:
+            break
+
+    # 最终模型（已选协变量）
+    final_pval, final_summary = fit(selected_covs, lazy=lazy_summary)
+    if final_pval < alpha:
+        sig_results.append({
+            "dv": dv,
+            "model": model_type,
+            "selected_covs": selected_covs.copy(),
+            "formula": _build_formula(dv, group_col, selected_covs),
+            "pval": final_pval,
+            "summary": str(final_summary)
         })
 
     # 按 p 值升序排序
@@ -200,6 +1263,209 @@ def forward_step_for_dv(df, dv, group_col, candidate_covs, model_type, glm_famil
 
     return sig_results
 
+# ---------------------------- 并行执行 ----------------------------
+_WORKER_DF = None
+_WORKER_FP = None
+_WORKER_DESIGN = None
+
+
+def _init_worker(df):
+    """进程池初始化：每个工作进程只接收一次 DataFrame，并计算一次数据集指纹与设计矩阵"""
+    global _WORKER_DF, _WORKER_FP, _WORKER_DESIGN
+    _WORKER_DF = df
+    _WORKER_FP = dataset_fingerprint(df)
+    _WORKER_DESIGN = DesignMatrix(df)
+
+
+def _run_unit(dv, group_col, candidate_covs, model_type, glm_family, alpha, step_options=None, trace=False):
+    """
+    工作进程中执行一个 (dv, model_type) 单元，返回结果、耗时、本单元的缓存命中 / 未命中次数、迭代拟合统计
+    与逐次拟合记录（trace=False 时为空列表）。
+    step_options 为传给 forward_step_for_dv 的其余关键字参数。
+    """
+    if trace:
+        start_trace()
+    start = time.time()
+    hits, misses, timeouts = FIT_CACHE.hits, FIT_CACHE.misses, fit_timeouts()
+    fit_stats = new_fit_stats()
+    sig_results = forward_step_for_dv(_WORKER_DF, dv, group_col, candidate_covs, model_type, glm_family, alpha,
+                                      fingerprint=_WORKER_FP, design=_WORKER_DESIGN, fit_stats=fit_stats,
+                                      **(step_options or {}))
+    fit_stats["timeouts"] += fit_timeouts() - timeouts
+    cache_delta = (FIT_CACHE.hits - hits, FIT_CACHE.misses - misses)
+    records = stop_trace().records if trace else []
+    return dv, model_type, sig_results, time.time() - start, cache_delta, fit_stats, records
+
+
+def _write_model_sheet(writer, model_type, sig_results, note=None):
+    """note 非空时（单元超时 / 出错）只写出说明"""
+    sheet_name = model_type[:31]
+    if note:
+        df_out = pd.DataFrame({"Info": [note]})
+    elif sig_results:
+        df_out = pd.DataFrame(sig_results)
+    else:
+        df_out = pd.DataFrame({"Info": ["No significant results"]})
+    df_out.to_excel(writer, sheet_name=sheet_name, index=False)
+
+
+def _update_eta(pbar, total_tasks, start_all_time, restored=0, progress=None):
+    """
+    刷新进度条的动态 ETA（与完成顺序无关；从检查点恢复的单元不计入速率）。
+    progress 为 {"done": 已完成单元的预计耗时之和, "total": 待运行单元的预计耗时之和} 时按预计耗时加权，
+    否则按已完成单元数。
+    """
+    done_tasks = pbar.n
+    elapsed_all = time.time() - start_all_time
+    if progress is not None and progress["done"] > 0:
+        eta = elapsed_all * (progress["total"] - progress["done"]) / progress["done"]
+    else:
+        run_tasks = done_tasks - restored
+        avg_task_time = elapsed_all / run_tasks if run_tasks > 0 else 0
+        remaining_tasks = total_tasks - done_tasks
+        eta = avg_task_time * remaining_tasks
+
+    pbar.set_postfix({
+        "已完成次数": f"{done_tasks}/{total_tasks}",
+        "已用时": f"{elapsed_all/60:.1f} 分钟",
+        "预计剩余": f"{eta/60:.1f} 分钟"
+    })
+
+
+def _unit_note(status, message):
+    """超时 / 出错单元写入 Excel 的说明（正常完成的单元为 None）"""
+    if status == "timeout":
+        return f"Timed out: {message}"
+    if status == "error":
+        return f"Error: {message}"
+    return None
+
+
+def _run_units_parallel(df, dv_list, group_col, candidate_covs, model_types, glm_family, alpha,
+                        save_folder, results_all, pbar, total_tasks, start_all_time, n_jobs,
+                        restored, checkpoint_dir=None, cache_stats=None, step_options=None, fit_stats=None,
+                        order=None, on_unit=None, progress=None, unit_timeout=None, fit_timeout=None,
+                        checkpoint_key=None):
+    """
+    将 (dv, model_type) 单元分发到常驻工作进程执行（Scheduler.run_units）。
+    order 为单元的执行顺序（通常按预计耗时降序，见 Scheduler.plan_units），未提供时按 dv_list × model_types。
+    单元可能乱序完成：结果先缓存，某个 dv 的全部模型完成后，按 dv_list 顺序、
+    按 model_types 顺序写出 Excel sheet。restored 中已从检查点恢复的单元不再提交。
+    unit_timeout / fit_timeout 为单元 / 单次拟合时间限制（秒）：超时的单元记为 timeout，
+    其 sheet 只写出说明且不写检查点（resume 时重新运行）；检查点写入 checkpoint_key（见 checkpoint_key）。
+    各工作进程的拟合缓存命中次数累加到 cache_stats，迭代拟合统计累加到 fit_stats；
+    当前进程启用逐次拟合记录时，工作进程的记录合并到其中。
+    on_unit(dv, model_type, status, elapsed) 在每个单元结束时调用；progress 见 _update_eta。
+    返回每个 dv 的耗时（该 dv 所有单元耗时之和）。
+    """
+    if n_jobs is None or n_jobs < 0:
+        n_jobs = os.cpu_count() or 1
+    if cache_stats is None:
+        cache_stats = {"hits": 0, "misses": 0}
+    if order is None:
+        order = [(dv, model_type) for dv in dv_list for model_type in model_types]
+
+    done = {dv: {} for dv in dv_list}
+    unit_times = {dv: 0.0 for dv in dv_list}
+    for (dv, model_type), (sig_results, elapsed) in restored.items():
+        done[dv][model_type] = (sig_results, "ok", None)
+        unit_times[dv] += elapsed
+    next_dv = 0
+
+    def flush():
+        # 按原顺序写出已全部完成的 dv
+        nonlocal next_dv
+        while next_dv < len(dv_list) and len(done[dv_list[next_dv]]) == len(model_types):
+            cur = dv_list[next_dv]
+            results_all[cur] = []
+            writer = pd.ExcelWriter(os.path.join(save_folder, f"{cur}.xlsx"), engine="openpyxl")
+            for mt in model_types:
+                sig_results, status, message = done[cur][mt]
+                results_all[cur].append({"model": mt, "results": sig_results, "status": status})
+                _write_model_sheet(writer, mt, sig_results, _unit_note(status, message))
+            writer.close()
+            next_dv += 1
+
+    tracer = get_tracer()
+
+    def on_result(key, status, payload, elapsed):
+        dv, model_type = key
+        if status == "ok":
+            _, _, sig_results, elapsed, cache_delta, unit_stats, records = payload
+            if tracer is not None:
+                tracer.extend([{**rec, **tracer.context} for rec in records])
+            cache_stats["hits"] += cache_delta[0]
+            cache_stats["misses"] += cache_delta[1]
+            if fit_stats is not None:
+                for name, value in unit_stats.items():
+                    fit_stats[name] += value
+            if checkpoint_dir:
+                save_checkpoint(checkpoint_dir, dv, model_type, sig_results, elapsed, checkpoint_key)
+            done[dv][model_type] = (sig_results, status, None)
+        else:
+            print(f"\n⏱️ {dv} / {model_type}：{_unit_note(status, payload)}")
+            done[dv][model_type] = ([], status, payload)
+        unit_times[dv] += elapsed
+        if on_unit is not None:
+            on_unit(dv, model_type, status, elapsed)
+
+        pbar.update(1)
+        _update_eta(pbar, total_tasks, start_all_time, len(restored), progress)
+        flush()
+
+    flush()
+    step_options = {**(step_options or {}), "fit_timeout": fit_timeout}
+    tasks = [
+        ((dv, model_type),
+         (dv, group_col, candidate_covs, model_type, glm_family, alpha, step_options, tracer is not None))
+        for dv, model_type in order
+        if (dv, model_type) not in restored
+    ]
+    run_units(tasks, _run_unit, init=_init_worker, initargs=(df,), n_jobs=n_jobs,
+              unit_timeout=unit_timeout, fit_timeout=fit_timeout, on_result=on_result)
+
+    return [unit_times[dv] for dv in dv_list]
+
+
+# ---------------------------- 检查点 ----------------------------
+def _checkpoint_path(checkpoint_dir, dv, model_type):
+    return os.path.join(checkpoint_dir, str(dv), f"{model_type}.pkl")
+
+
+def checkpoint_key(fingerprint, **options):
+    """检查点键：数据集指纹 + 影响搜索结果的选项（alpha、glm_family、组别、候选协变量、搜索方式等）的哈希"""
+    h = hashlib.sha1(str(fingerprint).encode("utf-8"))
+    h.update(repr(sorted(options.items())).encode("utf-8"))
+    return h.hexdigest()
+
+
+def save_checkpoint(checkpoint_dir, dv, model_type, sig_results, elapsed, key=None):
+    """单元完成后立即写出检查点（先写临时文件再替换，避免中断时留下残缺文件）；key 见 checkpoint_key"""
+    path = _checkpoint_path(checkpoint_dir, dv, model_type)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump({"dv": dv, "model": model_type, "results": sig_results, "elapsed": elapsed, "key": key}, f)
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(checkpoint_dir, dv, model_type, key=None):
+    """
+    读取检查点，返回 (sig_results, elapsed)；不存在、损坏或键与 key 不一致（数据或搜索选项已改变）时返回 None，
+    该单元重新运行并覆盖旧检查点。
+    """
+    path = _checkpoint_path(checkpoint_dir, dv, model_type)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+        if data.get("key") != key:
+            return None
+        return data["results"], data["elapsed"]
+    except Exception:
+        return None
+
 
 # ---------------------------- 主函数 ----------------------------
 def model_significance_search(
@@ -210,19 +1476,29 @@ def model_significance_search(
     current_sequence=1,         # 当前是第几次（仅显示用）
     past_dv_times=None,         # 历史每个 dv 的耗时
     past_seq_times=None,        # 历史完整调用的耗时
-    start_time_all=None         # 全局起始时间
+    start_time_all=None,        # 全局起始时间
+    n_jobs=1,                   # 并行进程数（1 为串行；None 或负数使用全部 CPU 核）
+    checkpoint_dir=None,        # 检查点目录（每个 (dv, model_type) 完成后写出）
+    resume=False,               # 是否跳过检查点中已完成的单元
+    screen_top_k=None,          # GLM 类模型一步 Wald 近似筛选：每步完整拟合的候选数（None 为不筛选）
+    warm_start=True,            # 迭代型模型是否以上一次拟合的参数热启动
+    trace_path=None,            # 逐次拟合记录导出路径（.csv / .json；None 为不记录）
+    fit_timeout=None,           # 单次拟合时间限制（秒；超时的拟合 p 值记为 1.0）
+    unit_timeout=None,          # 单个 (dv, model_type) 单元时间限制（秒；超时的单元记为超时，不阻塞其余单元）
+    dry_run=False,              # 只打印调度计划（拟合次数与预计耗时），不拟合、不写出文件
+    history_path=None,          # 耗时历史（JSON），默认 save_folder/schedule_history.json
+    search="forward",           # "best_subset"：线性模型改为分支定界最优子集搜索
+    subset_top_n=5,             # 最优子集：每个子集大小保留的前 N 个
+    subset_max_size=5,          # 最优子集：最大子集大小（None 为不限制）
+    subset_jobs=1,              # 最优子集：顶层分支的并行进程数（仅 n_jobs=1 时使用，工作进程内不再并行）
+    engine="auto",              # "gram"：流式交叉积引擎，不整表载入，只做线性模型的前向选择（见 forward_step_gram）
+    cache_dir=None              # gram 引擎的交叉积磁盘缓存目录（None 为只使用内存缓存）
 ):
     if past_dv_times is None:
         past_dv_times = []
     if past_seq_times is None:
         past_seq_times = []
 
-    # 读取数据
-    df = pd.read_excel(file_path)
-    candidate_covs = [c for c in df.columns if c not in dv_list + [group_col]]
-    if exclude_cols:
-        candidate_covs = [c for c in candidate_covs if c not in exclude_cols]
-
     # 模型类型
     model_types = [
         "OLS", "GLM", "LMM", "RLM", "WLS", "ANOVA",
@@ -230,13 +1506,85 @@ def model_significance_search(
         "ORDLOG", "MULTINOM", "ROBUSTGLM", "MIXEDGLM", "GAM"
     ]
 
+    # 读取数据（gram 引擎只流式累积交叉积：候选为数值列，只运行线性模型，串行执行）
+    if engine == "gram":
+        df = None
+        gram = gram_for_file(file_path, exclude_cols, cache_dir)
+        columns, n_rows = gram.columns, gram.n_rows
+        fingerprint = ("gram", file_fingerprint(file_path))
+        model_types = [mt for mt in model_types if mt in LINEAR_MODEL_TYPES]
+        print(f"⚠️ 交叉积引擎只运行线性模型：{', '.join(model_types)}")
+        if search != "forward":
+            print("⚠️ 交叉积引擎只支持前向逐步选择，已忽略 search")
+        if n_jobs != 1:
+            print("⚠️ 交叉积引擎的拟合不访问数据行，已改为串行")
+            n_jobs = 1
+    elif engine == "auto":
+        gram = None
+        df = pd.read_excel(file_path)
+        columns, n_rows = list(df.columns), len(df)
+        fingerprint = dataset_fingerprint(df)
+    else:
+        raise ValueError(f"未知的计算引擎: {engine}")
+    candidate_covs = [c for c in columns if c not in dv_list + [group_col]]
+    if exclude_cols:
+        candidate_covs = [c for c in candidate_covs if c not in exclude_cols]
+
+    step_options = {"screen_top_k": screen_top_k, "warm_start": warm_start, "fit_timeout": fit_timeout,
+                    "search": search,
+                    "subset_options": {"top_n": subset_top_n, "max_size": subset_max_size,
+                                       "n_jobs": subset_jobs if n_jobs == 1 else 1}}
+    fit_stats = new_fit_stats()
+
     results_all = {}
     if save_folder is None:
         save_folder = os.getcwd()
-    os.makedirs(save_folder, exist_ok=True)
 
     # ✅ 总任务数 = DV × 模型（进度条按总次数来显示）
     total_tasks = len(dv_list) * len(model_types)
+
+    # 从检查点恢复已完成的单元（数据或搜索选项改变后旧检查点不再使用）
+    ckpt_key = checkpoint_key(fingerprint, group_col=group_col, candidate_covs=candidate_covs,
+                              glm_family=glm_family, alpha=alpha, screen_top_k=screen_top_k,
+                              warm_start=warm_start, fit_timeout=fit_timeout, search=search, subset_top_n=subset_top_n,
+                              subset_max_size=subset_max_size)
+    restored = {}
+    if resume and checkpoint_dir:
+        for dv in dv_list:
+            for model_type in model_types:
+                ckpt = load_checkpoint(checkpoint_dir, dv, model_type, ckpt_key)
+                if ckpt is not None:
+                    restored[(dv, model_type)] = ckpt
+    restored_time = sum(elapsed for _, elapsed in restored.values())
+
+    # 调度计划：按行数、候选协变量数与耗时历史估计每个单元的耗时，最贵的单元最先执行
+    if history_path is None:
+        history_path = os.path.join(save_folder, "schedule_history.json")
+    cost_model = CostModel(history_path)
+    top_k = {mt: screen_top_k for mt in SCREEN_MODEL_TYPES} if screen_top_k else {}
+    n_covs = len(candidate_covs)
+    plan = plan_units([(dv, mt) for dv in dv_list for mt in model_types if (dv, mt) not in restored],
+                      n_rows, n_covs, cost_model, top_k)
+    if dry_run:
+        if restored:
+            print(f"♻️ 检查点中已完成 {len(restored)}/{total_tasks} 个单元")
+        print_plan(plan, n_jobs)
+        return results_all, [], 0.0
+    estimates = dict(zip(zip(plan["dv"], plan["model_type"]), plan["预计耗时(s)"]))
+    progress = {"done": 0.0, "total": float(plan["预计耗时(s)"].sum())}
+    wall = estimate_makespan(plan["预计耗时(s)"].tolist(), n_jobs if n_jobs and n_jobs > 0 else os.cpu_count() or 1)
+    print(f"🗓️ {len(plan)} 个单元预计耗时 {wall / 60:.1f} 分钟")
+    timed_out = []
+
+    def on_unit(dv, model_type, status, elapsed):
+        progress["done"] += estimates[(dv, model_type)]
+        if status != "error":
+            cost_model.observe(model_type, n_rows, n_covs, elapsed, top_k.get(model_type))
+        if status != "ok":
+            timed_out.append((dv, model_type, status))
+
+    os.makedirs(save_folder, exist_ok=True)
+
     pbar = tqdm(
         total=total_tasks,
         desc="前向选择总进度",
@@ -255,52 +1603,105 @@ def model_significance_search(
 
     print(f"\n🔹 开始任务集 (设定总次数 = {total_sequences})")
 
-    for dv_idx, dv in enumerate(dv_list, 1):
-        results_all[dv] = []
-        excel_path = os.path.join(save_folder, f"{dv}.xlsx")
-        writer = pd.ExcelWriter(excel_path, engine="openpyxl")
+    if restored:
+        print(f"♻️ 从检查点恢复 {len(restored)}/{total_tasks} 个单元")
+        pbar.update(len(restored))
 
-        start_dv_time = time.time()
+    tracer = start_trace(os.path.basename(file_path)) if trace_path else None
 
-        for model_type in model_types:
-            sig_results = forward_step_for_dv(df, dv, group_col, candidate_covs, model_type, glm_family, alpha)
-            results_all[dv].append({
-                "model": model_type,
-                "results": sig_results
-            })
+    cache_stats = {"hits": FIT_CACHE.hits, "misses": FIT_CACHE.misses}
+    if n_jobs != 1:
+        parallel_stats = {"hits": 0, "misses": 0}
+        dv_times = _run_units_parallel(
+            df, dv_list, group_col, candidate_covs, model_types, glm_family, alpha,
+            save_folder, results_all, pbar, total_tasks, start_all_time, n_jobs,
+            restored, checkpoint_dir, parallel_stats, step_options, fit_stats,
+            order=list(estimates), on_unit=on_unit, progress=progress,
+            unit_timeout=unit_timeout, fit_timeout=fit_timeout, checkpoint_key=ckpt_key
+        )
+    else:
+        # 串行时按 dv 顺序逐个写出 Excel（执行顺序不影响总耗时）
+        timeouts = fit_timeouts()
+        design = DesignMatrix(df) if gram is None else None
+        for dv_idx, dv in enumerate(dv_list, 1):
+            results_all[dv] = []
+            excel_path = os.path.join(save_folder, f"{dv}.xlsx")
+            writer = pd.ExcelWriter(excel_path, engine="openpyxl")
 
-            # 保存 Excel，每个模型一个 sheet
-            sheet_name = model_type[:31]
-            if sig_results:
-                df_out = pd.DataFrame(sig_results)
-            else:
-                df_out = pd.DataFrame({"Info": ["No significant results"]})
-            df_out.to_excel(writer, sheet_name=sheet_name, index=False)
-
-            # ✅ 这里只 update 一次，但步长 = total_sequences
-            pbar.update(1)
-
-            # ---- 动态 ETA ----
-            done_tasks = pbar.n
-            elapsed_all = time.time() - start_all_time
-            avg_task_time = elapsed_all / done_tasks if done_tasks > 0 else 0
-            remaining_tasks = total_tasks - done_tasks
-            eta = avg_task_time * remaining_tasks
-
-            pbar.set_postfix({
-                "已完成次数": f"{done_tasks}/{total_tasks}",
-                "已用时": f"{elapsed_all/60:.1f} 分钟",
-                "预计剩余": f"{eta/60:.1f} 分钟"
-            })
+            start_dv_time = time.time()
+            dv_restored_time = 0.0
 
-        writer.close()
-        dv_times.append(time.time() - start_dv_time)
+            for model_type in model_types:
+                status, note = "ok", None
+                if (dv, model_type) in restored:
+                    sig_results, elapsed = restored[(dv, model_type)]
+                    dv_restored_time += elapsed
+                else:
+                    start_unit_time = time.time()
+                    try:
+                        with unit_time_limit(unit_timeout):
+                            if gram is not None:
+                                sig_results = forward_step_gram(gram, dv, group_col, candidate_covs, model_type,
+                                                                alpha)
+                            else:
+                                sig_results = forward_step_for_dv(df, dv, group_col, candidate_covs, model_type,
+                                                                  glm_family, alpha, fingerprint=fingerprint,
+                                                                  design=design, fit_stats=fit_stats,
+                                                                  **step_options)
+                    except UnitTimeout:
+                        sig_results, status = [], "timeout"
+                        note = _unit_note(status, f"单元超过 {unit_timeout} 秒")
+                        print(f"\n⏱️ {dv} / {model_type}：{note}")
+                    except Exception as e:
+                        sig_results, status = [], "error"
+                        note = _unit_note(status, f"{type(e).__name__}: {e}")
+                        print(f"\n⏱️ {dv} / {model_type}：{note}")
+                    elapsed = time.time() - start_unit_time
+                    if checkpoint_dir and status == "ok":
+                        save_checkpoint(checkpoint_dir, dv, model_type, sig_results, elapsed, ckpt_key)
+                    on_unit(dv, model_type, status, elapsed)
+
+                    # ✅ 这里只 update 一次，但步长 = total_sequences
+                    pbar.update(1)
+                    _update_eta(pbar, total_tasks, start_all_time, len(restored), progress)
+
+                results_all[dv].append({
+                    "model": model_type,
+                    "results": sig_results,
+                    "status": status
+                })
+
+                # 保存 Excel，每个模型一个 sheet
+                _write_model_sheet(writer, model_type, sig_results, note)
+
+            writer.close()
+            dv_times.append(time.time() - start_dv_time + dv_restored_time)
+        fit_stats["timeouts"] += fit_timeouts() - timeouts
 
     pbar.close()
 
-    # ✅ 计算总用时
-    seq_time = time.time() - start_seq_time
+    # ✅ 计算总用时（含检查点中已完成单元的耗时）
+    seq_time = time.time() - start_seq_time + restored_time
     print(f"✅ 任务集完成，用时 {seq_time/60:.1f} 分钟")
 
+    if n_jobs != 1:
+        hits, misses = parallel_stats["hits"], parallel_stats["misses"]
+    else:
+        hits, misses = FIT_CACHE.hits - cache_stats["hits"], FIT_CACHE.misses - cache_stats["misses"]
+    print(f"🗂️ 拟合缓存：命中 {hits} 次，未命中 {misses} 次")
+    if fit_stats["fits"]:
+        print(f"🔁 迭代拟合 {fit_stats['fits']} 次，共 {fit_stats['iterations']} 次迭代"
+              f"（平均 {fit_stats['iterations'] / fit_stats['fits']:.1f}；热启动 {fit_stats['warm']} 次，"
+              f"回退冷启动 {fit_stats['fallback']} 次）")
+    if timed_out or fit_stats["timeouts"]:
+        print(f"⏱️ 超时 / 出错：{len(timed_out)} 个单元，{fit_stats['timeouts']} 次拟合"
+              + (f"（{', '.join(f'{dv}/{mt}' for dv, mt, _ in timed_out)}）" if timed_out else ""))
+    cost_model.save()
+
+    if tracer is not None:
+        stop_trace()
+        tracer.export(trace_path)
+        tracer.print_hotspots()
+
     # ✅ 返回时带上 seq_time
     return results_all, dv_times, seq_time
@@ -2,8 +2,16 @@ import pandas as pd
 import statsmodels.formula.api as smf
 import os
 import numpy as np
+from BatchOLS import batched_ols, ols_ftest
+from DesignMatrix import DesignMatrix
+from DataCache import load_dataset, dummy_candidates
+from GramMatrix import gram_for_file
+from ResultStore import append_results, query_results
 
-def moderation_search(file_path, x_var, y_var, exclude_cols=None, output_dir=None):
+def moderation_search(file_path, x_var, y_var, exclude_cols=None, output_dir=None, engine="batch", cache_dir=None,
+                      n_perm=0, p_threshold=0.05, seed=None,
+                      store_path=None, write_excel=True,
+                      group_dummies=True, max_levels=50, high_cardinality="skip"):
     """
     自动测试Excel中每个变量作为调节变量（Z）的显著性（交互项p值）及三条路径结果。
     参数：
@@ -12,29 +20,224 @@ def moderation_search(file_path, x_var, y_var, exclude_cols=None, output_dir=Non
         y_var : str, 因变量列名
         exclude_cols : list, 要排除的列名
         output_dir : str, 输出目录（默认为输入文件所在目录）
+        engine : str, "batch" 为批量矩阵引擎（默认）；"statsmodels" 为逐候选公式拟合的参考实现；
+                 "gram" 为流式交叉积引擎（不整表载入，只使用数值列，见 _moderation_gram）
+        cache_dir : str, 数据集磁盘缓存目录（默认只使用内存缓存）
+        n_perm : int, 交互项 Freedman–Lane 置换检验的最大置换次数（0 表示不做置换检验；gram 引擎不支持）
+        p_threshold : float, 置换 p 值明显高于该阈值的候选提前停止
+        seed : int, 随机种子（保证结果可复现）
+        store_path : str, SQLite 结果库路径（写入结果并标注 file_name、y_var）
+        write_excel : bool, 是否输出 Excel 结果文件
+        group_dummies : bool, 同一文本列的多个虚拟变量是否作为一个候选整体检验（F 检验，见 _moderation_grouped）
+        max_levels : int, 文本列允许的最大水平数（见 DataCache.encode_dummies）
+        high_cardinality : str, 高基数文本列的处理方式，"skip" 或 "cap"
     """
 
-    # ---------- 1. 读取数据 ----------
-    df = pd.read_excel(file_path)
-    print(f"读取数据，共 {df.shape[0]} 行，{df.shape[1]} 列。")
+    if engine == "gram":
+        return _moderation_search_gram(file_path, x_var, y_var, exclude_cols, output_dir, cache_dir, n_perm,
+                                       store_path, write_excel)
 
-    # ---------- 2. 排除指定列 ----------
-    if exclude_cols:
-        df = df.drop(columns=exclude_cols, errors='ignore')
-    print(f"排除后剩余 {df.shape[1]} 列。")
-
-    # ---------- 3. 虚拟变量化 ----------
-    df = pd.get_dummies(df, drop_first=True)
-    print("已自动虚拟变量化。")
+    # ---------- 1~3. 读取数据、排除指定列、虚拟变量化（按文件指纹缓存） ----------
+    df = load_dataset(file_path, exclude_cols, cache_dir, max_levels, high_cardinality)
 
     if x_var not in df.columns or y_var not in df.columns:
         raise ValueError(f"未找到自变量 {x_var} 或因变量 {y_var}")
 
     # ---------- 4. 候选调节变量 ----------
-    candidates = [c for c in df.columns if c not in [x_var, y_var]]
+    candidates, groups = dummy_candidates(df, [x_var, y_var], group_dummies)
+    singles = [c for c in candidates if c not in groups]
+
+    # ---------- 5. 调节分析 ----------
+    design = DesignMatrix(df)
+    if engine == "batch":
+        results = _moderation_batch(design, x_var, y_var, singles)
+    elif engine == "statsmodels":
+        results = _moderation_reference(df, x_var, y_var, singles)
+    else:
+        raise ValueError(f"未知的计算引擎: {engine}")
+    if groups:
+        rows = dict(zip(singles, results))
+        rows.update(zip(groups, _moderation_grouped(design, x_var, y_var, groups)))
+        results = [rows[c] for c in candidates]
+
+    # ---------- 6. 输出结果 ----------
+    return _finish_moderation(pd.DataFrame(results), design, x_var, y_var, singles, file_path, output_dir,
+                              n_perm, p_threshold, seed, store_path, write_excel)
+
+
+def moderation_search_multi(file_path, x_var, y_vars, exclude_cols=None, output_dir=None, cache_dir=None,
+                            n_perm=0, p_threshold=0.05, seed=None,
+                            store_path=None, write_excel=True,
+                            group_dummies=True, max_levels=50, high_cardinality="skip"):
+    """
+    多响应模式：一次读取文件，同时完成全部因变量的调节分析（批量矩阵引擎）。
+    X、Z、X·Z 列在各因变量间共享，全部 (因变量, 候选) 组合作为多列因变量一次求解。
+    每个因变量的结果与 moderation_search 逐个调用完全一致，输出到 output_dir/<因变量>/ 下的同名文件。
+    参数：
+        y_vars : list, 因变量列名；缺失或非数值的因变量跳过并打印错误
+        output_dir : str, 输出根目录（默认为输入文件所在目录），每个因变量一个子文件夹
+        其余参数同 moderation_search
+    返回：
+        dict，{因变量: 结果 DataFrame}
+    """
+    df = load_dataset(file_path, exclude_cols, cache_dir, max_levels, high_cardinality)
+    design = DesignMatrix(df)
+    if x_var not in df.columns or not design.is_numeric([x_var]):
+        raise ValueError(f"未找到自变量 {x_var} 或其不是数值列")
+    if output_dir is None:
+        output_dir = os.path.dirname(file_path)
+
+    # ---------- 1. 各因变量的候选变量；共享求解使用其并集 ----------
+    plans = {}
+    for y_var in y_vars:
+        if y_var not in df.columns or not design.is_numeric([y_var]):
+            print(f"❌ 因变量 {y_var} 未找到或不是数值列，已跳过")
+            continue
+        plans[y_var] = dummy_candidates(df, [x_var, y_var], group_dummies)
+    if not plans:
+        return {}
+    all_singles = set()
+    for candidates, groups in plans.values():
+        all_singles.update(c for c in candidates if c not in groups)
+    all_singles = [c for c in df.columns if c in all_singles]
+
+    # ---------- 2. 多列求解全部因变量 ----------
+    single_rows = _moderation_batch_multi(design, x_var, list(plans), all_singles)
+
+    # ---------- 3. 按因变量整理并输出（与逐个调用相同） ----------
+    out = {}
+    for y_var, (candidates, groups) in plans.items():
+        rows = dict(zip(all_singles, single_rows[y_var]))
+        if groups:
+            rows.update(zip(groups, _moderation_grouped(design, x_var, y_var, groups)))
+        singles = [c for c in candidates if c not in groups]
+        out[y_var] = _finish_moderation(pd.DataFrame([rows[c] for c in candidates]), design, x_var, y_var, singles,
+                                        file_path, os.path.join(output_dir, y_var), n_perm, p_threshold, seed,
+                                        store_path, write_excel)
+    return out
+
+
+def _moderation_search_gram(file_path, x_var, y_var, exclude_cols, output_dir, cache_dir, n_perm,
+                            store_path, write_excel):
+    """
+    流式交叉积引擎的 moderation_search：累积交叉积时附带 X 与其余各数值列的乘积列，
+    全部交互模型由交叉积求解（按文件指纹与 X 缓存，多个因变量共用）。文本列不参与（不做虚拟变量化）。
+    """
+    gram = gram_for_file(file_path, exclude_cols, cache_dir, product_with=x_var)
+    if x_var not in gram.columns or y_var not in gram.columns:
+        raise ValueError(f"未找到自变量 {x_var} 或因变量 {y_var}（或不是数值列）")
+    if n_perm:
+        print("⚠️ 交叉积引擎不访问原始数据行，不做交互项置换检验")
+    candidates = [c for c in gram.columns if c not in (x_var, y_var)]
+    return _finish_moderation(pd.DataFrame(_moderation_gram(gram, x_var, y_var, candidates)), None, x_var, y_var,
+                              candidates, file_path, output_dir, 0, None, None, store_path, write_excel)
+
+
+def _finish_moderation(df_result, design, x_var, y_var, singles, file_path, output_dir,
+                       n_perm, p_threshold, seed, store_path, write_excel):
+    """
+    补充交互项置换检验，并写出 Excel 结果文件 / 结果库（moderation_search 与多响应模式共用）。
+    """
+    if n_perm:
+        # 虚拟变量组的交互项为多列，不做置换检验（记为 NaN）
+        perm = permutation_interaction_pvalues(design.column(x_var), design.column(y_var), design.block(singles),
+                                               n_perm, p_threshold, seed)
+        is_single = df_result["调节变量"].isin(singles).to_numpy()
+        df_result["p(X×Z→Y)置换"] = np.nan
+        df_result["置换次数"] = np.nan
+        df_result.loc[is_single, "p(X×Z→Y)置换"] = perm["pvalues"]
+        df_result.loc[is_single, "置换次数"] = perm["n_perm"]
+        print(f"已完成交互项置换检验（最多 {n_perm} 次）。")
+    if output_dir is None:
+        output_dir = os.path.dirname(file_path)
+    os.makedirs(output_dir, exist_ok=True)
+
+    base_name = os.path.splitext(os.path.basename(file_path))[0]
+    save_path = os.path.join(output_dir, f"{base_name}_moderation.xlsx")
+
+    if write_excel:
+        df_result.to_excel(save_path, index=False)
+        print(f"调节分析结果已保存至：{save_path}")
+
+    if store_path:
+        append_results(store_path, df_result, "moderation", os.path.basename(save_path), y_var)
+        print(f"调节分析结果已写入结果库：{store_path}")
+
+    return df_result
+
+
+def _moderation_batch(design, x_var, y_var, candidates):
+    """
+    批量矩阵引擎：为所有候选调节变量堆叠 X、Z、X·Z 列，一次性求解全部 4 参数回归。
+    每个候选按自身缺失情况做列表删除，结果与逐候选拟合一致；布尔虚拟变量按 0/1 处理。
+    design 为预编译设计矩阵（DesignMatrix）。
+    """
+    if not design.is_numeric([x_var, y_var]):
+        raise ValueError(f"自变量 {x_var} 或因变量 {y_var} 不是数值列")
+    return _moderation_batch_multi(design, x_var, [y_var], candidates)[y_var]
+
+
+def _moderation_batch_multi(design, x_var, y_vars, candidates):
+    """
+    多响应批量引擎：X、Z、X·Z 列只构造一次，按因变量平铺后与各因变量列一起批量求解。
+    返回：
+        dict，{因变量: 与 candidates 对应的结果行列表}
+    """
+    x = design.column(x_var)
+    ys = design.block(y_vars)
+    z_values = design.block(candidates)
+    z_ok = np.array([design.numeric[c] for c in candidates], dtype=bool)
+    n_y, k = len(y_vars), len(candidates)
+
+    xz_valid = (~np.isnan(x))[:, None] & ~np.isnan(z_values)
+    valid = np.tile(xz_valid, (1, n_y)) & np.repeat(~np.isnan(ys), k, axis=1)
+    # 参数顺序：截距、X、Z、X×Z；列顺序为 (因变量, 候选)
+    res = batched_ols([x, np.tile(z_values, (1, n_y)), np.tile(x[:, None] * z_values, (1, n_y))],
+                      np.repeat(ys, k, axis=1), valid)
+
+    for j, z in enumerate(candidates):
+        if not z_ok[j]:
+            print(f"变量 {z} 出错：非数值列")
+
+    out = {}
+    for i, y_var in enumerate(y_vars):
+        results = []
+        for j, z in enumerate(candidates):
+            b = i * k + j
+            results.append({
+                "调节变量": z,
+                "β(X→Y)": res["params"][b, 1], "p(X→Y)": res["pvalues"][b, 1],
+                "β(Z→Y)": res["params"][b, 2], "p(Z→Y)": res["pvalues"][b, 2],
+                "β(X×Z→Y)": res["params"][b, 3], "p(X×Z→Y)": res["pvalues"][b, 3]
+            })
+        out[y_var] = results
+
+    return out
+
+
+def _moderation_gram(gram, x_var, y_var, candidates, missing="auto"):
+    """
+    交叉积引擎：Y ~ X + Z + X·Z 由 GramMatrix 的交叉积求解（gram 需以 product_with=x_var 累积）。
+    可按缺失模式给出列表删除精确解时结果与批量矩阵引擎一致，否则为成对删除近似（见 GramMatrix）。
+    """
+    results = []
+    for z in candidates:
+        res = gram.ols(y_var, [x_var, z, f"{x_var}×{z}"], missing=missing)
+        results.append({
+            "调节变量": z,
+            "β(X→Y)": res["params"][1], "p(X→Y)": res["pvalues"][1],
+            "β(Z→Y)": res["params"][2], "p(Z→Y)": res["pvalues"][2],
+            "β(X×Z→Y)": res["params"][3], "p(X×Z→Y)": res["pvalues"][3]
+        })
+    return results
+
+
+def _moderation_reference(df, x_var, y_var, candidates):
+    """
+    参考实现：对每个候选变量分别用 statsmodels 公式拟合 Y ~ X * Z。
+    """
     results = []
 
-    # ---------- 5. 循环进行调节分析 ----------
     for z in candidates:
         try:
             # 完整模型：Y ~ X + Z + X*Z
@@ -65,22 +268,124 @@ def moderation_search(file_path, x_var, y_var, exclude_cols=None, output_dir=Non
             "β(X×Z→Y)": beta_inter, "p(X×Z→Y)": p_inter
         })
 
-    # ---------- 6. 输出结果 ----------
-    df_result = pd.DataFrame(results)
-    if output_dir is None:
-        output_dir = os.path.dirname(file_path)
-    os.makedirs(output_dir, exist_ok=True)
+    return results
 
-    base_name = os.path.splitext(os.path.basename(file_path))[0]
-    save_path = os.path.join(output_dir, f"{base_name}_moderation.xlsx")
 
-    df_result.to_excel(save_path, index=False)
-    print(f"调节分析结果已保存至：{save_path}")
+def _moderation_grouped(design, x_var, y_var, groups):
+    """
+    虚拟变量组（同一文本列的多个虚拟变量 D）作为一个调节候选整体检验：拟合 Y ~ X + D + X·D，
+    p(Z→Y)、p(X×Z→Y) 分别为 D 与 X·D 的整体 F 检验；多个系数没有单一的 β，β(Z→Y)、β(X×Z→Y) 记为 NaN。
+    """
+    x, y = design.column(x_var), design.column(y_var)
+    results = []
+    for name, cols in groups.items():
+        d = design.block(cols)
+        q = d.shape[1]
+        res = ols_ftest([x, d, x[:, None] * d], y, [range(2, q + 2), range(q + 2, 2 * q + 2)])
+        results.append({
+            "调节变量": name,
+            "β(X→Y)": res["params"][1], "p(X→Y)": res["pvalues"][1],
+            "β(Z→Y)": np.nan, "p(Z→Y)": res["f_pvalues"][0],
+            "β(X×Z→Y)": np.nan, "p(X×Z→Y)": res["f_pvalues"][1]
+        })
+    return results
+
+
+# ---------------------------- 交互项置换检验 ----------------------------
+# 一次批量计算的置换残差张量元素数上限（约 256 MB）
+PERM_BLOCK_ELEMENTS = 2 ** 25
 
-    return df_result
 
+def permutation_interaction_pvalues(x, y, z_values, n_perm=1000, p_threshold=0.05, seed=None, block_size=100):
+    """
+    交互项 X×Z 的 Freedman–Lane 置换检验，对全部候选调节变量批量进行。
+    先拟合简化模型 Y ~ X + Z 得到拟合值与残差，置换残差后构造 Y* 并检验完整模型中交互项的 t 统计量。
+    由于拟合值位于完整模型的列空间内，Y* 的交互项系数与残差平方和只依赖于 D'e*，
+    因此一块置换的残差堆叠为 (候选, n, 置换) 张量后，全部候选、全部置换只需一次批量矩阵乘法。
+    缺失模式相同的候选共享置换；每块置换后，p 值下界已明显高于 p_threshold 的候选提前停止。
+    参数：
+        x, y : ndarray, (n,)
+        z_values : ndarray, (n, k) 候选调节变量
+        n_perm : int, 最大置换次数
+        p_threshold : float, 提前停止阈值
+        seed : int, 随机种子
+        block_size : int, 每块置换次数（一次批量计算；张量过大时再按内存上限拆分）
+    返回：
+        dict，pvalues（置换 p 值）与 n_perm（实际置换次数），均为 (k,)
+    """
+    n, k = z_values.shape
+    rng = np.random.default_rng(seed)
+    pvalues = np.full(k, np.nan)
+    used = np.zeros(k, dtype=int)
+
+    valid = (~np.isnan(x) & ~np.isnan(y))[:, None] & ~np.isnan(z_values)
+    groups = {}
+    for j in range(k):
+        groups.setdefault(valid[:, j].tobytes(), []).append(j)
+
+    for cols in groups.values():
+        cols = np.array(cols)
+        rows = valid[:, cols[0]]
+        nv = rows.sum()
+        if nv <= 4:
+            continue
+
+        # ---------- 1. 完整模型与简化模型 ----------
+        xv, yv, zv = x[rows], y[rows], z_values[rows][:, cols]
+        kg = len(cols)
+        design = np.stack([np.ones((nv, kg)), np.broadcast_to(xv[:, None], (nv, kg)), zv, xv[:, None] * zv], axis=2)
+        gram_inv = np.linalg.pinv(np.einsum("nki,nkj->kij", design, design), hermitian=True)
+        reduced = design[:, :, :3]
+        beta_r = np.einsum("kij,kj->ki", np.linalg.pinv(np.einsum("nki,nkj->kij", reduced, reduced), hermitian=True),
+                           np.einsum("nki,n->ki", reduced, yv))
+        resid = yv[:, None] - np.einsum("nki,ki->nk", reduced, beta_r)
+        ee = np.einsum("nk,nk->k", resid, resid)
+        df_resid = nv - 4
+
+        design_t = design.transpose(1, 2, 0)
+
+        def t_stat(e, idx):
+            # e 为 (候选, n, 置换) 残差张量，返回 (候选, 置换) 的交互项 t 统计量
+            dte = design_t[idx] @ e
+            coef = gram_inv[idx] @ dte
+            rss = ee[idx, None] - np.einsum("kib,kib->kb", coef, dte)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                return coef[:, 3] / np.sqrt(rss / df_resid * gram_inv[idx, 3, 3, None])
+
+        # ---------- 2. 观测统计量 ----------
+        t_obs = np.abs(t_stat(resid.T[:, :, None], np.arange(kg))[:, 0])
+        ok = ~np.isnan(t_obs)
+        exceed = np.zeros(kg)
+        count = np.zeros(kg)
+        active = np.flatnonzero(ok)
+
+        # ---------- 3. 分块置换残差 ----------
+        done = 0
+        while done < n_perm and len(active):
+            b = min(block_size, n_perm - done)
+            perms = np.array([rng.permutation(nv) for _ in range(b)]).T
+            resid_t = resid.T[active]
+            step = max(1, PERM_BLOCK_ELEMENTS // (nv * len(active)))
+            for start in range(0, b, step):
+                t_perm = np.abs(t_stat(resid_t[:, perms[:, start:start + step]], active))
+                exceed[active] += (t_perm >= t_obs[active, None]).sum(axis=1)
+            count[active] += b
+            done += b
+
+            # 提前停止：p 值的近似下界已高于阈值
+            p_hat = (exceed[active] + 1) / (count[active] + 1)
+            lower = p_hat - 3 * np.sqrt(p_hat * (1 - p_hat) / count[active])
+            active = active[lower <= p_threshold]
 
-def extract_moderation(output_dir, p_threshold=0.05, summary_name="summary_significant_moderation.xlsx"):
+        with np.errstate(invalid="ignore"):
+            pvalues[cols[ok]] = ((exceed + 1) / (count + 1))[ok]
+        used[cols] = count
+
+    return {"pvalues": pvalues, "n_perm": used}
+
+
+def extract_moderation(output_dir, p_threshold=0.05, summary_name="summary_significant_moderation.xlsx",
+                       store_path=None):
     """
     汇总 output_dir 下各因变量子文件夹中的调节分析结果文件。
     文件名包含 '_moderate' 或 '_moderation' 的 Excel 文件。
@@ -94,43 +399,55 @@ def extract_moderation(output_dir, p_threshold=0.05, summary_name="summary_signi
             显著性阈值，默认 0.05
         summary_name : str
             汇总文件名，默认 summary_significant_moderation.xlsx
+        store_path : str
+            SQLite 结果库路径；指定时直接查询结果库，不再重新读取各 Excel 结果文件
     """
     summary_records = []
 
-    # 遍历每个因变量子文件夹
-    for y_var in os.listdir(output_dir):
-        subdir = os.path.join(output_dir, y_var)
-        if not os.path.isdir(subdir):
-            continue
+    if store_path:
+        try:
+            sig_rows = query_results(store_path, "moderation", ['p(X×Z→Y)'], p_threshold)
+            if not sig_rows.empty:
+                summary_records.append(sig_rows)
+        except Exception as e:
+            print(f"❌ 结果库 {store_path} 查询失败，错误：{e}")
+
+    else:
+        # 遍历每个因变量子文件夹
+        for y_var in os.listdir(output_dir):
+            subdir = os.path.join(output_dir, y_var)
+            # 跳过非目录与 .cache 等隐藏目录
+            if not os.path.isdir(subdir) or y_var.startswith("."):
+                continue
+
+            # 筛选文件名包含 "_moderate" 或 "_moderation"
+            xlsx_files = [f for f in os.listdir(subdir) if f.endswith('.xlsx') and ('_moderate' in f.lower() or '_moderation' in f.lower())]
+            print(f"\n📂 正在处理因变量 {y_var} 下的调节文件，共 {len(xlsx_files)} 个")
+
+            for fname in xlsx_files:
+                fpath = os.path.join(subdir, fname)
+                try:
+                    df = pd.read_excel(fpath)
+                    if df.empty:
+                        continue
+
+                    # 检查交互项 p 列是否存在
+                    inter_p_col = 'p(X×Z→Y)'
+                    if inter_p_col not in df.columns:
+                        print(f"⚠️ 文件 {fname} 缺少列 {inter_p_col}，跳过")
+                        continue
+
+                    # 判断交互项显著
+                    sig_rows = df[df[inter_p_col] <= p_threshold]
+                    if not sig_rows.empty:
+                        sig_rows = sig_rows.copy()
+                        # 在最前面添加 y_var 和 file_name
+                        sig_rows.insert(0, "file_name", fname)
+                        sig_rows.insert(0, "y_var", y_var)
+                        summary_records.append(sig_rows)
 
-        # 筛选文件名包含 "_moderate" 或 "_moderation"
-        xlsx_files = [f for f in os.listdir(subdir) if f.endswith('.xlsx') and ('_moderate' in f.lower() or '_moderation' in f.lower())]
-        print(f"\n📂 正在处理因变量 {y_var} 下的调节文件，共 {len(xlsx_files)} 个")
-
-        for fname in xlsx_files:
-            fpath = os.path.join(subdir, fname)
-            try:
-                df = pd.read_excel(fpath)
-                if df.empty:
-                    continue
-
-                # 检查交互项 p 列是否存在
-                inter_p_col = 'p(X×Z→Y)'
-                if inter_p_col not in df.columns:
-                    print(f"⚠️ 文件 {fname} 缺少列 {inter_p_col}，跳过")
-                    continue
-
-                # 判断交互项显著
-                sig_rows = df[df[inter_p_col] <= p_threshold]
-                if not sig_rows.empty:
-                    sig_rows = sig_rows.copy()
-                    # 在最前面添加 y_var 和 file_name
-                    sig_rows.insert(0, "file_name", fname)
-                    sig_rows.insert(0, "y_var", y_var)
-                    summary_records.append(sig_rows)
-
-            except Exception as e:
-                print(f"❌ 文件 {fname} 读取失败，错误：{e}")
+                except Exception as e:
+                    print(f"❌ 文件 {fname} 读取失败，错误：{e}")
 
     # 保存汇总
     if summary_records:
@@ -1,8 +1,11 @@
 from ModelSearch import model_significance_search
 from Mediation import *
 from Moderation import *
+import io
 import os
 import time
+from contextlib import redirect_stdout, nullcontext
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 
 def model_search_pipeline(
@@ -12,7 +15,20 @@ def model_search_pipeline(
         group_col: object = "组别",
         exclude_cols: object = None,
         glm_family: object = "gaussian",
-        alpha: object = 0.05
+        alpha: object = 0.05,
+        n_jobs: object = 1,
+        resume: object = False,
+        screen_top_k: object = None,
+        warm_start: object = True,
+        trace: object = False,
+        fit_timeout: object = None,
+        unit_timeout: object = None,
+        dry_run: object = False,
+        search: object = "forward",
+        subset_top_n: object = 5,
+        subset_max_size: object = 5,
+        subset_jobs: object = 1,
+        engine: object = "auto"
 ) -> dict:
     """
     批量运行多个任务文件的模型显著性搜索。
@@ -39,6 +55,47 @@ def model_search_pipeline(
     alpha : float, optional
         显著性检验阈值，默认 0.05。
 
+    n_jobs : int, optional
+        每个任务内部 (dv, model_type) 单元的并行进程数。默认 1（串行）；None 或负数使用全部 CPU 核。
+
+    resume : bool, optional
+        每个 (task, dv, model_type) 单元完成后都会在 {task}_model/.checkpoints 下写出检查点；
+        resume=True 时跳过已完成的单元，结果与耗时统计从检查点恢复。默认 False。
+
+    screen_top_k : int or None, optional
+        GLM/POISSON/NEGBIN/LOGISTIC 的一步 Wald 近似筛选：每一步只完整拟合组别近似 p 值最小的 screen_top_k 个候选。
+        默认 None（不筛选，逐个完整拟合）。
+
+    warm_start : bool, optional
+        GLM、LMM、RLM、LOGISTIC、ORDLOG、MULTINOM 等迭代型模型是否以上一次拟合的参数（新项补 0）热启动，
+        未收敛时自动回退冷启动。默认 True。
+
+    trace : bool, optional
+        是否记录每次拟合的耗时、迭代次数、收敛状态、异常类型与样本量，
+        导出至 {task}_model/fit_trace.csv 并打印按模型类型汇总的耗时热点。默认 False。
+    fit_timeout : float or None, optional
+        单次拟合时间限制（秒），超时的拟合 p 值记为 1.0。默认 None（不限制）。
+    unit_timeout : float or None, optional
+        单个 (dv, model_type) 单元时间限制（秒），超时的单元在结果中记为超时、不写检查点，不阻塞其余单元。
+        并行时无法被信号中断的工作进程会被终止并重启。默认 None（不限制）。
+    dry_run : bool, optional
+        只打印每个任务的调度计划（各单元最多拟合次数与预计耗时），不拟合、不写出文件。
+        预计耗时按行数、候选协变量数与 {task}_model/schedule_history.json 中的耗时历史估计。默认 False。
+    search : str, optional
+        "forward" 前向逐步选择（默认）；"best_subset" 时 OLS/WLS/ANOVA/ANCOVA 改为分支定界最优子集搜索，
+        每个子集大小（1 ~ subset_max_size）输出组别 p 值最小的前 subset_top_n 个显著子集，其余模型仍为前向逐步选择。
+    subset_top_n : int, optional
+        最优子集搜索每个子集大小保留的子集数。默认 5。
+    subset_max_size : int or None, optional
+        最优子集搜索的最大子集大小，None 为不限制（候选较多时搜索量随大小迅速增长）。默认 5。
+    subset_jobs : int, optional
+        最优子集搜索顶层分支的并行进程数，仅 n_jobs=1 时使用（None 或负数使用全部 CPU 核）。
+        每个 (dv, model_type) 单元各自启动进程池，候选较少时并行开销大于收益。默认 1（串行）。
+    engine : str, optional
+        "auto" 整表载入（默认）；"gram" 流式交叉积引擎，按块读取文件、不整表载入，
+        只对 OLS/WLS/ANOVA/ANCOVA 做前向逐步选择（只使用数值列，串行执行）。
+        交叉积缓存于 {task}_model/.cache。
+
     model_func : callable, required
         模型函数，用于实际执行模型搜索。例如 `model_significance_search`。
         函数应接受以下参数：
@@ -88,7 +145,22 @@ def model_search_pipeline(
             current_sequence=idx,
             past_dv_times=past_dv_times,
             past_seq_times=past_seq_times,
-            start_time_all=start_time_all
+            start_time_all=start_time_all,
+            n_jobs=n_jobs,
+            checkpoint_dir=os.path.join(save_folder, ".checkpoints"),
+            resume=resume,
+            screen_top_k=screen_top_k,
+            warm_start=warm_start,
+            trace_path=os.path.join(save_folder, "fit_trace.csv") if trace else None,
+            fit_timeout=fit_timeout,
+            unit_timeout=unit_timeout,
+            dry_run=dry_run,
+            search=search,
+            subset_top_n=subset_top_n,
+            subset_max_size=subset_max_size,
+            subset_jobs=subset_jobs,
+            engine=engine,
+            cache_dir=os.path.join(save_folder, ".cache")
         )
 
         # ---------- 更新统计 ----------
@@ -112,7 +184,95 @@ def model_search_pipeline(
     return results_summary
 
 
-def mediation_moderation_pipeline(input_dir, x_var, y_var, exclude_cols=None, output_dir=None):
+def _mediation_moderation_unit(file_path, x_var, current_y, exclude_cols, coutput_dir, options, capture=False):
+    """
+    执行一个 (文件, 因变量) 单元的中介分析与调节分析，失败时只记录错误、不影响其他单元。
+    capture=True 时捕获本单元的全部输出并以字符串返回（并行时由主进程整段打印，避免交错）。
+    """
+    buffer = io.StringIO()
+    with redirect_stdout(buffer) if capture else nullcontext():
+        if capture:
+            print(f"========== 正在处理文件：{os.path.basename(file_path)} ==========")
+        print(f"\n➡️ 当前因变量：{current_y}")
+        try:
+            single = mediation_search(file_path, x_var, current_y, exclude_cols, coutput_dir, engine=options["engine"],
+                                      cache_dir=options["cache_dir"],
+                                      n_boot=options["n_boot"], seed=options["seed"], n_jobs=options["boot_jobs"],
+                                      store_path=options["store_path"],
+                                      write_excel=options["write_excel"], group_dummies=options["group_dummies"],
+                                      max_levels=options["max_levels"], high_cardinality=options["high_cardinality"])
+            if options["mediation2"]:
+                _mediation2_unit(file_path, x_var, current_y, exclude_cols, coutput_dir, options, single)
+            moderation_search(file_path, x_var, current_y, exclude_cols, coutput_dir, engine=options["engine"],
+                              cache_dir=options["cache_dir"],
+                              n_perm=options["n_perm"], seed=options["seed"], store_path=options["store_path"],
+                              write_excel=options["write_excel"], group_dummies=options["group_dummies"],
+                              max_levels=options["max_levels"], high_cardinality=options["high_cardinality"])
+            if options["moderated_mediation"]:
+                _moderated_mediation_unit(file_path, x_var, current_y, exclude_cols, coutput_dir, options)
+        except Exception as e:
+            print(f"❌ 文件 {os.path.basename(file_path)} 中因变量 {current_y} 处理失败，错误：{e}")
+    return buffer.getvalue()
+
+
+def _mediation_moderation_file_unit(file_path, x_var, y_vars, exclude_cols, output_dir, options, capture=False):
+    """
+    多响应模式的单元：一个文件的全部因变量一次完成中介分析与调节分析（见 mediation_search_multi），
+    结果文件与逐个 (文件, 因变量) 单元相同。失败时只记录错误、不影响其他文件。
+    """
+    buffer = io.StringIO()
+    with redirect_stdout(buffer) if capture else nullcontext():
+        if capture:
+            print(f"========== 正在处理文件：{os.path.basename(file_path)} ==========")
+        print(f"\n➡️ 当前因变量：{', '.join(y_vars)}（多响应模式）")
+        try:
+            singles = mediation_search_multi(file_path, x_var, y_vars, exclude_cols, output_dir,
+                                             cache_dir=options["cache_dir"],
+                                             n_boot=options["n_boot"], seed=options["seed"],
+                                             n_jobs=options["boot_jobs"],
+                                             store_path=options["store_path"], write_excel=options["write_excel"],
+                                             group_dummies=options["group_dummies"], max_levels=options["max_levels"],
+                                             high_cardinality=options["high_cardinality"])
+            if options["mediation2"]:
+                for current_y, single in singles.items():
+                    _mediation2_unit(file_path, x_var, current_y, exclude_cols, os.path.join(output_dir, current_y),
+                                     options, single)
+            moderation_search_multi(file_path, x_var, y_vars, exclude_cols, output_dir, cache_dir=options["cache_dir"],
+                                    n_perm=options["n_perm"], seed=options["seed"], store_path=options["store_path"],
+                                    write_excel=options["write_excel"], group_dummies=options["group_dummies"],
+                                    max_levels=options["max_levels"], high_cardinality=options["high_cardinality"])
+            if options["moderated_mediation"]:
+                for current_y in y_vars:
+                    _moderated_mediation_unit(file_path, x_var, current_y, exclude_cols,
+                                              os.path.join(output_dir, current_y), options)
+        except Exception as e:
+            print(f"❌ 文件 {os.path.basename(file_path)} 处理失败，错误：{e}")
+    return buffer.getvalue()
+
+
+def _mediation2_unit(file_path, x_var, current_y, exclude_cols, coutput_dir, options, single):
+    """双中介搜索（见 mediation2_search），复用同一单元单中介分析的 a、b 路径结果剪枝"""
+    mediation2_search(file_path, x_var, current_y, exclude_cols, coutput_dir, cache_dir=options["cache_dir"],
+                      mode=options["mediation2"], single_results=single, n_jobs=options["mediation2_jobs"],
+                      store_path=options["store_path"], write_excel=options["write_excel"],
+                      group_dummies=options["group_dummies"], max_levels=options["max_levels"],
+                      high_cardinality=options["high_cardinality"])
+
+
+def _moderated_mediation_unit(file_path, x_var, current_y, exclude_cols, coutput_dir, options):
+    """有调节的中介搜索（见 moderated_mediation_search）"""
+    moderated_mediation_search(file_path, x_var, current_y, exclude_cols, coutput_dir, cache_dir=options["cache_dir"],
+                               stage=options["moderated_mediation"], n_jobs=options["moderated_mediation_jobs"],
+                               store_path=options["store_path"], write_excel=options["write_excel"],
+                               group_dummies=options["group_dummies"], max_levels=options["max_levels"],
+                               high_cardinality=options["high_cardinality"])
+
+
+def mediation_moderation_pipeline(input_dir, x_var, y_var, exclude_cols=None, output_dir=None, cache_dir=None,
+                                  n_boot=0, n_perm=0, seed=None, store_path=None, write_excel=True, n_jobs=1,
+                                  group_dummies=True, max_levels=50, high_cardinality="skip", multi_response=False,
+                                  engine="batch", mediation2=None, moderated_mediation=None, mediation2_jobs=1,
+                                  moderated_mediation_jobs=1, boot_jobs=1):
     """
     遍历目标文件夹下的所有 xlsx 文件，
     对每个文件执行中介分析和调节分析，并将结果输出到指定目录。
@@ -123,32 +283,113 @@ def mediation_moderation_pipeline(input_dir, x_var, y_var, exclude_cols=None, ou
         y_var : str, 因变量列名
         exclude_cols : list, 要排除的列名
         output_dir : str, 输出结果文件夹
+        cache_dir : str, 数据集缓存目录，默认 output_dir/.cache（不写入输入目录）；传 False 则只使用内存缓存
+        n_boot : int, 中介分析间接效应的 bootstrap 次数（0 表示不计算置信区间）
+        n_perm : int, 调节分析交互项置换检验的最大置换次数（0 表示不做置换检验）
+        seed : int, bootstrap / 置换检验的随机种子
+        store_path : str, SQLite 结果库路径；指定时结果写入结果库，汇总直接查询结果库
+        write_excel : bool, 是否为每个文件输出中介 / 调节 Excel 结果文件（汇总文件始终输出）
+        n_jobs : int, 并行进程数（1 为串行；None 或负数使用全部 CPU 核）。
+                 并行时每个 (文件, 因变量) 单元为一个任务，各单元的输出按原顺序整段打印；
+                 汇总在全部单元完成后进行
+        group_dummies : bool, 同一文本列的多个虚拟变量是否作为一个候选整体检验（F 检验）
+        max_levels : int, 文本列允许的最大水平数，超过时按 high_cardinality 处理
+        high_cardinality : str, "skip" 跳过高基数文本列，"cap" 保留最常见的水平、其余合并为「其他」
+        multi_response : bool, 多响应模式：每个文件只处理一次，全部因变量共享 a 路径与 X、M 设计矩阵，
+                         因变量作为多列一次求解；输出文件与逐因变量处理相同。并行时每个文件为一个任务
+        engine : str, "batch" 批量矩阵引擎（默认）；"gram" 流式交叉积引擎，按块读取文件、不整表载入，
+                 适用于超大文件（只使用数值列，不做 bootstrap / 置换检验；交叉积按文件缓存，各因变量共用，
+                 不需要 multi_response）
+        mediation2 : str, 双中介搜索模式，"parallel"、"serial" 或 "both"（None 为不做）；
+                     结果输出到每个文件的 {文件名}_mediation2.xlsx，只写出联合显著的组合（见 mediation2_search）。
+                     只用于批量矩阵引擎
+        moderated_mediation : str, 有调节的中介搜索，"first"（第一阶段调节）、"second"（第二阶段调节）或 "both"
+                              （None 为不做）；对全部 (M, Z) 组合计算调节中介指数，结果输出到每个文件的
+                              {文件名}_modmed.xlsx（见 moderated_mediation_search）。只用于批量矩阵引擎
+        mediation2_jobs : int, 双中介搜索各批组合的并行进程数，仅 n_jobs=1 时使用（None 或负数使用全部 CPU 核）；
+                          每个 (文件, 因变量) 单元各自启动进程池，候选较少时并行开销大于收益。默认 1（串行）
+        moderated_mediation_jobs : int, 有调节的中介搜索的并行进程数（各 Z 按进程数均分成块），用法同 mediation2_jobs
+        boot_jobs : int, bootstrap 各块重抽样的并行进程数，用法同 mediation2_jobs（n_boot 只有一块时不启动进程池）
     """
     if output_dir is None:
         output_dir = os.path.join(input_dir, "results")
     os.makedirs(output_dir, exist_ok=True)
 
+    if cache_dir is None:
+        cache_dir = os.path.join(output_dir, ".cache")
+
     if isinstance(y_var, str):
         y_var = [y_var]
 
     all_files = [f for f in os.listdir(input_dir) if f.endswith('.xlsx')]
     print(f"\n📂 共找到 {len(all_files)} 个 Excel 文件，将依次进行分析。\n")
 
-    for file in all_files:
-        file_path = os.path.join(input_dir, file)
-        print(f"========== 正在处理文件：{file} ==========")
-        for current_y in y_var:
-            print(f"\n➡️ 当前因变量：{current_y}")
-            coutput_dir = os.path.join(output_dir, current_y)
-            try:
-                mediation_search(file_path, x_var, current_y, exclude_cols, coutput_dir)
-                moderation_search(file_path, x_var, current_y, exclude_cols, coutput_dir)
-            except Exception as e:
-                print(f"❌ 文件 {file} 中因变量 {current_y} 处理失败，错误：{e}")
+    if multi_response and engine != "batch":
+        print("⚠️ 多响应模式只用于批量矩阵引擎，已改为逐因变量处理")
+        multi_response = False
+
+    if mediation2 and engine != "batch":
+        print("⚠️ 双中介搜索只用于批量矩阵引擎，已跳过")
+        mediation2 = None
+
+    if moderated_mediation and engine != "batch":
+        print("⚠️ 有调节的中介搜索只用于批量矩阵引擎，已跳过")
+        moderated_mediation = None
+
+    options = {"engine": engine, "mediation2": mediation2, "mediation2_jobs": mediation2_jobs if n_jobs == 1 else 1,
+               "moderated_mediation": moderated_mediation,
+               "moderated_mediation_jobs": moderated_mediation_jobs if n_jobs == 1 else 1,
+               "boot_jobs": boot_jobs if n_jobs == 1 else 1,
+               "cache_dir": cache_dir, "n_boot": n_boot, "n_perm": n_perm, "seed": seed,
+               "store_path": store_path, "write_excel": write_excel,
+               "group_dummies": group_dummies, "max_levels": max_levels, "high_cardinality": high_cardinality}
+
+    if n_jobs == 1:
+        for file in all_files:
+            file_path = os.path.join(input_dir, file)
+            print(f"========== 正在处理文件：{file} ==========")
+            if multi_response:
+                _mediation_moderation_file_unit(file_path, x_var, y_var, exclude_cols, output_dir, options)
+                continue
+            for current_y in y_var:
+                coutput_dir = os.path.join(output_dir, current_y)
+                _mediation_moderation_unit(file_path, x_var, current_y, exclude_cols, coutput_dir, options)
+    else:
+        if n_jobs is None or n_jobs < 0:
+            n_jobs = os.cpu_count() or 1
+        if multi_response:
+            units = [(file, None) for file in all_files]
+            print(f"⚙️ 使用 {n_jobs} 个进程并行处理 {len(units)} 个文件（多响应模式）。")
+        else:
+            units = [(file, current_y) for file in all_files for current_y in y_var]
+            print(f"⚙️ 使用 {n_jobs} 个进程并行处理 {len(units)} 个 (文件, 因变量) 单元。")
+        logs = [None] * len(units)
+        next_unit = 0
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            futures = {
+                (pool.submit(_mediation_moderation_file_unit, os.path.join(input_dir, file), x_var, y_var,
+                             exclude_cols, output_dir, options, True) if multi_response else
+                 pool.submit(_mediation_moderation_unit, os.path.join(input_dir, file), x_var, current_y,
+                             exclude_cols, os.path.join(output_dir, current_y), options, True)): i
+                for i, (file, current_y) in enumerate(units)
+            }
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    logs[i] = future.result()
+                except Exception as e:
+                    # 工作进程异常退出等单元外部错误
+                    file, current_y = units[i]
+                    target = f"中因变量 {current_y} " if current_y else ""
+                    logs[i] = f"❌ 文件 {file} {target}处理失败，错误：{e}\n"
+                # 按原顺序输出已完成单元的日志
+                while next_unit < len(units) and logs[next_unit] is not None:
+                    print(logs[next_unit], end="", flush=True)
+                    next_unit += 1
 
     #提取
-    extract_mediation(output_dir, p_threshold=0.05, summary_name="mediation_summary.xlsx")
-    extract_moderation(output_dir, p_threshold=0.05, summary_name="moderation_summary.xlsx")
+    extract_mediation(output_dir, p_threshold=0.05, summary_name="mediation_summary.xlsx", store_path=store_path)
+    extract_moderation(output_dir, p_threshold=0.05, summary_name="moderation_summary.xlsx", store_path=store_path)
 
     print("\n✅ 全部文件已处理完成！")
 
@@ -0,0 +1,80 @@
+import os
+import sqlite3
+from contextlib import closing
+import pandas as pd
+
+
+def _quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def append_results(store_path, df_result, analysis, file_name, y_var):
+    """
+    将一次搜索的结果写入 SQLite 结果库（每种分析类型一张表），并标注 y_var 与 file_name。
+    同一 (file_name, y_var) 的旧结果会先被删除，重复运行不会产生重复行；新出现的列自动追加到表结构。
+    参数：
+        store_path : str, 结果库路径（.sqlite）
+        df_result : DataFrame, 搜索结果
+        analysis : str, 分析类型（表名），如 "mediation"、"moderation"
+        file_name : str, 结果对应的文件名
+        y_var : str, 因变量
+    """
+    folder = os.path.dirname(store_path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+
+    df = df_result.copy()
+    df.insert(0, "file_name", file_name)
+    df.insert(0, "y_var", y_var)
+
+    table = _quote(analysis)
+    columns = ", ".join(_quote(c) for c in df.columns)
+    marks = ", ".join("?" * len(df.columns))
+    rows = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+    # 并行写入时等待其他进程释放写锁；删除旧结果与写入新结果在同一事务中完成
+    with closing(sqlite3.connect(store_path, timeout=60)) as conn:
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            existing = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+            if existing:
+                for col in df.columns:
+                    if col not in existing:
+                        conn.execute(f"ALTER TABLE {table} ADD COLUMN {_quote(col)}")
+                conn.execute(f"DELETE FROM {table} WHERE y_var = ? AND file_name = ?",
+                             (str(y_var), str(file_name)))
+            else:
+                conn.execute(pd.io.sql.get_schema(df, analysis, con=conn))
+            conn.executemany(f"INSERT INTO {table} ({columns}) VALUES ({marks})", rows)
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {_quote('idx_' + analysis)} ON {table} (y_var, file_name)")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+def query_results(store_path, analysis, max_p=None, p_threshold=0.05):
+    """
+    从结果库查询某类分析的结果。
+    参数：
+        store_path : str, 结果库路径
+        analysis : str, 分析类型（表名）
+        max_p : list, 需同时满足 <= p_threshold 的 p 值列（None 表示不过滤）
+        p_threshold : float, 显著性阈值
+    返回：
+        DataFrame（y_var、file_name 在最前面；表不存在时为空表）
+    """
+    if not os.path.exists(store_path):
+        return pd.DataFrame()
+
+    sql = f"SELECT * FROM {_quote(analysis)}"
+    params = []
+    if max_p:
+        sql += " WHERE " + " AND ".join(f"{_quote(c)} <= ?" for c in max_p)
+        params = [p_threshold] * len(max_p)
+    sql += " ORDER BY rowid"
+
+    with closing(sqlite3.connect(store_path)) as conn:
+        tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        if analysis not in tables:
+            return pd.DataFrame()
+        return pd.read_sql_query(sql, conn, params=params)
@@ -0,0 +1,344 @@
+import os
+import json
+import time
+import signal
+import threading
+import multiprocessing as mp
+from multiprocessing.connection import wait
+from contextlib import contextmanager
+import pandas as pd
+
+# ---------------------------- 成本估计 ----------------------------
+# 各模型类型的默认速率（秒 / 工作量单位，工作量见 unit_work），有历史记录时以历史为准。
+# 线性模型使用增量求解引擎，每一步批量求解全部候选，速率远低于逐个拟合的迭代型模型。
+DEFAULT_RATES = {
+    "OLS": 2e-8, "WLS": 2e-8, "ANOVA": 2e-8, "ANCOVA": 2e-8,
+    "GLM": 1e-6, "POISSON": 1e-6, "LOGISTIC": 1.5e-6, "NEGBIN": 1.5e-6, "ROBUSTGLM": 1.5e-6,
+    "RLM": 3e-6, "QUANTILE": 5e-6, "GAM": 1e-5,
+    "LMM": 2e-5, "MIXEDGLM": 2e-5, "ORDLOG": 3e-5, "MULTINOM": 3e-5,
+}
+_FALLBACK_RATE = 1e-5
+# 历史速率的有效样本数上限：新观测的权重不低于 1 / _HISTORY_WEIGHT
+_HISTORY_WEIGHT = 10
+
+
+def max_fits(n_covs, top_k=None):
+    """
+    单个 (dv, model_type) 单元前向逐步选择的最多拟合次数：第 i 步尝试剩余的 n_covs - i 个候选，另加最终模型。
+    top_k 为一步近似筛选时每一步完整拟合的候选数上限。
+    """
+    per_step = [n_covs - i for i in range(n_covs)]
+    if top_k:
+        per_step = [min(k, top_k) for k in per_step]
+    return sum(per_step) + 1
+
+
+def unit_work(n_rows, n_covs, top_k=None):
+    """单元工作量 = 行数 × 最多拟合次数（实际拟合次数取决于选入的协变量数，由历史速率校正）"""
+    return max(n_rows, 1) * max_fits(n_covs, top_k)
+
+
+class CostModel:
+    """
+    单元耗时估计：预计耗时 = 模型类型速率 × 工作量。
+    每完成一个单元以实际耗时更新该模型类型的速率（加权平均，近期观测权重更高），
+    history_path 指定时速率在多次运行之间保存为 JSON。
+    """
+
+    def __init__(self, history_path=None):
+        self.history_path = history_path
+        self.rates = {}
+        if history_path and os.path.exists(history_path):
+            try:
+                with open(history_path, encoding="utf-8") as f:
+                    self.rates = json.load(f).get("rates", {})
+            except Exception as e:
+                print(f"⚠️ 耗时历史 {history_path} 读取失败，使用默认速率：{e}")
+
+    def rate(self, model_type):
+        entry = self.rates.get(model_type)
+        return entry["rate"] if entry else DEFAULT_RATES.get(model_type, _FALLBACK_RATE)
+
+    def estimate(self, model_type, n_rows, n_covs, top_k=None):
+        """预计耗时（秒）"""
+        return self.rate(model_type) * unit_work(n_rows, n_covs, top_k)
+
+    def observe(self, model_type, n_rows, n_covs, elapsed, top_k=None):
+        """记录一个单元的实际耗时（超时单元的耗时为下界，同样记录，使其下次更早调度）"""
+        observed = elapsed / unit_work(n_rows, n_covs, top_k)
+        entry = self.rates.get(model_type)
+        if entry is None:
+            self.rates[model_type] = {"rate": observed, "n": 1}
+            return
+        n = min(entry["n"], _HISTORY_WEIGHT - 1)
+        entry["rate"] = (entry["rate"] * n + observed) / (n + 1)
+        entry["n"] = entry["n"] + 1
+
+    def save(self):
+        if not self.history_path:
+            return
+        try:
+            folder = os.path.dirname(self.history_path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            tmp_path = f"{self.history_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"rates": self.rates}, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.history_path)
+        except Exception as e:
+            print(f"⚠️ 无法写入耗时历史：{e}")
+
+
+def plan_units(units, n_rows, n_covs, cost_model, top_k=None):
+    """
+    调度计划：按预计耗时降序排列（最贵的单元最先执行，减少并行时末尾的长尾）。
+    参数：
+        units : list, (dv, model_type) 单元
+        n_rows, n_covs : int, 数据行数与候选协变量数
+        cost_model : CostModel
+        top_k : dict, {model_type: 每步完整拟合的候选数}（启用一步近似筛选的模型类型）
+    返回：
+        DataFrame，列为 dv、model_type、最多拟合次数、预计耗时(s)
+    """
+    top_k = top_k or {}
+    plan = pd.DataFrame([{
+        "dv": dv,
+        "model_type": model_type,
+        "最多拟合次数": max_fits(n_covs, top_k.get(model_type)),
+        "预计耗时(s)": cost_model.estimate(model_type, n_rows, n_covs, top_k.get(model_type))
+    } for dv, model_type in units], columns=["dv", "model_type", "最多拟合次数", "预计耗时(s)"])
+    return plan.sort_values("预计耗时(s)", ascending=False, kind="stable").reset_index(drop=True)
+
+
+def estimate_makespan(costs, n_jobs=1):
+    """按降序贪心分配到 n_jobs 个进程（每个单元交给当前最早空闲的进程）的预计总墙钟时间"""
+    loads = [0.0] * max(n_jobs, 1)
+    for cost in sorted(costs, reverse=True):
+        i = loads.index(min(loads))
+        loads[i] += cost
+    return max(loads)
+
+
+def print_plan(plan, n_jobs=1, top=10):
+    """打印调度计划：单元数、拟合次数、串行总耗时与 n_jobs 进程下的预计墙钟时间"""
+    if n_jobs is None or n_jobs < 0:
+        n_jobs = os.cpu_count() or 1
+    total = plan["预计耗时(s)"].sum()
+    wall = estimate_makespan(plan["预计耗时(s)"].tolist(), n_jobs)
+    print(f"🗓️ 调度计划：{len(plan)} 个单元，最多 {int(plan['最多拟合次数'].sum())} 次拟合；"
+          f"串行预计 {total / 60:.1f} 分钟，{n_jobs} 个进程预计 {wall / 60:.1f} 分钟")
+    if plan.empty:
+        return
+    by_type = plan.groupby("model_type")[["最多拟合次数", "预计耗时(s)"]].sum()
+    by_type["耗时占比"] = by_type["预计耗时(s)"] / total if total > 0 else 0.0
+    print(by_type.sort_values("预计耗时(s)", ascending=False).to_string(float_format=lambda v: f"{v:.3f}"))
+    print(f"最贵的 {min(top, len(plan))} 个单元：")
+    print(plan.head(top).to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+
+
+# ---------------------------- 时间限制 ----------------------------
+class FitTimeout(Exception):
+    """单次拟合超时：由拟合函数传出，ModelSearch.make_fitter 将该拟合的 p 值记为 1.0（不写入缓存），单元继续"""
+
+
+class UnitTimeout(BaseException):
+    """单元超时：继承 BaseException，不会被拟合函数的 except Exception 吞掉，直接中止整个单元"""
+
+
+_UNIT_DEADLINE = None
+_HEARTBEAT = None
+_FIT_TIMEOUTS = 0
+
+
+def _alarm_available():
+    return hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread()
+
+
+def _on_alarm(signum, frame):
+    global _FIT_TIMEOUTS
+    if _UNIT_DEADLINE is not None and time.monotonic() >= _UNIT_DEADLINE - 1e-3:
+        # 在 __del__ 等位置抛出的异常会被解释器忽略：重新定时，直到 UnitTimeout 传出单元
+        signal.setitimer(signal.ITIMER_REAL, 0.05)
+        raise UnitTimeout()
+    _FIT_TIMEOUTS += 1
+    raise FitTimeout()
+
+
+def _arm(deadline):
+    signal.setitimer(signal.ITIMER_REAL, max(deadline - time.monotonic(), 1e-3))
+
+
+def fit_timeouts():
+    """当前进程累计的单次拟合超时次数"""
+    return _FIT_TIMEOUTS
+
+
+@contextmanager
+def unit_time_limit(seconds):
+    """
+    单元时间限制（SIGALRM 定时器，仅 Unix 主线程可用，其余情况不限制）：超时在 Python 代码中抛出 UnitTimeout。
+    """
+    global _UNIT_DEADLINE
+    if not seconds or not _alarm_available():
+        yield
+        return
+    previous = signal.signal(signal.SIGALRM, _on_alarm)
+    _UNIT_DEADLINE = time.monotonic() + seconds
+    _arm(_UNIT_DEADLINE)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        _UNIT_DEADLINE = None
+        signal.signal(signal.SIGALRM, previous)
+
+
+@contextmanager
+def fit_time_limit(seconds):
+    """
+    单次拟合时间限制：超时抛出 FitTimeout（同时受所在单元的时间限制约束）。
+    在调度器工作进程中，进入时写入心跳时间戳，供主进程发现无法被信号中断的拟合（如长时间的 C 代码调用）。
+    """
+    if _HEARTBEAT is not None:
+        _HEARTBEAT.value = time.time()
+    if not seconds or not _alarm_available():
+        try:
+            yield
+        finally:
+            if _HEARTBEAT is not None:
+                _HEARTBEAT.value = 0.0
+        return
+    deadline = time.monotonic() + seconds
+    if _UNIT_DEADLINE is not None:
+        deadline = min(deadline, _UNIT_DEADLINE)
+    previous = signal.signal(signal.SIGALRM, _on_alarm)
+    _arm(deadline)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        if _HEARTBEAT is not None:
+            _HEARTBEAT.value = 0.0
+        signal.signal(signal.SIGALRM, previous)
+        # 恢复所在单元的定时器（已到期时立即触发 UnitTimeout）
+        if _UNIT_DEADLINE is not None:
+            _arm(_UNIT_DEADLINE)
+
+
+# ---------------------------- 常驻工作进程 ----------------------------
+def _worker_main(conn, heartbeat, init, initargs, run, unit_timeout):
+    """工作进程：初始化一次，之后逐个接收单元执行，结果与状态（ok / timeout / error）经管道返回"""
+    global _HEARTBEAT
+    _HEARTBEAT = heartbeat
+    if init is not None:
+        init(*initargs)
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        key, args = task
+        start = time.time()
+        try:
+            with unit_time_limit(unit_timeout):
+                payload = run(*args)
+            conn.send((key, "ok", payload, time.time() - start))
+        except UnitTimeout:
+            conn.send((key, "timeout", f"单元超过 {unit_timeout} 秒", time.time() - start))
+        except Exception as e:
+            conn.send((key, "error", f"{type(e).__name__}: {e}", time.time() - start))
+        finally:
+            heartbeat.value = 0.0
+
+
+def run_units(tasks, run, init=None, initargs=(), n_jobs=1, unit_timeout=None, fit_timeout=None,
+              on_result=None, grace=10.0, poll=1.0):
+    """
+    用常驻工作进程按给定顺序执行单元，并强制时间限制。
+    工作进程内以 SIGALRM 中断超时的拟合 / 单元；主进程另行监视每个进程：
+    单元运行超过 unit_timeout + grace，或某次拟合的心跳超过 fit_timeout + grace（无法被信号中断）时，
+    终止该进程、将单元记为超时，并启动新的工作进程继续执行剩余单元。
+    参数：
+        tasks : list, (key, args) 列表，按此顺序分发（通常为 plan_units 的降序）
+        run : callable, 模块级函数，run(*args) 返回单元结果
+        init, initargs : 工作进程初始化函数及其参数（每个进程只执行一次，重启后重新执行）
+        n_jobs : int, 进程数
+        unit_timeout, fit_timeout : float, 单元 / 单次拟合时间限制（秒，None 表示不限制）
+        on_result : callable, on_result(key, status, payload, elapsed)，status 为 "ok"、"timeout" 或 "error"
+        grace : float, 信号中断失败后强制终止前的额外等待（秒）
+        poll : float, 监视间隔（秒）
+    """
+    ctx = mp.get_context()
+    pending = list(tasks)[::-1]
+    workers = {}
+
+    def spawn(wid):
+        parent_conn, child_conn = ctx.Pipe()
+        heartbeat = ctx.Value("d", 0.0, lock=False)
+        proc = ctx.Process(target=_worker_main, args=(child_conn, heartbeat, init, initargs, run, unit_timeout),
+                           daemon=True)
+        proc.start()
+        child_conn.close()
+        workers[wid] = {"proc": proc, "conn": parent_conn, "heartbeat": heartbeat, "task": None, "start": None}
+
+    def assign(wid):
+        worker = workers[wid]
+        worker["task"] = None
+        if pending:
+            key, args = pending.pop()
+            worker["conn"].send((key, args))
+            worker["task"], worker["start"] = key, time.time()
+
+    def retire(wid, status, message):
+        # 终止卡住 / 异常退出的进程，记录其单元，剩余单元交给新进程
+        worker = workers.pop(wid)
+        worker["proc"].terminate()
+        worker["proc"].join(5)
+        if worker["proc"].is_alive():
+            worker["proc"].kill()
+            worker["proc"].join()
+        worker["conn"].close()
+        on_result(worker["task"], status, message, time.time() - worker["start"])
+        if pending:
+            spawn(wid)
+            assign(wid)
+
+    for wid in range(min(max(n_jobs, 1), len(pending))):
+        spawn(wid)
+        assign(wid)
+
+    try:
+        while any(w["task"] is not None for w in workers.values()):
+            busy = {w["conn"]: wid for wid, w in workers.items() if w["task"] is not None}
+            for conn in wait(list(busy), timeout=poll):
+                wid = busy[conn]
+                try:
+                    key, status, payload, elapsed = conn.recv()
+                except (EOFError, OSError):
+                    retire(wid, "error", "工作进程异常退出")
+                    continue
+                on_result(key, status, payload, elapsed)
+                assign(wid)
+
+            now = time.time()
+            for wid, worker in list(workers.items()):
+                if worker["task"] is None:
+                    continue
+                beat = worker["heartbeat"].value
+                if unit_timeout and now - worker["start"] > unit_timeout + grace:
+                    retire(wid, "timeout", f"单元超过 {unit_timeout} 秒（强制终止工作进程）")
+                elif fit_timeout and beat and now - beat > fit_timeout + grace:
+                    retire(wid, "timeout", f"单次拟合超过 {fit_timeout} 秒且无法中断（强制终止工作进程）")
+    finally:
+        for worker in workers.values():
+            try:
+                worker["conn"].send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for worker in workers.values():
+            worker["proc"].join(5)
+            if worker["proc"].is_alive():
+                worker["proc"].terminate()
+            worker["conn"].close()
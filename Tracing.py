@@ -0,0 +1,124 @@
+import os
+import json
+from contextlib import contextmanager
+import pandas as pd
+
+# n_candidates：本条记录覆盖的候选模型数（逐个拟合为 1；线性增量引擎与近似筛选每一步批量求解全部候选）
+TRACE_FIELDS = ["file", "dv", "model_type", "covs", "n_covs", "n_candidates", "wall", "iterations", "converged",
+                "exception", "nobs", "cached"]
+
+
+class FitTracer:
+    """
+    逐次拟合的结构化记录：每条记录对应一次 (file, dv, model_type, 协变量集合) 的拟合，
+    包含墙钟时间、迭代次数、是否收敛、异常类型、样本量与是否命中拟合缓存。
+    """
+
+    def __init__(self, file=None):
+        self.records = []
+        self.context = {"file": file}
+
+    def set_context(self, **context):
+        """设置之后记录的公共字段（如 file）"""
+        self.context.update(context)
+
+    def record(self, **fields):
+        rec = {name: None for name in TRACE_FIELDS}
+        rec.update(self.context)
+        rec.update(fields)
+        self.records.append(rec)
+
+    def extend(self, records):
+        """合并其他进程返回的记录"""
+        self.records.extend(records)
+
+    def to_frame(self):
+        df = pd.DataFrame(self.records, columns=TRACE_FIELDS)
+        df["covs"] = df["covs"].map(lambda c: " + ".join(c) if isinstance(c, (list, tuple)) else c)
+        return df
+
+    def export(self, path):
+        """
+        导出逐次拟合记录，按扩展名选择格式：.json 或 .csv（其余扩展名按 csv 写出）。
+        """
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        if path.lower().endswith(".json"):
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(self.records, f, ensure_ascii=False, indent=1, default=str)
+        else:
+            self.to_frame().to_csv(path, index=False, encoding="utf-8-sig")
+        print(f"🧾 拟合记录已导出至：{path}（共 {len(self.records)} 条）")
+
+    def hotspots(self, by=("model_type",)):
+        """
+        按 by 分组汇总耗时，按总耗时降序排列。
+        返回：
+            DataFrame，列为 记录数、候选模型数、缓存命中、总耗时(s)、平均耗时(ms)、耗时占比、平均迭代、未收敛、异常
+        """
+        df = self.to_frame()
+        if df.empty:
+            return pd.DataFrame()
+        by = list(by)
+        total = df["wall"].sum()
+        grouped = df.groupby(by, dropna=False)
+        report = pd.DataFrame({
+            "记录数": grouped.size(),
+            "候选模型数": grouped["n_candidates"].sum(),
+            "缓存命中": grouped["cached"].sum(),
+            "总耗时(s)": grouped["wall"].sum(),
+            "平均耗时(ms)": grouped["wall"].mean() * 1000,
+            "耗时占比": grouped["wall"].sum() / total if total > 0 else 0.0,
+            "平均迭代": grouped["iterations"].mean(),
+            "未收敛": grouped["converged"].apply(lambda s: int((s == False).sum())),  # noqa: E712
+            "异常": grouped["exception"].apply(lambda s: int(s.notna().sum())),
+        })
+        return report.sort_values("总耗时(s)", ascending=False)
+
+    def print_hotspots(self, by=("model_type",), top=20):
+        report = self.hotspots(by)
+        if report.empty:
+            print("🔥 无拟合记录")
+            return
+        print(f"🔥 耗时热点（按 {' / '.join(by)} 汇总，前 {min(top, len(report))} 项）：")
+        print(report.head(top).to_string(float_format=lambda v: f"{v:.3f}"))
+
+
+# ---------------------------- 全局记录器 ----------------------------
+_ACTIVE = None
+
+
+def get_tracer():
+    """当前启用的记录器（未启用时为 None）"""
+    return _ACTIVE
+
+
+def start_trace(file=None):
+    global _ACTIVE
+    _ACTIVE = FitTracer(file)
+    return _ACTIVE
+
+
+def stop_trace():
+    global _ACTIVE
+    tracer, _ACTIVE = _ACTIVE, None
+    return tracer
+
+
+@contextmanager
+def trace(file=None):
+    """
+    在 with 块内启用逐次拟合记录：
+        with trace("CT.xlsx") as tracer:
+            ...
+        tracer.print_hotspots()
+    """
+    global _ACTIVE
+    previous = _ACTIVE
+    tracer = start_trace(file)
+    try:
+        yield tracer
+    finally:
+        _ACTIVE = previous
+
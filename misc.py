@@ -1,18 +1,147 @@
 import os
 import pandas as pd
 import pyreadstat
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-def convert_sav_to_xlsx(input_dir, output_dir):
+SUPPORTED_FORMATS = ("xlsx", "parquet", "feather")
+
+
+def _excel_engine():
+    """xlsxwriter 比 openpyxl 写入快得多，已安装时优先使用"""
+    try:
+        import xlsxwriter  # noqa: F401
+        return "xlsxwriter"
+    except ImportError:
+        return "openpyxl"
+
+
+def _apply_labels(df, meta):
+    # 若有变量标签，优先使用标签名
+    var_labels = meta.column_labels
+    if any(var_labels):  # 存在变量标签时
+        df.columns = [label if label else name for label, name in zip(var_labels, df.columns)]
+    return df
+
+
+def _is_up_to_date(sav_path, out_paths):
+    """全部输出文件均存在且修改时间不早于 .sav 文件时视为已是最新"""
+    src_mtime = os.path.getmtime(sav_path)
+    return all(os.path.exists(p) and os.path.getmtime(p) >= src_mtime for p in out_paths.values())
+
+
+def _iter_chunks(sav_path, chunksize=None, read_processes=None):
+    """逐块读取 .sav（chunksize 为 None 时整表读取；read_processes 指定时多进程读取）"""
+    if chunksize:
+        yield from pyreadstat.read_file_in_chunks(pyreadstat.read_sav, sav_path, chunksize=chunksize,
+                                                  multiprocess=bool(read_processes),
+                                                  num_processes=read_processes or 4)
+    elif read_processes:
+        yield pyreadstat.read_file_multiprocessing(pyreadstat.read_sav, sav_path, num_processes=read_processes)
+    else:
+        yield pyreadstat.read_sav(sav_path)
+
+
+def _parquet_schema(df, meta):
+    """以首块推断 parquet 列类型；首块全缺失的列按 SPSS 变量类型指定，避免后续块类型不一致"""
+    import pyarrow as pa
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    var_types = list(meta.readstat_variable_types.values())
+    for i, field in enumerate(schema):
+        if pa.types.is_null(field.type):
+            kind = var_types[i] if i < len(var_types) else "string"
+            schema = schema.set(i, pa.field(field.name, pa.string() if kind == "string" else pa.float64()))
+    return schema
+
+
+def _convert_one(sav_path, out_paths, chunksize=None, read_processes=None):
+    """
+    转换单个 .sav 文件，逐块写出 xlsx / parquet；feather 需整表写出（不与 chunksize 同时使用）。
+    返回日志行列表。
+    """
+    excel_writer = parquet_writer = None
+    feather_parts = []
+    row = 0
+    n_rows = 0
+    try:
+        for df, meta in _iter_chunks(sav_path, chunksize, read_processes):
+            df = _apply_labels(df, meta)
+            n_rows += len(df)
+
+            if "xlsx" in out_paths:
+                if excel_writer is None:
+                    excel_writer = pd.ExcelWriter(out_paths["xlsx"], engine=_excel_engine())
+                df.to_excel(excel_writer, sheet_name="Sheet1", startrow=row, header=(row == 0), index=False)
+                row += len(df) + (1 if row == 0 else 0)
+
+            if "parquet" in out_paths:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+                if parquet_writer is None:
+                    schema = _parquet_schema(df, meta)
+                    parquet_writer = pq.ParquetWriter(out_paths["parquet"], schema)
+                parquet_writer.write_table(pa.Table.from_pandas(df, schema=schema, preserve_index=False))
+
+            if "feather" in out_paths:
+                feather_parts.append(df)
+
+        if feather_parts:
+            pd.concat(feather_parts, ignore_index=True).to_feather(out_paths["feather"])
+    finally:
+        if excel_writer is not None:
+            excel_writer.close()
+        if parquet_writer is not None:
+            parquet_writer.close()
+
+    return [f"✅ 已保存: {p}（{n_rows} 行）" for p in out_paths.values()]
+
+
+def _convert_task(sav_path, out_paths, chunksize=None, read_processes=None):
+    """单个文件的转换任务：失败时只记录错误，不影响其他文件"""
+    lines = [f"正在转换: {sav_path}"]
+    try:
+        lines += _convert_one(sav_path, out_paths, chunksize, read_processes)
+    except Exception as e:
+        # 删除写了一半的输出，避免下次被误判为已是最新
+        for p in out_paths.values():
+            if os.path.exists(p):
+                os.remove(p)
+        lines.append(f"❌ 转换失败: {sav_path}")
+        lines.append(f"   错误原因: {e}")
+    return lines
+
+
+def convert_sav_to_xlsx(input_dir, output_dir, formats=("xlsx",), n_jobs=1, chunksize=None, read_processes=None,
+                        skip_up_to_date=False):
     """
     批量将SPSS格式（.sav）的数据文件转换为Excel（.xlsx），第一行为变量名。
     参数:
         input_dir: str 输入文件夹路径
         output_dir: str 输出文件夹路径
+        formats: tuple 输出格式，可选 "xlsx"、"parquet"、"feather"（可同时输出多种）
+        n_jobs: int 并行转换的进程数（1 为串行；None 或负数使用全部 CPU 核）
+        chunksize: int 大文件按行分块读取与写出的块大小（None 为整表读取）。
+                   只有 parquet 输出的内存随块大小受限；xlsx 写出器在内存中保留整个工作簿（openpyxl 尤甚），
+                   feather 需整表写出，不能与 chunksize 同时使用
+        read_processes: int 串行转换（n_jobs=1）时单个文件的多进程读取进程数（None 为单进程读取）
+        skip_up_to_date: bool 输出文件均已存在且不早于 .sav 时跳过（默认 False，始终重新转换）
     """
+    formats = [formats] if isinstance(formats, str) else list(formats)
+    unknown = [f for f in formats if f not in SUPPORTED_FORMATS]
+    if unknown:
+        raise ValueError(f"不支持的输出格式: {unknown}，可选 {SUPPORTED_FORMATS}")
+    if chunksize and "feather" in formats:
+        raise ValueError("feather 输出需整表写出，不能与 chunksize 同时使用")
+    if chunksize and "xlsx" in formats:
+        print(f"⚠️ xlsx 写出器（{_excel_engine()}）会在内存中保留整个工作簿，chunksize 只限制读取时的内存")
+    if read_processes and n_jobs != 1:
+        print("⚠️ 并行转换时单个文件不再多进程读取，read_processes 已忽略")
+
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
     # 遍历目录下所有文件
+    tasks = []
+    skipped = 0
     for root, _, files in os.walk(input_dir):
         for file in files:
             if file.endswith('.sav'):
@@ -21,25 +150,29 @@ def convert_sav_to_xlsx(input_dir, output_dir):
                 out_dir = os.path.join(output_dir, rel_path)
                 os.makedirs(out_dir, exist_ok=True)
 
-                out_path = os.path.join(out_dir, os.path.splitext(file)[0] + '.xlsx')
-
-                print(f"正在转换: {sav_path}")
-
-                try:
-                    # 读取SPSS文件
-                    df, meta = pyreadstat.read_sav(sav_path)
+                stem = os.path.join(out_dir, os.path.splitext(file)[0])
+                out_paths = {fmt: f"{stem}.{fmt}" for fmt in formats}
 
-                    # 若有变量标签，优先使用标签名
-                    var_labels = meta.column_labels
-                    if any(var_labels):  # 存在变量标签时
-                        df.columns = [label if label else name for label, name in zip(var_labels, df.columns)]
+                if skip_up_to_date and _is_up_to_date(sav_path, out_paths):
+                    skipped += 1
+                    continue
+                tasks.append((sav_path, out_paths))
 
-                    # 写入Excel文件
-                    df.to_excel(out_path, index=False)
-                    print(f"✅ 已保存: {out_path}")
+    if skipped:
+        print(f"⏭️ 跳过 {skipped} 个已是最新的文件")
 
-                except Exception as e:
-                    print(f"❌ 转换失败: {sav_path}")
-                    print(f"   错误原因: {e}")
+    if n_jobs == 1:
+        for sav_path, out_paths in tasks:
+            print(f"正在转换: {sav_path}")
+            for line in _convert_task(sav_path, out_paths, chunksize, read_processes)[1:]:
+                print(line)
+    else:
+        if n_jobs is None or n_jobs < 0:
+            n_jobs = os.cpu_count() or 1
+        # 文件间已并行，单个文件不再多进程读取
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            futures = [pool.submit(_convert_task, sav_path, out_paths, chunksize) for sav_path, out_paths in tasks]
+            for future in as_completed(futures):
+                print("\n".join(future.result()))
 
     print("全部文件转换完成。")
\ No newline at end of file
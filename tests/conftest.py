@@ -0,0 +1,32 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# 模块均位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def survey_df():
+    """小型问卷数据：组别、6 个连续协变量（含缺失）、一个受组别与协变量影响的结局"""
+    rng = np.random.default_rng(7)
+    n = 160
+    df = pd.DataFrame(rng.normal(size=(n, 6)), columns=[f"c{j}" for j in range(6)])
+    df["组别"] = rng.integers(0, 2, n).astype(float)
+    df["c0"] += 0.6 * df["组别"]
+    df["c3"] += 0.4 * df["组别"]
+    df["结局"] = 0.5 * df["组别"] + 0.5 * df["c0"] + 0.3 * df["c1"] * df["组别"] + rng.normal(size=n)
+    df["结局2"] = 0.4 * df["c3"] - 0.3 * df["组别"] + rng.normal(size=n)
+    for col in ("c1", "c2", "c4", "结局"):
+        df.loc[rng.random(n) < 0.05, col] = np.nan
+    return df
+
+
+@pytest.fixture
+def survey_file(survey_df, tmp_path):
+    path = tmp_path / "survey.xlsx"
+    survey_df.to_excel(path, index=False)
+    return str(path)
@@ -0,0 +1,44 @@
+"""批量矩阵引擎与 statsmodels 逐候选拟合的等价性"""
+import numpy as np
+import pandas as pd
+import statsmodels.formula.api as smf
+
+from BatchOLS import batched_ols
+from Mediation import mediation_search, mediation_search_multi
+from Moderation import moderation_search
+
+
+def test_batched_ols_matches_smf_ols(survey_df):
+    df = survey_df
+    covs = ["c1", "c2", "c3", "c4"]
+    x = df["组别"].to_numpy()
+    y = df["结局"].to_numpy()
+    m = df[covs].to_numpy()
+    valid = ~np.isnan(m) & ~np.isnan(x)[:, None] & ~np.isnan(y)[:, None]
+    res = batched_ols([x, m], y, valid)
+
+    for j, cov in enumerate(covs):
+        ref = smf.ols(f"结局 ~ 组别 + {cov}", data=df).fit()
+        for name in ("params", "bse", "pvalues"):
+            np.testing.assert_allclose(res[name][j], getattr(ref, name).to_numpy(), rtol=1e-10)
+        assert res["nobs"][j] == ref.nobs
+        np.testing.assert_allclose(res["ssr"][j], ref.ssr, rtol=1e-10)
+
+
+def test_mediation_batch_matches_statsmodels(survey_file):
+    batch = mediation_search(survey_file, "组别", "结局", engine="batch", write_excel=False)
+    ref = mediation_search(survey_file, "组别", "结局", engine="statsmodels", write_excel=False)
+    pd.testing.assert_frame_equal(batch, ref, check_dtype=False, rtol=1e-8)
+
+
+def test_moderation_batch_matches_statsmodels(survey_file):
+    batch = moderation_search(survey_file, "组别", "结局", engine="batch", write_excel=False)
+    ref = moderation_search(survey_file, "组别", "结局", engine="statsmodels", write_excel=False)
+    pd.testing.assert_frame_equal(batch, ref, check_dtype=False, rtol=1e-8)
+
+
+def test_mediation_multi_matches_single(survey_file, tmp_path):
+    multi = mediation_search_multi(survey_file, "组别", ["结局", "结局2"], output_dir=str(tmp_path), write_excel=False)
+    for y_var in ("结局", "结局2"):
+        single = mediation_search(survey_file, "组别", y_var, write_excel=False)
+        pd.testing.assert_frame_equal(multi[y_var], single, check_dtype=False, rtol=1e-10)
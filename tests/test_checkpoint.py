@@ -0,0 +1,49 @@
+"""检查点：续跑时跳过已完成的单元，数据或搜索选项改变后旧检查点失效"""
+import ModelSearch
+from ModelSearch import checkpoint_key, load_checkpoint, save_checkpoint
+
+
+def test_checkpoint_key_mismatch_and_corrupt_file(tmp_path):
+    key = checkpoint_key("fp", alpha=0.05, warm_start=True)
+    results = [{"dv": "结局", "model": "OLS", "pval": 0.01}]
+    save_checkpoint(tmp_path, "结局", "OLS", results, 1.5, key)
+
+    assert load_checkpoint(tmp_path, "结局", "OLS", key) == (results, 1.5)
+    assert load_checkpoint(tmp_path, "结局", "OLS", checkpoint_key("fp", alpha=0.05, warm_start=False)) is None
+    assert load_checkpoint(tmp_path, "结局", "OLS", checkpoint_key("fp2", alpha=0.05, warm_start=True)) is None
+    assert load_checkpoint(tmp_path, "结局", "GLM", key) is None
+
+    (tmp_path / "结局" / "OLS.pkl").write_bytes(b"truncated")
+    assert load_checkpoint(tmp_path, "结局", "OLS", key) is None
+
+
+def test_resume_skips_completed_units(survey_file, tmp_path, monkeypatch):
+    calls = []
+
+    def fake_step(df, dv, group_col, candidate_covs, model_type, *args, **kwargs):
+        calls.append((dv, model_type))
+        return [{"dv": dv, "model": model_type, "selected_covs": ["c0"], "formula": f"{dv} ~ {group_col} + c0",
+                 "pval": 0.01, "summary": model_type}]
+
+    monkeypatch.setattr(ModelSearch, "forward_step_for_dv", fake_step)
+
+    def run(**options):
+        calls.clear()
+        results, _, _ = ModelSearch.model_significance_search(
+            survey_file, ["结局"], "组别", exclude_cols=["结局2"], save_folder=str(tmp_path / "out"),
+            checkpoint_dir=str(tmp_path / "ckpt"), resume=True, **options)
+        return results, len(calls)
+
+    first, n_first = run()
+    assert n_first > 0
+
+    # 相同数据与选项：全部单元从检查点恢复
+    second, n_second = run()
+    assert n_second == 0
+    assert second == first
+
+    # 改变影响结果的选项：旧检查点不再使用
+    _, n_alpha = run(alpha=0.01)
+    assert n_alpha == n_first
+    _, n_warm = run(alpha=0.01, warm_start=False)
+    assert n_warm == n_first
@@ -0,0 +1,22 @@
+"""流式交叉积引擎：分块累积与逐行拟合一致，后续块的列类型与首块不一致时报错"""
+import numpy as np
+import pytest
+import statsmodels.formula.api as smf
+
+from GramMatrix import GramMatrix
+
+
+def test_chunked_ols_matches_smf_ols(survey_df):
+    gram = GramMatrix.from_frame(survey_df, chunksize=37)
+    res = gram.ols("结局", ["组别", "c1", "c2"])
+    ref = smf.ols("结局 ~ 组别 + c1 + c2", data=survey_df).fit()
+    for name in ("params", "bse", "pvalues"):
+        np.testing.assert_allclose(res[name], getattr(ref, name).to_numpy(), rtol=1e-8)
+    assert res["nobs"] == ref.nobs
+
+
+def test_text_in_later_chunk_raises(survey_df):
+    df = survey_df.astype({"c2": object})
+    df.loc[100, "c2"] = "缺考"
+    with pytest.raises(ValueError, match="c2"):
+        GramMatrix.from_frame(df, chunksize=50)
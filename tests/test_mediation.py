@@ -0,0 +1,117 @@
+"""中介分析：bootstrap 置信区间；双中介、有调节的中介与 statsmodels 逐模型拟合一致"""
+import numpy as np
+import pandas as pd
+import statsmodels.formula.api as smf
+
+from Mediation import bootstrap_indirect, mediation2_search, moderated_mediation_search
+
+
+def test_bootstrap_indirect_fixed_seed(survey_df):
+    df = survey_df
+    cands = ["c0", "c2", "c4"]
+    x, y, m = df["组别"].to_numpy(), df["结局"].to_numpy(), df[cands].to_numpy()
+    boot = bootstrap_indirect(x, y, m, n_boot=600, seed=42, chunk_size=200)
+
+    # 点估计与 statsmodels 的 a×b 相同（a、b 路径各自列表删除）
+    for j, cov in enumerate(cands):
+        a = smf.ols(f"{cov} ~ 组别", data=df).fit().params["组别"]
+        b = smf.ols(f"结局 ~ 组别 + {cov}", data=df).fit().params[cov]
+        np.testing.assert_allclose(boot["indirect"][j], a * b, rtol=1e-8)
+
+    # 相同种子的结果可复现，且与进程数无关
+    again = bootstrap_indirect(x, y, m, n_boot=600, seed=42, chunk_size=200)
+    pooled = bootstrap_indirect(x, y, m, n_boot=600, seed=42, chunk_size=200, n_jobs=2)
+    for name in ("pct_low", "pct_high", "bc_low", "bc_high"):
+        np.testing.assert_array_equal(boot[name], again[name])
+        np.testing.assert_array_equal(boot[name], pooled[name])
+
+    assert np.all(boot["pct_low"] < boot["indirect"]) and np.all(boot["indirect"] < boot["pct_high"])
+    # c0 受组别影响且影响结局：区间不含 0；c2 为噪声：区间含 0
+    assert boot["pct_low"][0] > 0 and boot["bc_low"][0] > 0
+    assert boot["pct_low"][1] < 0 < boot["pct_high"][1]
+
+
+def _chain_file(tmp_path, n=150):
+    # 链式中介 组别 → m1 → m2 → 结局（m1 亦直接影响结局），另有两个噪声候选（含缺失）
+    rng = np.random.default_rng(5)
+    df = pd.DataFrame({"组别": rng.integers(0, 2, n).astype(float)})
+    df["m1"] = 0.8 * df["组别"] + rng.normal(size=n)
+    df["m2"] = 0.6 * df["m1"] + rng.normal(size=n)
+    df["n1"], df["n2"] = rng.normal(size=n), rng.normal(size=n)
+    df["结局"] = 0.5 * df["m1"] + 0.5 * df["m2"] + rng.normal(size=n)
+    df.loc[rng.random(n) < 0.05, "n1"] = np.nan
+    df.loc[rng.random(n) < 0.05, "m2"] = np.nan
+    path = tmp_path / "chain.xlsx"
+    df.to_excel(path, index=False)
+    return df, str(path)
+
+
+def test_mediation2_matches_statsmodels(tmp_path):
+    df, path = _chain_file(tmp_path)
+    full = mediation2_search(path, "组别", "结局", alpha=1.0, chunk_size=5, write_excel=False)
+    assert len(full["parallel"]) == 6 and len(full["serial"]) == 12
+
+    def fit(formula, rows):
+        return smf.ols(formula, data=rows).fit()
+
+    for _, r in full["parallel"].iterrows():
+        m1, m2 = r["中介变量1"], r["中介变量2"]
+        out = fit(f"结局 ~ 组别 + {m1} + {m2}", df)
+        np.testing.assert_allclose([r["β(X→M1)"], r["β(X→M2)"]],
+                                   [fit(f"{m1} ~ 组别", df).params["组别"], fit(f"{m2} ~ 组别", df).params["组别"]],
+                                   rtol=1e-8)
+        np.testing.assert_allclose([r["β(M1→Y)"], r["p(M1→Y)"], r["β(M2→Y)"], r["p(M2→Y)"], r["β(X→Y)直接效应(c')"]],
+                                   [out.params[m1], out.pvalues[m1], out.params[m2], out.pvalues[m2],
+                                    out.params["组别"]], rtol=1e-8)
+    for _, r in full["serial"].iterrows():
+        m1, m2 = r["中介变量1"], r["中介变量2"]
+        d = fit(f"{m2} ~ 组别 + {m1}", df)
+        out = fit(f"结局 ~ 组别 + {m1} + {m2}", df)
+        np.testing.assert_allclose([r["β(M1→M2)"], r["p(M1→M2)"], r["β(X→M2)"], r["β(M2→Y)"], r["p(M2→Y)"]],
+                                   [d.params[m1], d.pvalues[m1], d.params["组别"], out.params[m2], out.pvalues[m2]],
+                                   rtol=1e-8)
+
+    # a 路径剪枝与并行计算不改变联合显著的组合
+    pruned = mediation2_search(path, "组别", "结局", chunk_size=3, n_jobs=2, write_excel=False)
+    assert pruned["serial"][["中介变量1", "中介变量2"]].values.tolist() == [["m1", "m2"]]
+    for name, res in pruned.items():
+        expected = full[name][full[name]["联合显著p(max)"] < 0.05].reset_index(drop=True)
+        pd.testing.assert_frame_equal(res, expected, check_dtype=False, rtol=1e-10)
+
+
+def test_moderated_mediation_matches_statsmodels(tmp_path):
+    # 第一阶段调节：z 调节 组别 → m 的效应
+    rng = np.random.default_rng(9)
+    n = 200
+    df = pd.DataFrame({"组别": rng.integers(0, 2, n).astype(float), "z": rng.normal(size=n),
+                       "n1": rng.normal(size=n)})
+    df["m"] = 0.3 * df["组别"] + 0.2 * df["z"] + 0.9 * df["组别"] * df["z"] + rng.normal(size=n)
+    df["结局"] = 0.7 * df["m"] + rng.normal(size=n)
+    df.loc[rng.random(n) < 0.05, "n1"] = np.nan
+    path = tmp_path / "modmed.xlsx"
+    df.to_excel(path, index=False)
+
+    full = moderated_mediation_search(str(path), "组别", "结局", alpha=1.0, write_excel=False)
+    assert len(full["first_stage"]) == 6 and len(full["second_stage"]) == 6
+    for _, r in full["first_stage"].iterrows():
+        m, z = r["中介变量"], r["调节变量"]
+        a = smf.ols(f"{m} ~ 组别 * {z}", data=df).fit()
+        b = smf.ols(f"结局 ~ 组别 + {m}", data=df).fit()
+        a3, a3_se, b_m, b_se = a.params[f"组别:{z}"], a.bse[f"组别:{z}"], b.params[m], b.bse[m]
+        np.testing.assert_allclose([r["β(X→M)"], r["β(X×Z→M)"], r["p(X×Z→M)"], r["β(M→Y)"]],
+                                   [a.params["组别"], a3, a.pvalues[f"组别:{z}"], b_m], rtol=1e-8)
+        np.testing.assert_allclose(r["有调节的中介指数(a3×b)"], a3 * b_m, rtol=1e-8)
+        np.testing.assert_allclose(r["指数SE"], np.sqrt(b_m ** 2 * a3_se ** 2 + a3 ** 2 * b_se ** 2), rtol=1e-8)
+    for _, r in full["second_stage"].iterrows():
+        m, z = r["中介变量"], r["调节变量"]
+        out = smf.ols(f"结局 ~ 组别 + {m} * {z}", data=df).fit()
+        np.testing.assert_allclose([r["β(M→Y)"], r["β(M×Z→Y)"], r["p(M×Z→Y)"], r["β(X→Y)直接效应(c')"]],
+                                   [out.params[m], out.params[f"{m}:{z}"], out.pvalues[f"{m}:{z}"],
+                                    out.params["组别"]], rtol=1e-8)
+
+    # 按块分发到多个进程不改变结果
+    pooled = moderated_mediation_search(str(path), "组别", "结局", n_jobs=2, block_size=1, write_excel=False)
+    assert pooled["first_stage"][["中介变量", "调节变量"]].values.tolist()[0] == ["m", "z"]
+    for name, res in pooled.items():
+        expected = full[name][full[name]["p(指数)"] < 0.05].reset_index(drop=True)
+        pd.testing.assert_frame_equal(res, expected, check_dtype=False, rtol=1e-10)
@@ -0,0 +1,64 @@
+"""模型搜索各引擎与逐公式拟合（原始实现）的等价性"""
+from itertools import combinations
+
+import numpy as np
+import pytest
+import statsmodels.formula.api as smf
+
+from ModelSearch import FIT_CACHE, SUBSET_CACHE, best_subset_linear, forward_step_for_dv
+
+COVS = [f"c{j}" for j in range(6)]
+
+
+def _selection(results):
+    return sorted((tuple(r["selected_covs"]), r["pval"]) for r in results)
+
+
+def _assert_same_selection(fast, ref):
+    fast, ref = _selection(fast), _selection(ref)
+    assert [covs for covs, _ in fast] == [covs for covs, _ in ref]
+    np.testing.assert_allclose([p for _, p in fast], [p for _, p in ref], rtol=1e-6)
+
+
+@pytest.mark.parametrize("model_type", ["OLS", "WLS", "ANOVA", "ANCOVA"])
+def test_linear_stepwise_matches_formula(survey_df, model_type):
+    """增量求解引擎与逐公式前向逐步选择结果相同（含缺失值）"""
+    FIT_CACHE.clear()
+    fast = forward_step_for_dv(survey_df, "结局", "组别", COVS, model_type, alpha=0.2)
+    ref = forward_step_for_dv(survey_df, "结局", "组别", COVS, model_type, alpha=0.2, engine="formula",
+                              use_cache=False)
+    assert ref
+    _assert_same_selection(fast, ref)
+
+
+@pytest.mark.parametrize("model_type", ["GLM", "RLM", "QUANTILE"])
+def test_design_matrix_matches_formula(survey_df, model_type):
+    """预编译设计矩阵拟合（含热启动）与逐公式拟合结果相同"""
+    FIT_CACHE.clear()
+    fast = forward_step_for_dv(survey_df, "结局", "组别", COVS, model_type, alpha=0.2)
+    ref = forward_step_for_dv(survey_df, "结局", "组别", COVS, model_type, alpha=0.2, engine="formula",
+                              use_cache=False, warm_start=False)
+    assert ref
+    _assert_same_selection(fast, ref)
+
+
+def test_best_subset_matches_exhaustive(survey_df):
+    """分支定界最优子集与穷举全部子集的前 top_n 相同"""
+    top_n, max_size, alpha = 3, 4, 0.2
+    SUBSET_CACHE.clear()
+    fast = best_subset_linear(survey_df, "结局", "组别", COVS, "OLS", alpha=alpha, top_n=top_n, max_size=max_size)
+
+    complete = survey_df.dropna(subset=["结局", "组别"] + COVS)
+    expected = []
+    for size in range(1, max_size + 1):
+        fits = []
+        for covs in combinations(COVS, size):
+            pval = smf.ols(f"结局 ~ 组别 + {' + '.join(covs)}", data=complete).fit().pvalues["组别"]
+            fits.append((pval, covs))
+        expected += [(tuple(sorted(covs)), pval) for pval, covs in sorted(fits)[:top_n] if pval < alpha]
+
+    assert expected
+    got = sorted((tuple(sorted(r["selected_covs"])), r["pval"]) for r in fast)
+    expected.sort()
+    assert [covs for covs, _ in got] == [covs for covs, _ in expected]
+    np.testing.assert_allclose([p for _, p in got], [p for _, p in expected], rtol=1e-8)
@@ -0,0 +1,51 @@
+"""交互项置换检验：批量张量实现与逐次置换的 Freedman–Lane 检验一致"""
+import numpy as np
+
+from Moderation import permutation_interaction_pvalues
+
+
+def _data(seed=3, n=80):
+    rng = np.random.default_rng(seed)
+    x = rng.integers(0, 2, n).astype(float)
+    z = rng.normal(size=(n, 3))
+    # 只有第 0 个候选与 X 存在交互
+    y = 0.3 * x + 0.2 * z[:, 0] + 1.2 * x * z[:, 0] + rng.normal(size=n)
+    z[rng.random(n) < 0.1, 2] = np.nan
+    return x, y, z
+
+
+def _naive_pvalue(x, y, z, n_perm, rng):
+    # 逐次置换：置换简化模型残差，重新拟合完整模型取交互项 |t|
+    def interaction_t(yy):
+        design = np.column_stack([np.ones_like(x), x, z, x * z])
+        coef, ssr = np.linalg.lstsq(design, yy, rcond=None)[:2]
+        cov = ssr[0] / (len(yy) - 4) * np.linalg.inv(design.T @ design)
+        return abs(coef[3] / np.sqrt(cov[3, 3]))
+
+    reduced = np.column_stack([np.ones_like(x), x, z])
+    fitted = reduced @ np.linalg.lstsq(reduced, y, rcond=None)[0]
+    resid = y - fitted
+    t_obs = interaction_t(y)
+    exceed = sum(interaction_t(fitted + resid[rng.permutation(len(y))]) >= t_obs for _ in range(n_perm))
+    return (exceed + 1) / (n_perm + 1)
+
+
+def test_matches_naive_permutation_loop():
+    x, y, z = _data()
+    res = permutation_interaction_pvalues(x, y, z[:, :1], n_perm=200, p_threshold=1.0, seed=11, block_size=64)
+    ref = _naive_pvalue(x, y, z[:, 0], 200, np.random.default_rng(11))
+    assert res["n_perm"][0] == 200
+    np.testing.assert_allclose(res["pvalues"][0], ref)
+
+
+def test_interaction_detected_and_seed_reproducible():
+    x, y, z = _data()
+    res = permutation_interaction_pvalues(x, y, z, n_perm=500, seed=5)
+    again = permutation_interaction_pvalues(x, y, z, n_perm=500, seed=5)
+    np.testing.assert_array_equal(res["pvalues"], again["pvalues"])
+    np.testing.assert_array_equal(res["n_perm"], again["n_perm"])
+    assert res["pvalues"][0] < 0.01
+    assert res["pvalues"][1] > 0.05 and res["pvalues"][2] > 0.05
+    # 明显不显著的候选提前停止
+    assert res["n_perm"][0] == 500
+    assert res["n_perm"][1] < 500
@@ -0,0 +1,27 @@
+"""SQLite 结果库：写入、覆盖同一 (file_name, y_var) 的旧结果、新增列与按 p 值查询"""
+import numpy as np
+import pandas as pd
+
+from ResultStore import append_results, query_results
+
+
+def test_append_and_query_round_trip(tmp_path):
+    store = str(tmp_path / "results" / "store.sqlite")
+    first = pd.DataFrame({"M": ["c0", "c1"], "n": np.array([150, 148]), "p_a": [0.01, 0.2], "p_b": [0.03, np.nan]})
+
+    assert query_results(store, "mediation").empty
+    append_results(store, first, "mediation", "f1.xlsx", "结局")
+    # 重复写入同一文件与因变量时替换旧结果
+    append_results(store, first, "mediation", "f1.xlsx", "结局")
+    append_results(store, first.assign(p_c=[0.04, 0.5]), "mediation", "f2.xlsx", "结局")
+
+    got = query_results(store, "mediation")
+    assert list(got.columns) == ["y_var", "file_name", "M", "n", "p_a", "p_b", "p_c"]
+    assert got["file_name"].tolist() == ["f1.xlsx", "f1.xlsx", "f2.xlsx", "f2.xlsx"]
+    np.testing.assert_array_equal(got["n"], [150, 148, 150, 148])
+    assert got["p_b"].isna().tolist() == [False, True, False, True]
+    assert got["p_c"].isna().tolist() == [True, True, False, False]
+
+    sig = query_results(store, "mediation", max_p=["p_a", "p_b"])
+    assert sig[["file_name", "M"]].values.tolist() == [["f1.xlsx", "c0"], ["f2.xlsx", "c0"]]
+    assert query_results(store, "moderation").empty
@@ -0,0 +1,63 @@
+"""调度器：单元 / 单次拟合的时间限制，超时与出错的单元不阻塞其余单元"""
+import time
+
+import pandas as pd
+import pytest
+
+import ModelSearch
+from Scheduler import FitTimeout, UnitTimeout, fit_time_limit, run_units, unit_time_limit
+
+
+def _unit(kind):
+    if kind == "error":
+        raise ValueError("bad unit")
+    if kind == "slow":
+        time.sleep(30)
+    return kind.upper()
+
+
+def test_fit_and_unit_time_limits():
+    with pytest.raises(FitTimeout):
+        with fit_time_limit(0.2):
+            time.sleep(5)
+    # 单次拟合的限制不超过所在单元的剩余时间
+    start = time.monotonic()
+    with pytest.raises(UnitTimeout):
+        with unit_time_limit(0.3):
+            with fit_time_limit(10):
+                time.sleep(5)
+    assert time.monotonic() - start < 2
+    with unit_time_limit(5), fit_time_limit(5):
+        pass
+
+
+def test_run_units_reports_timeout_and_error():
+    results = {}
+
+    def on_result(key, status, payload, elapsed):
+        results[key] = (status, payload)
+
+    tasks = [("slow", ("slow",)), ("error", ("error",)), ("ok", ("ok",))]
+    start = time.time()
+    run_units(tasks, _unit, n_jobs=2, unit_timeout=0.5, on_result=on_result, poll=0.1)
+    assert time.time() - start < 10
+
+    assert results["ok"] == ("ok", "OK")
+    assert results["error"] == ("error", "ValueError: bad unit")
+    assert results["slow"][0] == "timeout"
+
+
+def test_serial_search_records_failed_unit(survey_file, tmp_path, monkeypatch):
+    def fake_step(df, dv, group_col, candidate_covs, model_type, *args, **kwargs):
+        if model_type == "GLM":
+            raise ValueError("singular design")
+        return []
+
+    monkeypatch.setattr(ModelSearch, "forward_step_for_dv", fake_step)
+    out = tmp_path / "out"
+    results, _, _ = ModelSearch.model_significance_search(survey_file, ["结局"], "组别", exclude_cols=["结局2"],
+                                                          save_folder=str(out))
+    assert "结局" in results
+    sheets = pd.read_excel(out / "结局.xlsx", sheet_name=None)
+    assert sheets["GLM"]["Info"].tolist() == ["Error: ValueError: singular design"]
+    assert sheets["OLS"]["Info"].tolist() == ["No significant results"]